@@ -1,20 +1,90 @@
 import logging
 
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.utils.translation import gettext_lazy as _
 from drf_writable_nested.serializers import WritableNestedModelSerializer
 from rest_framework import serializers
 from rest_framework_friendly_errors.mixins import FriendlyErrorMessagesMixin
 
 from budget.choices import ModelChoices
-from budget.models import Budget, BudgetItem
+from budget.models import BUDGET_ITEM_NAME_INDEX, BUDGET_NAME_INDEX, Budget, BudgetItem, BudgetRollup
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
+class UniqueNameErrorsMixin:
+    """
+    Reports a violation of a unique name index as a friendly validation error.
 
-class BudgetItemSerializer(FriendlyErrorMessagesMixin, serializers.ModelSerializer):
+    Names are not looked up before writing; the database enforces them and
+    ``unique_name_indexes`` maps the index names to the field and message to
+    report instead.
+    """
+    unique_name_indexes = {}
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        except IntegrityError as e:
+            for index_name, (field_name, message) in self.unique_name_indexes.items():
+                if index_name in str(e):
+                    break
+            else:
+                raise
+        logger.info(f"{__name__}: Unique name index {index_name} violated")
+        try:
+            self.register_error(error_message=message, error_code="name_already_exist", field_name=field_name)
+        except serializers.ValidationError as error:
+            self._errors = {field_name: error.detail}
+        raise serializers.ValidationError(self.errors)
+
+
+class BudgetItemListSerializer(serializers.ListSerializer):
+    """
+    Validates and creates a list of budget items with a constant number of
+    queries: one INSERT per batch. Names taken in the database are only looked
+    up when the INSERT fails, to tell which rows clash.
+    """
+
+    def to_internal_value(self, data):
+        validated_data = super().to_internal_value(data)
+        if any(self.name_errors(validated_data)):
+            # The list is rejected anyway, report the names taken in the database too
+            raise serializers.ValidationError(self.name_errors(validated_data, self.taken_names(validated_data)))
+        return validated_data
+
+    def taken_names(self, validated_data):
+        if self.context.get("upsert"):
+            # Taken names are updated rather than rejected
+            return set()
+        return self.child.Meta.model.existing_names(
+            self.context['request'].user, (item["name"] for item in validated_data)
+        )
+
+    def name_errors(self, validated_data, taken_names=()):
+        errors, seen_names = [], set()
+        for item in validated_data:
+            name = item["name"].lower()
+            if name in taken_names or name in seen_names:
+                errors.append({"name": [_("An item already exists with this name.")]})
+            else:
+                errors.append({})
+            seen_names.add(name)
+        return errors
+
+    def create(self, validated_data):
+        logger.info(f"{__name__}: Creating {len(validated_data)} budget items:")
+        try:
+            return self.child.Meta.model.bulk_create_items(user=self.context['request'].user, items=validated_data)
+        except IntegrityError as e:
+            if BUDGET_ITEM_NAME_INDEX not in str(e):
+                raise
+        raise serializers.ValidationError(self.name_errors(validated_data, self.taken_names(validated_data)))
+
+
+class BudgetItemSerializer(UniqueNameErrorsMixin, FriendlyErrorMessagesMixin, serializers.ModelSerializer):
     name = serializers.CharField(
         min_length=2,
         max_length=20, 
@@ -34,10 +104,17 @@ class BudgetItemSerializer(FriendlyErrorMessagesMixin, serializers.ModelSerializ
         help_text=_("The type of budget item.")
     )
 
-    total = serializers.SerializerMethodField()
+    total = serializers.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        read_only=True,
+        coerce_to_string=False,
+        help_text=_("Quantity times amount for an expense, the amount for an income.")
+    )
 
     class Meta:
         model = BudgetItem
+        list_serializer_class = BudgetItemListSerializer
         fields = "__all__"
         # fields = (
         #     "id",
@@ -55,21 +132,13 @@ class BudgetItemSerializer(FriendlyErrorMessagesMixin, serializers.ModelSerializ
             "id",
             "user",
             "created_at",
-            "updated_at"
+            "updated_at",
+            "total"
         )
-    
-    def get_total(self, obj):
-        return obj.total
-    
-    def validate_name(self, value):
-        if item_exist := self.Meta.model.objects.filter(name__iexact=value).exists():
-            self.register_error(
-                error_message="An item already exists with this name.",
-                error_code="name_already_exist",
-                field_name="name"
-            )
-        
-        return value
+
+    unique_name_indexes = {
+        BUDGET_ITEM_NAME_INDEX: ("name", "An item already exists with this name."),
+    }
     
     def create(self, validated_data):
         logger.info(f"{__name__}: Creating a budget item:")
@@ -78,16 +147,53 @@ class BudgetItemSerializer(FriendlyErrorMessagesMixin, serializers.ModelSerializ
                 user=self.context['request'].user,
                 name=validated_data['name'],
                 quantity=validated_data['quantity'],
-                amount=validated_data['amount']
+                amount=validated_data['amount'],
+                category=validated_data.get('category', ModelChoices.BUDGET_CATEGORY_GENERAL)
             )
         return self.Meta.model.create(
                 user=self.context['request'].user,
                 name=validated_data['name'],
                 amount=validated_data['amount'],
-                item_type=ModelChoices.BUDGET_ITEM_TYPE_INCOME
+                item_type=ModelChoices.BUDGET_ITEM_TYPE_INCOME,
+                category=validated_data.get('category', ModelChoices.BUDGET_CATEGORY_GENERAL)
             )
 
 
+class BudgetItemImportSerializer(serializers.Serializer):
+    """
+    Field validation of one imported statement row. Name uniqueness is checked
+    per batch by ``budget.imports.BudgetItemImporter``.
+    """
+    name = serializers.CharField(min_length=2, max_length=20)
+    item_type = serializers.ChoiceField(
+        choices=ModelChoices.BUDGET_ITEM_TYPE,
+        default=ModelChoices.BUDGET_ITEM_TYPE_EXPENSES
+    )
+    category = serializers.ChoiceField(
+        choices=ModelChoices.BUDGET_CATEGORY,
+        default=ModelChoices.BUDGET_CATEGORY_GENERAL
+    )
+    amount = serializers.DecimalField(max_digits=9, decimal_places=2, min_value=0)
+    # The range of the PositiveSmallIntegerField column
+    quantity = serializers.IntegerField(default=1, min_value=0, max_value=32767)
+
+
+class BudgetRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BudgetRollup
+        fields = ("period", "period_start", "item_type", "category", "total", "count")
+        read_only_fields = fields
+
+
+class BudgetRollupQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(
+        choices=ModelChoices.ROLLUP_PERIOD,
+        default=ModelChoices.ROLLUP_PERIOD_MONTH,
+        help_text=_("Sum the budget items per WEEK or MONTH.")
+    )
+    start = serializers.DateField(required=False, help_text=_("First period to include"))
+    end = serializers.DateField(required=False, help_text=_("Last period to include"))
+
 
 class BudgetItemResponseSerializer(FriendlyErrorMessagesMixin, serializers.ModelSerializer):
     name = serializers.CharField(
@@ -106,23 +212,12 @@ class BudgetItemResponseSerializer(FriendlyErrorMessagesMixin, serializers.Model
     class Meta:
         model = BudgetItem
         fields = ("name", "item_type", "amount", "quantity")
-    
-
-    def validate_name(self, value):
-        if budget_exist := self.Meta.model.objects.filter(name__iexact=value).exists():
-            self.register_error(
-                error_message="A budget already exists with this name.",
-                error_code="name_already_exist",
-                field_name="name"
-            )
-        
-        return value
 
     def create(self, validated_data):
-        return super().create(validated_data)
+        return self.Meta.model.create(user=self.context['request'].user, **validated_data)
     
 
-class BudgetSerializer(WritableNestedModelSerializer):
+class BudgetSerializer(UniqueNameErrorsMixin, FriendlyErrorMessagesMixin, WritableNestedModelSerializer):
     name = serializers.CharField(
         min_length=2,
         max_length=20, 
@@ -137,31 +232,39 @@ class BudgetSerializer(WritableNestedModelSerializer):
 
     budget_items = BudgetItemResponseSerializer(many=True)
 
+    income_total = serializers.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        read_only=True,
+        help_text=_("The sum of the income items of the budget")
+    )
+
+    expense_total = serializers.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        read_only=True,
+        help_text=_("The sum of the expense items of the budget, quantity times amount")
+    )
+
+    net = serializers.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        read_only=True,
+        help_text=_("The income total less the expense total")
+    )
+
     class Meta:
         model = Budget
         # fields = "__all__"
         exclude = (
             "user",
         )
-    
-    def validate_name(self, value):
-        if budget_exist := self.Meta.model.objects.filter(name__iexact=value).exists():
-            self.register_error(
-                error_message="A budget already exists with this name.",
-                error_code="name_already_exist",
-                field_name="name"
-            )
-        
-        return value
+
+    unique_name_indexes = {
+        BUDGET_NAME_INDEX: ("name", "A budget already exists with this name."),
+        BUDGET_ITEM_NAME_INDEX: ("budget_items", "An item already exists with this name."),
+    }
 
     def create(self, validated_data):
         logger.info("Creating a budget sheet...")
-        print("Validated data:", validated_data['budget_items'])
-        budget_items = validated_data['budget_items']
-        for budget_item in budget_items:
-            budget_item = dict(budget_item)
-        budget_sheet = self.Meta.model.objects.create(
-            # user=self.context['request'].user,
-            name=validated_data['name']
-        )
         return super().create(validated_data)
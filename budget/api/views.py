@@ -1,9 +1,12 @@
 import contextlib
 import logging
 
+from django.db.models import Count, Max
 from django.http.response import Http404
 from django.utils.translation import gettext_lazy as _
 from rest_framework import status, filters
+from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.mixins import (
     CreateModelMixin,
     DestroyModelMixin,
@@ -15,16 +18,29 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from budget.models import Budget, BudgetItem
+from budget.exports import EXPORT_CONTENT_TYPES, EXPORT_FORMAT_NDJSON, BudgetItemExport
+from budget.imports import IMPORT_FORMAT_CSV, IMPORT_FORMATS, BudgetItemImporter, read_statement
+from budget.models import Budget, BudgetItem, BudgetRollup
+from helpers.caching import cached_result
+from helpers.conditional import ConditionalRequestMixin, conditional_get, conditional_update
 from helpers.filters import BudgetItemFilter
+from helpers.pagination import KeysetPagination
+from helpers.replicas import ReplicaReadsMixin
+from helpers.search import NameSearchMixin
+from helpers.streaming import AsyncStreamingHttpResponse
+from helpers.transactions import TransactionPolicyMixin
 
-from .serializers import BudgetItemSerializer, BudgetSerializer
+from .serializers import BudgetItemSerializer, BudgetRollupQuerySerializer, BudgetRollupSerializer, BudgetSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 
 logger = logging.getLogger(__name__)
 
 
 class BudgetItemViewSet(
+    TransactionPolicyMixin,
+    ReplicaReadsMixin,
+    ConditionalRequestMixin,
+    NameSearchMixin,
     RetrieveModelMixin,
     ListModelMixin,
     UpdateModelMixin,
@@ -43,16 +59,26 @@ class BudgetItemViewSet(
 
     **Adding an Expense**:
     When adding an income, quantity is optional and defaults to 1. 
+
+    **Adding many items**:
+    Send a list of budget items instead of a single object to create them in
+    one request. Names are validated together and the user totals are updated
+    once for the whole list.
     """
     queryset = BudgetItem.objects.all()
     lookup_field = "budget_item_id"
     lookup_value_regex = "[0-9a-fA-F]{8}\-[0-9a-fA-F]{4}\-[0-9a-fA-F]{4}\-[0-9a-fA-F]{4}\-[0-9a-fA-F]{12}"
     serializer_class = BudgetItemSerializer
     permission_classes = [IsAuthenticated]
-    search_fields = (
-        "name", "type"
-    )
+    pagination_class = KeysetPagination
+    search_fields = ("name",)
     ordering_fields = ['created_at', 'updated_at']
+    keyset_orderings = {
+        "created_at": ("created_at", "id"),
+        "-created_at": ("-created_at", "-id"),
+        "total": ("total", "id"),
+        "-total": ("-total", "-id"),
+    }
     filter_backends = (DjangoFilterBackend, filters.SearchFilter)
     filterset_class = BudgetItemFilter
 
@@ -66,20 +92,136 @@ class BudgetItemViewSet(
     #         permission_classes = [IsAuthenticated]
     #     return [permission() for permission in permission_classes]
 
+    def get_queryset(self):
+        if getattr(self, "swagger_fake_view", False):
+            return self.queryset.none()
+        return self.queryset.filter(user=self.request.user)
+
     def get_object(self, queryset=None):
-        return BudgetItem.objects.filter(pk=self.kwargs["budget_item_id"]).first()
+        return self.get_queryset().filter(pk=self.kwargs["budget_item_id"]).first()
+
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get("data"), list):
+            kwargs["many"] = True
+        return super(BudgetItemViewSet, self).get_serializer(*args, **kwargs)
 
+    @conditional_get
+    @cached_result
     def list(self, request, *args, **kwargs):
         """
         List Budget Items
 
-        Endpoints retrieves the list of Budget Items.
+        Endpoints retrieves the list of Budget Items, newest first.
+
+        **Pagination**:
+        Follow the `next` link to read the following page; `page_size` sets the
+        number of items per page. Pass `include_count=true` to also get the total.
+
+        **Conditional requests**:
+        Responses carry an `ETag` and a `Last-Modified`; send the ETag back in
+        `If-None-Match` to get a 304 when nothing changed.
+
+        **Ordering**:
+        `ordering` is one of `created_at`, `-created_at` (the default), `total`
+        or `-total`.
         
         **Search fields**:
-        You can search and filter by `name` and `type`
+        You can search by `name`, and filter by `item_type`, amount
+        (`min_amount`, `max_amount`) and line total (`min_total`, `max_total`).
+        For typo tolerant, ranked results use `search/`; for name suggestions,
+        `autocomplete/`.
         """
         return super(BudgetItemViewSet, self).list(request, *args, **kwargs)
 
+    @action(detail=False, methods=["put"])
+    def upsert(self, request, *args, **kwargs):
+        """
+        Create or Update Budget Items by Name
+
+        Takes a Budget Item or a list of them. Items whose name the user already
+        has (case-insensitively) are overwritten, the others are created, in a
+        single statement. Names must be unique within the list.
+        """
+        data = request.data if isinstance(request.data, list) else [request.data]
+        serializer = BudgetItemSerializer(
+            data=data, many=True, context={**self.get_serializer_context(), "upsert": True}
+        )
+        serializer.is_valid(raise_exception=True)
+        created, updated = BudgetItem.upsert_items(user=request.user, items=serializer.validated_data)
+        return Response({
+            "created": BudgetItemSerializer(created, many=True).data,
+            "updated": BudgetItemSerializer(updated, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"])
+    @cached_result
+    def summary(self, request, *args, **kwargs):
+        """
+        Summarize Budget Items
+
+        Totals and counts of the user's Budget Items per `period` (`WEEK` or
+        `MONTH`, the default), item type and category, read from the
+        incrementally maintained rollups. `start` and `end` (YYYY-MM-DD)
+        bound the periods returned.
+        """
+        query = BudgetRollupQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        rollups = BudgetRollup.objects.filter(user=request.user, period=query.validated_data["period"])
+        if start := query.validated_data.get("start"):
+            rollups = rollups.filter(period_start__gte=start)
+        if end := query.validated_data.get("end"):
+            rollups = rollups.filter(period_start__lte=end)
+        return Response(BudgetRollupSerializer(rollups, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request, *args, **kwargs):
+        """
+        Export Budget Items
+
+        Streams all Budget Items of the user, newest first, as NDJSON (default)
+        or CSV with `export_format=csv`. Accepts the same filters as the list.
+        """
+        export_format = request.query_params.get("export_format", EXPORT_FORMAT_NDJSON)
+        if export_format not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {"message": _("Unsupported export format: %s") % export_format},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        export = BudgetItemExport(self.filter_queryset(self.get_queryset()), export_format)
+        response = AsyncStreamingHttpResponse(
+            export, async_streaming_content=export, content_type=export.content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="budget-items.{export_format}"'
+        return response
+
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser, FormParser])
+    def import_statement(self, request, *args, **kwargs):
+        """
+        Import a Bank Statement
+
+        Creates a Budget Item for every row of the uploaded `file`, a CSV
+        (`item_type`, `name`, `amount`, `quantity` columns) or an OFX statement.
+        The format is taken from `file_format` or else from the file extension.
+        Without an `item_type`, positive amounts are incomes and negative
+        amounts expenses.
+
+        Rows that fail validation are skipped and reported with their row number;
+        they do not abort the import.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"message": _("A statement file is required.")}, status=status.HTTP_400_BAD_REQUEST)
+
+        import_format = request.data.get("file_format") or upload.name.rsplit(".", 1)[-1].lower()
+        if import_format not in IMPORT_FORMATS:
+            import_format = IMPORT_FORMAT_CSV
+
+        result = BudgetItemImporter(request.user).run(read_statement(upload, import_format))
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+    @conditional_get
+    @cached_result
     def retrieve(self, request, *args, **kwargs):
         """
         Get Budget Item
@@ -96,29 +238,39 @@ class BudgetItemViewSet(
 
             return Response(serializer.data)
 
+    @conditional_update
     def update(self, request, *args, **kwargs):
         """
         Update a Budget Item
 
         Update the record of a Budget Item.
+
+        Send the `ETag` of the record in `If-Match` to only update it if nobody
+        changed it since; otherwise the response is a 412.
         """
         partial = kwargs.pop("partial", False)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        return Response(serializer.data)
 
+    @conditional_update
     def partial_update(self, request, *args, **kwargs):
         """
         Patch a Budget Item
 
         Patch a Budget Item by passed Id.
+
+        Send the `ETag` of the record in `If-Match` to only update it if nobody
+        changed it since; otherwise the response is a 412.
         """
-        partial = kwargs.pop("partial", False)
+        partial = kwargs.pop("partial", True)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        return Response(serializer.data)
 
     def destroy(self, request, *args, **kwargs):
         """
@@ -133,6 +285,10 @@ class BudgetItemViewSet(
 
 
 class BudgetViewSet(
+    TransactionPolicyMixin,
+    ReplicaReadsMixin,
+    ConditionalRequestMixin,
+    NameSearchMixin,
     RetrieveModelMixin,
     ListModelMixin,
     UpdateModelMixin,
@@ -145,11 +301,20 @@ class BudgetViewSet(
     This endpoint allows you to create a new Budget by an authenticated user.
     """
 
-    queryset = Budget.objects.all()
+    queryset = Budget.objects.with_totals()
     lookup_field = "budget_id"
-    lookup_value_regex = "[0-9a-fA-F]{8}\-[0-9a-fA-F]{4}\-[0-9a-fA-F]{4}\-[0-9a-fA-F]{4}\-[0-9a-fA-F]{12}"
+    lookup_value_regex = "[0-9]+"
     serializer_class = BudgetSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    # Budgets embed their items: their changes and the item count (which
+    # catches removals) are part of the ETag.
+    validator_aggregates = {
+        "last_modified": Max("updated_at"),
+        "count": Count("pk", distinct=True),
+        "items_last_modified": Max("budget_items__updated_at"),
+        "items_count": Count("budget_items"),
+    }
 
     # def get_permissions(self):
     #     """
@@ -161,17 +326,46 @@ class BudgetViewSet(
     #         permission_classes = [IsAuthenticated]
     #     return [permission() for permission in permission_classes]
 
+    def get_queryset(self):
+        if getattr(self, "swagger_fake_view", False):
+            return self.queryset.none()
+        return self.queryset.filter(user=self.request.user)
+
     def get_object(self, queryset=None):
-        return Budget.objects.filter(pk=self.kwargs["budget_id"]).first()
+        return self.get_queryset().filter(pk=self.kwargs["budget_id"]).first()
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+        # Reload with the totals annotations for the response
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
+
+    @conditional_get
+    @cached_result
     def list(self, request, *args, **kwargs):
         """
         List Budgets
 
-        Endpoints retrieves the list of Budgets.
+        Endpoints retrieves the list of Budgets, newest first, with their items
+        and their `income_total`, `expense_total` and `net`. The totals are
+        computed by the database and the items fetched in one extra query, so
+        the number of queries does not depend on the page size.
+
+        **Pagination**:
+        Follow the `next` link to read the following page; `page_size` sets the
+        number of budgets per page. Pass `include_count=true` to also get the total.
+
+        **Conditional requests**:
+        Responses carry an `ETag` and a `Last-Modified`; send the ETag back in
+        `If-None-Match` to get a 304 when nothing changed.
         """
         return super(BudgetViewSet, self).list(request, *args, **kwargs)
 
+    @conditional_get
+    @cached_result
     def retrieve(self, request, *args, **kwargs):
         """
         Get Budget
@@ -188,29 +382,39 @@ class BudgetViewSet(
 
             return Response(serializer.data)
 
+    @conditional_update
     def update(self, request, *args, **kwargs):
         """
         Update a Budget
 
         Update the record of a Budget.
+
+        Send the `ETag` of the record in `If-Match` to only update it if nobody
+        changed it since; otherwise the response is a 412.
         """
         partial = kwargs.pop("partial", False)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        return Response(serializer.data)
 
+    @conditional_update
     def partial_update(self, request, *args, **kwargs):
         """
         Patch a Budget
 
         Patch a Budget by passed Id.
+
+        Send the `ETag` of the record in `If-Match` to only update it if nobody
+        changed it since; otherwise the response is a 412.
         """
-        partial = kwargs.pop("partial", False)
+        partial = kwargs.pop("partial", True)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        return Response(serializer.data)
 
     def destroy(self, request, *args, **kwargs):
         """
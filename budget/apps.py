@@ -5,3 +5,5 @@ class BudgetConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'budget'
 
+    def ready(self):
+        import budget.receivers  # noqa F401
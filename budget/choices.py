@@ -42,4 +42,11 @@ class ModelChoices:
     BUDGET_ITEM_TYPE = (
         (BUDGET_ITEM_TYPE_INCOME, BUDGET_ITEM_TYPE_INCOME),
         (BUDGET_ITEM_TYPE_EXPENSES, BUDGET_ITEM_TYPE_EXPENSES)
-    )
\ No newline at end of file
+    )
+
+    ROLLUP_PERIOD_WEEK = "WEEK"
+    ROLLUP_PERIOD_MONTH = "MONTH"
+    ROLLUP_PERIOD = (
+        (ROLLUP_PERIOD_WEEK, ROLLUP_PERIOD_WEEK),
+        (ROLLUP_PERIOD_MONTH, ROLLUP_PERIOD_MONTH)
+    )
@@ -49,3 +49,52 @@ class Timestampable(models.Model):
 
     class Meta:
         abstract = True
+
+
+class VersionConflict(Exception):
+    """The row changed, or was deleted, since the version an update was based on."""
+
+
+class Versionable(models.Model):
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        help_text=_(
+            """Incremented on every update. Send it back in If-Match to only
+            update the record if nobody changed it in the meantime."""
+        )
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        """
+        Updates the row only if it is still at ``self.version``, as a single
+        ``UPDATE ... WHERE id = %s AND version = %s``, and increments the version.
+        Raises ``VersionConflict`` otherwise; no lock is taken.
+        """
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        expected = self.version
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "version"}
+        self.version, self._expected_version = expected + 1, expected
+        try:
+            super().save(*args, **kwargs)
+        except VersionConflict:
+            self.version = expected
+            raise
+        finally:
+            del self._expected_version
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, "_expected_version", None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        base_qs = base_qs.filter(version=expected)
+        if not super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update):
+            raise VersionConflict(f"{self._meta.label} {pk_val} is not at version {expected}")
+        return True
@@ -0,0 +1,97 @@
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+
+from helpers.pagination import keyset_filter
+
+EXPORT_FORMAT_NDJSON = "ndjson"
+EXPORT_FORMAT_CSV = "csv"
+EXPORT_CONTENT_TYPES = {
+    EXPORT_FORMAT_NDJSON: "application/x-ndjson",
+    EXPORT_FORMAT_CSV: "text/csv",
+}
+EXPORT_FIELDS = (
+    "id", "item_type", "name", "category", "amount", "quantity", "total", "created_at", "updated_at"
+)
+EXPORT_ORDERING = ("-created_at", "-id")
+EXPORT_CHUNK_SIZE = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+class _Echo:
+    """File-like object whose ``write`` hands back the line, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+class BudgetItemExport:
+    """
+    Renders a budget item queryset as NDJSON or CSV, one chunk of rows at a time.
+
+    Memory stays constant whatever the number of rows: the sync iterator reads
+    through a server-side cursor (``QuerySet.iterator``) and the async iterator
+    reads one keyset page per chunk.
+    """
+
+    def __init__(self, queryset, export_format=EXPORT_FORMAT_NDJSON, chunk_size=EXPORT_CHUNK_SIZE):
+        self.queryset = queryset.order_by(*EXPORT_ORDERING)
+        self.export_format = export_format
+        self.chunk_size = chunk_size
+        self.csv_writer = csv.writer(_Echo())
+
+    @property
+    def content_type(self):
+        return EXPORT_CONTENT_TYPES[self.export_format]
+
+    def header(self):
+        if self.export_format == EXPORT_FORMAT_CSV:
+            return self.csv_writer.writerow(EXPORT_FIELDS)
+        return ""
+
+    def render(self, items):
+        rows = [[getattr(item, field) for field in EXPORT_FIELDS] for item in items]
+        if self.export_format == EXPORT_FORMAT_CSV:
+            return "".join(self.csv_writer.writerow(row) for row in rows)
+        return "".join(
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + "\n" for row in rows
+        )
+
+    def __iter__(self):
+        yield self.header()
+        chunk = []
+        for item in self.queryset.iterator(chunk_size=self.chunk_size):
+            chunk.append(item)
+            if len(chunk) == self.chunk_size:
+                yield self.render(chunk)
+                chunk = []
+        if chunk:
+            yield self.render(chunk)
+
+    def fetch(self, position):
+        queryset = self.queryset
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(queryset.model, EXPORT_ORDERING, position))
+        try:
+            items = list(queryset[:self.chunk_size])
+        finally:
+            # Outside of a request, nothing else gives the connection back (to the pool)
+            close_old_connections()
+        return items, self.render(items)
+
+    async def __aiter__(self):
+        yield self.header()
+        position = None
+        while True:
+            # Each chunk runs on a pool thread that is released again while the
+            # client downloads it.
+            items, content = await sync_to_async(self.fetch, thread_sensitive=False)(position)
+            if items:
+                yield content
+            if len(items) < self.chunk_size:
+                break
+            last = items[-1]
+            position = [getattr(last, field.lstrip("-")) for field in EXPORT_ORDERING]
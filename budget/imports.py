@@ -0,0 +1,192 @@
+import csv
+import io
+import logging
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import DataError, IntegrityError
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+from budget.api.serializers import BudgetItemImportSerializer
+from budget.choices import ModelChoices
+from budget.models import BudgetItem
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMAT_CSV = "csv"
+IMPORT_FORMAT_OFX = "ofx"
+IMPORT_FORMATS = (IMPORT_FORMAT_CSV, IMPORT_FORMAT_OFX)
+IMPORT_BATCH_SIZE = getattr(settings, "IMPORT_BATCH_SIZE", 2000)
+IMPORT_MAX_REPORTED_ERRORS = getattr(settings, "IMPORT_MAX_REPORTED_ERRORS", 1000)
+
+# Accepted CSV headers, first match wins. Our own CSV export can be imported as is.
+CSV_COLUMNS = {
+    "name": ("name", "description", "payee", "memo"),
+    "amount": ("amount", "value"),
+    "item_type": ("item_type", "type"),
+    "quantity": ("quantity", "qty"),
+    "category": ("category",),
+}
+
+OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+OFX_READ_SIZE = 64 * 1024
+# Statement descriptions are longer than item names, they are cut to fit
+NAME_MAX_LENGTH = BudgetItem._meta.get_field("name").max_length
+
+
+def statement_row(name, amount, item_type=None, quantity=None, category=None):
+    """
+    Maps a statement line to budget item fields. Without an explicit type, a
+    positive amount is an income and a negative amount an expense.
+    """
+    row = {"name": name[:NAME_MAX_LENGTH].strip(), "amount": amount}
+    try:
+        value = Decimal(amount.replace(",", ""))
+    except (AttributeError, InvalidOperation):
+        # Left as is for the serializer to report
+        value = None
+
+    if item_type:
+        row["item_type"] = item_type.upper()
+    elif value is not None:
+        row["item_type"] = (
+            ModelChoices.BUDGET_ITEM_TYPE_INCOME if value > 0 else ModelChoices.BUDGET_ITEM_TYPE_EXPENSES
+        )
+    if value is not None:
+        row["amount"] = abs(value)
+    if quantity:
+        row["quantity"] = quantity
+    if category:
+        row["category"] = category.upper()
+    return row
+
+
+def read_csv(stream):
+    """Yields the budget item fields of every row of a CSV text stream."""
+    reader = csv.DictReader(stream)
+    headers = {header.strip().lower(): header for header in reader.fieldnames or ()}
+    columns = {
+        key: next((headers[alias] for alias in aliases if alias in headers), None)
+        for key, aliases in CSV_COLUMNS.items()
+    }
+
+    for row in reader:
+        values = {key: (row.get(header) or "").strip() if header else "" for key, header in columns.items()}
+        yield statement_row(**values)
+
+
+def read_ofx(stream):
+    """
+    Yields the budget item fields of every ``<STMTTRN>`` of an OFX text stream,
+    SGML (v1) or XML (v2), reading it in fixed size chunks.
+    """
+    buffer, transaction = "", None
+    while True:
+        chunk = stream.read(OFX_READ_SIZE)
+        buffer += chunk
+        # The text after the last "<" may be cut mid-tag, keep it for the next read
+        cut = buffer.rfind("<") if chunk else len(buffer)
+        for closing, tag, value in OFX_TAG.findall(buffer[:cut]):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing and transaction is not None:
+                    name = transaction.get("NAME") or transaction.get("MEMO", "")
+                    yield statement_row(name, transaction.get("TRNAMT", ""))
+                transaction = None if closing else {}
+            elif transaction is not None and not closing:
+                transaction[tag] = value.strip()
+        buffer = buffer[cut:]
+        if not chunk:
+            break
+
+
+def read_statement(file, import_format):
+    """Parses an uploaded (binary) statement file as a stream of rows."""
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if import_format == IMPORT_FORMAT_OFX:
+        return read_ofx(stream)
+    return read_csv(stream)
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def as_dict(self):
+        return {"created": self.created, "failed": self.failed, "errors": self.errors}
+
+
+class BudgetItemImporter:
+    """
+    Imports statement rows as budget items of ``user``, ``batch_size`` rows at a time.
+
+    Each batch costs one name lookup, one INSERT per ``batch_size`` rows and one
+    update of the user totals (``budget_items_bulk_created``). Invalid rows are
+    reported in the result and skipped; they never abort the import.
+    """
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.validator = BudgetItemImportSerializer()
+        self.seen_names = set()
+
+    def run(self, rows):
+        result = ImportResult()
+        numbered_rows = enumerate(rows, start=1)
+        while batch := list(islice(numbered_rows, self.batch_size)):
+            self.import_batch(batch, result)
+        result.errors.sort(key=lambda error: error["row"])
+        logger.info(f"{__name__}: Imported {result.created} budget items, {result.failed} rows failed")
+        return result
+
+    def import_batch(self, batch, result):
+        validated = []
+        for row_number, row in batch:
+            try:
+                validated.append((row_number, self.validator.run_validation(row)))
+            except ValidationError as e:
+                result.add_error(row_number, e.detail)
+
+        taken_names = BudgetItem.existing_names(self.user, (item["name"] for row_number, item in validated))
+        items = []
+        for row_number, item in validated:
+            name = item["name"].lower()
+            if name in taken_names or name in self.seen_names:
+                result.add_error(row_number, {"name": [_("An item already exists with this name.")]})
+                continue
+            self.seen_names.add(name)
+            items.append((row_number, item))
+
+        if not items:
+            return
+        try:
+            BudgetItem.bulk_create_items(
+                user=self.user, items=[item for row_number, item in items], batch_size=self.batch_size
+            )
+        except IntegrityError:
+            # A concurrent write took one of the names; the batch was rolled back.
+            logger.exception(f"{__name__}: Could not save batch of {len(items)} budget items")
+            for row_number, item in items:
+                result.add_error(row_number, {"name": [_("The item could not be saved, please retry.")]})
+        except DataError:
+            # A value the columns cannot hold, e.g. totals past their digits; the batch was rolled back.
+            logger.exception(f"{__name__}: Could not save batch of {len(items)} budget items")
+            for row_number, item in items:
+                result.add_error(row_number, {
+                    api_settings.NON_FIELD_ERRORS_KEY: [_("A value of the batch of this item is out of range.")]
+                })
+        else:
+            result.created += len(items)
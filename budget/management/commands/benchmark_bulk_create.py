@@ -0,0 +1,73 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from budget.api.views import BudgetItemViewSet
+from budget.choices import ModelChoices
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares creating budget items one request per row against a single "
+        "bulk request. Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1000, help="Number of budget items per run")
+
+    def handle(self, *args, **options):
+        count = options["items"]
+        # Throttling is not what is being measured here.
+        view = BudgetItemViewSet.as_view({"post": "create"}, throttle_classes=())
+        factory = APIRequestFactory()
+
+        with transaction.atomic():
+            user = User.objects.create(
+                username=f"bench-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex}@bench.local"
+            )
+
+            def post(payload):
+                request = factory.post("/api/v1.0/budget-items/", payload, format="json")
+                force_authenticate(request, user=user)
+                response = view(request)
+                assert response.status_code == 201, response.data
+                return response
+
+            per_row = self.run(lambda items: [post(item) for item in items], self.items(count))
+            bulk = self.run(post, self.items(count))
+
+            user.refresh_from_db()
+            transaction.set_rollback(True)
+
+        for label, (elapsed, queries) in (("per-row", per_row), ("bulk", bulk)):
+            self.stdout.write(
+                f"{label:>8}: {count} items in {elapsed:.3f}s "
+                f"({count / elapsed:,.0f} items/s, {queries} queries)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Speed-up: {per_row[0] / bulk[0]:.1f}x"))
+        self.stdout.write(f"Totals: income={user.income} expenses={user.expenses}")
+
+    def items(self, count):
+        prefix = uuid.uuid4().hex[:8]
+        for i in range(count):
+            if i % 10 == 0:
+                yield {
+                    "name": f"{prefix}-{i:06d}", "amount": "1500.00", "item_type": ModelChoices.BUDGET_ITEM_TYPE_INCOME,
+                }
+            else:
+                yield {"name": f"{prefix}-{i:06d}", "amount": "12.50", "quantity": 2}
+
+    def run(self, create, items):
+        items = list(items)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            create(items)
+            elapsed = time.perf_counter() - started
+        return elapsed, len(queries)
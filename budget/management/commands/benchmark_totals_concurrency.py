@@ -0,0 +1,69 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from budget.models import BudgetItem
+from family_budget.users.models import UserTotalsDelta
+
+User = get_user_model()
+
+MODE_DELTAS = "deltas"
+MODE_LOCKING = "locking"
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs N parallel writers creating budget items for one user and reports "
+        "the throughput. `--mode locking` takes the user row lock in every write, "
+        "as the totals receivers used to, for comparison. Needs a database with "
+        "row level locking (Postgres); the user and its items are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8, help="Number of parallel writers")
+        parser.add_argument("--items", type=int, default=200, help="Number of budget items per writer")
+        parser.add_argument("--mode", choices=(MODE_DELTAS, MODE_LOCKING), default=MODE_DELTAS)
+
+    def handle(self, *args, **options):
+        writers, items = options["writers"], options["items"]
+        user = User.objects.create(username=f"bench-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex}@bench.local")
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=writers) as executor:
+                list(executor.map(lambda writer: self.write(user, writer, items, options["mode"]), range(writers)))
+            elapsed = time.perf_counter() - started
+
+            pending = UserTotalsDelta.objects.filter(user=user).count()
+            user.fold_totals()
+            expected = sum(item.total for item in BudgetItem.objects.filter(user=user))
+            if user.expenses != expected:
+                raise CommandError(f"Expenses are {user.expenses}, expected {expected}")
+        finally:
+            user.delete()
+
+        total = writers * items
+        self.stdout.write(
+            f"{options['mode']}: {writers} writers, {total} items in {elapsed:.3f}s "
+            f"({total / elapsed:,.0f} items/s), {pending} deltas folded afterwards"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Totals consistent: expenses={user.expenses}"))
+
+    @staticmethod
+    def write(user, writer, items, mode):
+        prefix = uuid.uuid4().hex[:8]
+        try:
+            for i in range(items):
+                # One transaction per item, like one create request (see helpers.transactions)
+                with transaction.atomic():
+                    if mode == MODE_LOCKING:
+                        User.objects.select_for_update().get(pk=user.pk)
+                    BudgetItem.create(
+                        user=user, name=f"{prefix}-{i:06d}", amount=Decimal("12.50"), quantity=writer % 3 + 1
+                    )
+        finally:
+            connections.close_all()
@@ -0,0 +1,48 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from budget.imports import IMPORT_BATCH_SIZE, IMPORT_FORMAT_CSV, IMPORT_FORMATS, BudgetItemImporter, read_statement
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports a CSV or OFX bank statement as budget items of a user. "
+        "Target throughput: 100,000 rows in under 30 seconds on a local Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the statement file")
+        parser.add_argument("--user", required=True, help="Email or username of the owner")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        user = (
+            User.objects.filter(email=options["user"]).first()
+            or User.objects.filter(username=options["user"]).first()
+        )
+        if user is None:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        path = options["path"]
+        import_format = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if import_format not in IMPORT_FORMATS:
+            import_format = IMPORT_FORMAT_CSV
+
+        started = time.perf_counter()
+        with open(path, "rb") as file:
+            result = BudgetItemImporter(user, batch_size=options["batch_size"]).run(
+                read_statement(file, import_format)
+            )
+        elapsed = time.perf_counter() - started
+
+        rows = result.created + result.failed
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} of {rows} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)"
+        ))
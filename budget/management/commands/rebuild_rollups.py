@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from budget.rollups import rebuild_rollups
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the budget rollups from the budget items. Users are processed "
+        "in chunks, each chunk in its own transaction, on parallel workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", nargs="*", help="Emails of the users to rebuild, defaults to everyone")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Number of users per chunk")
+        parser.add_argument("--workers", type=int, default=4, help="Number of chunks rebuilt concurrently")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("pk")
+        if options["users"]:
+            users = users.filter(email__in=options["users"])
+        user_ids = list(users.values_list("pk", flat=True))
+        chunk_size = options["chunk_size"]
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+        started = time.perf_counter()
+        if options["workers"] > 1:
+            with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+                rows = sum(executor.map(self.rebuild_chunk, chunks))
+        else:
+            rows = sum(map(rebuild_rollups, chunks))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rows} rollups of {len(user_ids)} users in {len(chunks)} chunks in {elapsed:.2f}s"
+        ))
+
+    @staticmethod
+    def rebuild_chunk(user_ids):
+        # Every worker thread opens its own connection; close it when done.
+        try:
+            return rebuild_rollups(user_ids)
+        finally:
+            connections.close_all()
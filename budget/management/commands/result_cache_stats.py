@@ -0,0 +1,25 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from helpers.caching import is_shared, result_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints the hit, miss and eviction counters of the API result cache. "
+        "The counters live in the cache itself, so they cover every process "
+        "sharing it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the counters after printing them")
+
+    def handle(self, *args, **options):
+        if not is_shared(getattr(settings, "API_CACHE_ALIAS", "default")):
+            self.stderr.write(
+                "API_CACHE_ALIAS is a local memory cache: the counters are those of this process only, "
+                "the API workers keep their own."
+            )
+        self.stdout.write(json.dumps(result_cache_stats(reset=options["reset"]), indent=2))
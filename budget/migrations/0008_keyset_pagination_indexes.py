@@ -0,0 +1,36 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:39
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0007_rename_type_budgetitem_item_type'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='budget',
+            options={'ordering': ['-created_at']},
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='Timestamp when the record was created. The date and time \n            are displayed in the Timezone from where request is made. \n            e.g. 2019-14-29T00:15:09Z for April 29, 2019 0:15:09 UTC', verbose_name='Created'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Timestamp when the record was modified. The date and \n            time are displayed in the Timezone from where request \n            is made. e.g. 2019-14-29T00:15:09Z for April 29, 2019 0:15:09 UTC\n            ', null=True, verbose_name='Updated'),
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='budget_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='budgetitem',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='budgetitem_user_created_idx'),
+        ),
+    ]
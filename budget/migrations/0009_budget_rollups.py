@@ -0,0 +1,75 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, DateField, DecimalField, F, Sum, When
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+import django.db.models.deletion
+
+
+def build_rollups(apps, schema_editor):
+    """
+    Rolls up the existing budget items, as budget.rollups.rebuild_rollups
+    does: the receivers only keep the rollups of later changes up to date.
+    """
+    BudgetItem = apps.get_model("budget", "BudgetItem")
+    BudgetRollup = apps.get_model("budget", "BudgetRollup")
+    # Like BudgetItem.compute_total, there is no total column yet
+    total = Case(
+        When(item_type="EXPENSE", then=Coalesce(F("quantity"), 0) * F("amount")),
+        default=F("amount"),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    truncs = {
+        "WEEK": TruncWeek("created_at", output_field=DateField()),
+        "MONTH": TruncMonth("created_at", output_field=DateField()),
+    }
+    rollups = []
+    for period, trunc in truncs.items():
+        rows = (
+            BudgetItem.objects.annotate(period_start=trunc)
+            .values("user_id", "period_start", "item_type", "category")
+            .annotate(sum_total=Sum(total), count=Count("id"))
+            .order_by()
+        )
+        rollups.extend(BudgetRollup(period=period, total=row.pop("sum_total"), **row) for row in rows)
+    BudgetRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('budget', '0008_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budgetitem',
+            name='category',
+            field=models.CharField(choices=[('TRAVEL', 'TRAVEL'), ('GROCERIES', 'GROCERIES'), ('GIFT', 'GIFT'), ('RENT', 'RENT'), ('DRINKS', 'DRINKS'), ('FAMILY', 'FAMILY'), ('BILLS', 'BILLS'), ('GENERAL', 'GENERAL'), ('EATING_OUT', 'EATING_OUT'), ('ENTERTAINMENT', 'ENTERTAINMENT'), ('PERSONAL_CARE', 'PERSONAL_CARE'), ('TRANSPORTATION', 'TRANSPORTATION'), ('HEALTHCARE', 'HEALTHCARE'), ('HOME', 'HOME'), ('EDUCATION', 'EDUCATION'), ('SHOPPING', 'SHOPPING')], default='GENERAL', help_text='The category of the budget item', max_length=14),
+        ),
+        migrations.CreateModel(
+            name='BudgetRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('WEEK', 'WEEK'), ('MONTH', 'MONTH')], help_text='The length of the period', max_length=5)),
+                ('period_start', models.DateField(help_text='The first day of the period, a Monday for weeks')),
+                ('item_type', models.CharField(choices=[('INCOME', 'INCOME'), ('EXPENSE', 'EXPENSE')], help_text='The type of the budget items', max_length=7)),
+                ('category', models.CharField(choices=[('TRAVEL', 'TRAVEL'), ('GROCERIES', 'GROCERIES'), ('GIFT', 'GIFT'), ('RENT', 'RENT'), ('DRINKS', 'DRINKS'), ('FAMILY', 'FAMILY'), ('BILLS', 'BILLS'), ('GENERAL', 'GENERAL'), ('EATING_OUT', 'EATING_OUT'), ('ENTERTAINMENT', 'ENTERTAINMENT'), ('PERSONAL_CARE', 'PERSONAL_CARE'), ('TRANSPORTATION', 'TRANSPORTATION'), ('HEALTHCARE', 'HEALTHCARE'), ('HOME', 'HOME'), ('EDUCATION', 'EDUCATION'), ('SHOPPING', 'SHOPPING')], help_text='The category of the budget items', max_length=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, help_text='The sum of the totals of the budget items', max_digits=14)),
+                ('count', models.IntegerField(default=0, help_text='The number of budget items')),
+                ('user', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Budget Rollup',
+                'verbose_name_plural': 'Budget Rollups',
+                'ordering': ['period_start', 'item_type', 'category'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='budgetrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'period', 'period_start', 'item_type', 'category'), name='unique_budget_rollup'),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:52
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, When
+from django.db.models.functions import Coalesce
+
+
+def fill_total(apps, schema_editor):
+    BudgetItem = apps.get_model("budget", "BudgetItem")
+    BudgetItem.objects.update(total=Case(
+        # Like BudgetItem.compute_total, a missing quantity counts as 0
+        When(item_type="EXPENSE", then=Coalesce(F("quantity"), 0) * F("amount")),
+        default=F("amount"),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0009_budget_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budgetitem',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Quantity times amount for an expense, the amount for an income. Kept in sync on save.', max_digits=14),
+        ),
+        migrations.RunPython(fill_total, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='budgetitem',
+            index=models.Index(fields=['user', 'total', 'id'], name='budgetitem_user_total_idx'),
+        ),
+    ]
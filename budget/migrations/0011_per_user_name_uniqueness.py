@@ -0,0 +1,66 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:55
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def rename_duplicates(apps, schema_editor):
+    """
+    Names become unique per user and case-insensitively, which budgets (not
+    unique at all) and budget items (unique case-sensitively) were not. The
+    oldest row of each name keeps it, the others get a numbered suffix,
+    e.g. "January (2)": nothing is merged, as rows of the same name can hold
+    different amounts and items.
+    """
+    for model_name in ("BudgetItem", "Budget"):
+        model = apps.get_model("budget", model_name)
+        max_length = model._meta.get_field("name").max_length
+        # Without the default ordering, which would be grouped by too
+        duplicates = model.objects.order_by().annotate(lower_name=Lower("name")).values(
+            "user_id", "lower_name"
+        ).annotate(count=Count("id")).filter(count__gt=1)
+        for user_id in {duplicate["user_id"] for duplicate in duplicates}:
+            rows = model.objects.filter(user_id=user_id).order_by("created_at", "id")
+            taken = {name.lower() for name in rows.values_list("name", flat=True)}
+            seen = set()
+            for pk, name in rows.values_list("pk", "name"):
+                if name.lower() not in seen:
+                    seen.add(name.lower())
+                    continue
+                number = 2
+                while True:
+                    suffix = f" ({number})"
+                    renamed = name[:max_length - len(suffix)] + suffix
+                    if renamed.lower() not in taken:
+                        break
+                    number += 1
+                taken.add(renamed.lower())
+                model.objects.filter(pk=pk).update(name=renamed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0010_budgetitem_total'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='budgetitem',
+            name='name',
+            field=models.CharField(help_text='The name of the budget item', max_length=20),
+        ),
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        # Names are unique per user and case-insensitively. Django 3.2 has no
+        # functional unique constraints, hence the raw indexes; BudgetItem.upsert_items
+        # uses the budget item one as its ON CONFLICT target.
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX budgetitem_user_name_uniq ON budget_budgetitem (user_id, lower(name))",
+            reverse_sql="DROP INDEX budgetitem_user_name_uniq",
+        ),
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX budget_user_name_uniq ON budget_budget (user_id, lower(name))",
+            reverse_sql="DROP INDEX budget_user_name_uniq",
+        ),
+    ]
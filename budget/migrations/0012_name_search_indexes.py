@@ -0,0 +1,44 @@
+from django.contrib.postgres.operations import BtreeGinExtension, TrigramExtension
+from django.db import migrations
+
+# Trigram indexes back fuzzy search and SearchFilter's icontains (both on
+# upper(name)); btree_gin lets them lead with user_id. The "C" collated
+# indexes back prefix autocomplete as an ordered range scan.
+TABLES = (
+    ("budgetitem", "budget_budgetitem"),
+    ("budget", "budget_budget"),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for prefix, table in TABLES:
+        schema_editor.execute(
+            f"CREATE INDEX {prefix}_user_name_trgm_idx ON {table} USING gin (user_id, upper(name) gin_trgm_ops)"
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {prefix}_user_name_prefix_idx ON {table} (user_id, (lower(name) COLLATE "C"))'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for prefix, table in TABLES:
+        schema_editor.execute(f"DROP INDEX {prefix}_user_name_trgm_idx")
+        schema_editor.execute(f"DROP INDEX {prefix}_user_name_prefix_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0011_per_user_name_uniqueness'),
+    ]
+
+    operations = [
+        # Both are no-ops outside of Postgres
+        BtreeGinExtension(),
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
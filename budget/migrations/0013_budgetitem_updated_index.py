@@ -0,0 +1,17 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0012_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='budgetitem',
+            index=models.Index(fields=['user', 'updated_at'], name='budgetitem_user_updated_idx'),
+        ),
+    ]
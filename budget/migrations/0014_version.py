@@ -0,0 +1,23 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0013_budgetitem_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented on every update. Send it back in If-Match to only\n            update the record if nobody changed it in the meantime.'),
+        ),
+        migrations.AddField(
+            model_name='budgetitem',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented on every update. Send it back in If-Match to only\n            update the record if nobody changed it in the meantime.'),
+        ),
+    ]
@@ -1,18 +1,38 @@
 import logging
+from collections import namedtuple
+from decimal import Decimal
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Lower
 from django.utils.translation import gettext_lazy as _
 
 from .choices import ModelChoices
-from .common import NULL_AND_BLANK, BaseModel, Timestampable
+from .common import NULL_AND_BLANK, BaseModel, Timestampable, Versionable
+from .signals import budget_items_bulk_created, budget_items_bulk_upserted
 
 User = get_user_model()
 logger = logging.getLogger(__name__)    
 
+# What a budget item contributes to the user totals and rollups
+LedgerEntry = namedtuple("LedgerEntry", ("user_id", "item_type", "category", "created_at", "total"))
+LEDGER_FIELDS = ("user_id", "item_type", "category", "created_at", "total")
+# Changing any of these changes the stored total
+TOTAL_FIELDS = ("item_type", "amount", "quantity")
+# Case-insensitive, per-user unique indexes on (user_id, lower(name)), see migration 0011
+BUDGET_ITEM_NAME_INDEX = "budgetitem_user_name_uniq"
+BUDGET_NAME_INDEX = "budget_user_name_uniq"
+# Columns an upsert overwrites on an existing budget item
+UPSERT_FIELDS = ("name", "item_type", "amount", "quantity", "category", "total", "updated_at")
 
-class BudgetItem(BaseModel, Timestampable):
+
+class UpsertConflict(Exception):
+    """A row matched by an upsert was inserted concurrently after it was looked up."""
+
+
+class BudgetItem(BaseModel, Timestampable, Versionable):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -26,10 +46,10 @@ class BudgetItem(BaseModel, Timestampable):
         help_text=_("The type of budget item.")
     )
 
+    # Unique per user, case-insensitively: BUDGET_ITEM_NAME_INDEX
     name = models.CharField(
         max_length=20, 
         help_text=_("The name of the budget item"),
-        unique=True,
     )
 
     amount = models.DecimalField(
@@ -47,17 +67,40 @@ class BudgetItem(BaseModel, Timestampable):
         "of the budget item. Defaults to 1. Quantity is required if `type` is `EXPENSE`.")
     )
 
+    category = models.CharField(
+        max_length=14,
+        choices=ModelChoices.BUDGET_CATEGORY,
+        default=ModelChoices.BUDGET_CATEGORY_GENERAL,
+        help_text=_("The category of the budget item")
+    )
+
     linked_to_budget = models.BooleanField(
         default=False,
         help_text=_("A flag to determine if budget item is linked to a budget."),
         editable=False
     )
 
+    total = models.DecimalField(
+        default=0,
+        decimal_places=2,
+        max_digits=14,
+        editable=False,
+        help_text=_("Quantity times amount for an expense, the amount for an income. Kept in sync on save.")
+    )
+
     #Metadata
     class Meta :
         verbose_name = _("Budget Item")
         verbose_name_plural = _("Budget Item")
         ordering = ['-created_at']
+        indexes = [
+            # Backs keyset pagination of a user's items on (created_at, id)
+            models.Index(fields=["user", "-created_at", "-id"], name="budgetitem_user_created_idx"),
+            # Backs ordering and range filters of a user's items on total
+            models.Index(fields=["user", "total", "id"], name="budgetitem_user_total_idx"),
+            # Backs the max(updated_at) and count of the ETag of a user's items
+            models.Index(fields=["user", "updated_at"], name="budgetitem_user_updated_idx"),
+        ]
 
 
     def __str__(self) -> str:
@@ -68,21 +111,54 @@ class BudgetItem(BaseModel, Timestampable):
         """Returns list of budgets item is/are linked"""
         pass
     
-    @property
-    def total(self) -> str:
-        if self.item_type == "EXPENSE":
-            return self.quantity * self.amount
+    def compute_total(self) -> Decimal:
+        """Returns the line total the `total` column stores."""
+        if self.item_type == ModelChoices.BUDGET_ITEM_TYPE_EXPENSES:
+            total = (self.quantity or 0) * self.amount
         else:
-            return self.amount
+            total = self.amount
+        return Decimal(total).quantize(Decimal("0.01"))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the row contributes, so that an update can be applied
+        # to the totals and rollups as a delta without reading the row again.
+        if set(LEDGER_FIELDS) <= set(field_names):
+            instance._loaded_entry = instance.ledger_entry()
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.total = self.compute_total()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and set(update_fields) & set(TOTAL_FIELDS):
+            kwargs["update_fields"] = {*update_fields, "total"}
+        # post_save moves the totals and rollups, they commit with the row
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+        self._loaded_entry = self.ledger_entry()
+
+    def ledger_entry(self) -> LedgerEntry:
+        """Returns the current contribution of the budget item to the user's books."""
+        return LedgerEntry(self.user_id, self.item_type, self.category, self.created_at, self.total)
+
+    @property
+    def previous_ledger_entry(self):
+        """The contribution of the budget item as last loaded from or saved to the database."""
+        if (entry := getattr(self, "_loaded_entry", None)) is None and not self._state.adding:
+            entry = self.__class__.objects.get(pk=self.pk).ledger_entry()
+        return entry
     
     @classmethod
     def create(
-        cls, 
-        user:User, 
-        name:str, 
-        amount:float, 
-        quantity:int=None, 
-        item_type:str=ModelChoices.BUDGET_ITEM_TYPE_EXPENSES):
+        cls,
+        user: User,
+        name: str,
+        amount: float,
+        quantity: int = None,
+        item_type: str = ModelChoices.BUDGET_ITEM_TYPE_EXPENSES,
+        category: str = ModelChoices.BUDGET_CATEGORY_GENERAL,
+    ):
         """
         Creates a Budget Item
 
@@ -92,17 +168,173 @@ class BudgetItem(BaseModel, Timestampable):
             amount (float): The amount of the budget item
             quantity (int, optional): The quantity of the budget item if type is an expense
             item_type (str, optional): The type of the budget item. Defaults to ModelChoices.BUDGET_ITEM_TYPE_EXPENSES.
+            category (str, optional): The category of the budget item. Defaults to ModelChoices.BUDGET_CATEGORY_GENERAL.
         """
         logger.info(f"Create a budget item: {item_type}")
         if item_type == ModelChoices.BUDGET_ITEM_TYPE_EXPENSES:
-            return cls.objects.create(user=user, name=name, quantity=quantity, amount=amount)
+            return cls.objects.create(user=user, name=name, quantity=quantity, amount=amount, category=category)
 
         else:
-            return cls.objects.create(user=user, name=name, amount=amount, item_type="INCOME")
+            return cls.objects.create(user=user, name=name, amount=amount, item_type="INCOME", category=category)
 
+    @classmethod
+    def existing_names(cls, user: User, names) -> set:
+        """Returns which of ``names`` the user has taken, lower-cased, with a single index lookup."""
+        return set(
+            cls.objects.annotate(name_lower=Lower("name"))
+            .filter(user=user, name_lower__in={name.lower() for name in names})
+            .order_by()
+            .values_list("name_lower", flat=True)
+        )
+
+    @classmethod
+    def build_items(cls, user: User, items: list) -> list:
+        """Returns unsaved Budget Items, with their total, for ``items`` mappings."""
+        budget_items = []
+        for item in items:
+            item_type = item.get("item_type", ModelChoices.BUDGET_ITEM_TYPE_EXPENSES)
+            category = item.get("category", ModelChoices.BUDGET_CATEGORY_GENERAL)
+            if item_type == ModelChoices.BUDGET_ITEM_TYPE_EXPENSES:
+                budget_items.append(cls(
+                    user=user, name=item["name"], quantity=item.get("quantity"), amount=item["amount"],
+                    category=category))
+            else:
+                budget_items.append(cls(
+                    user=user, name=item["name"], amount=item["amount"], item_type="INCOME", category=category))
+            # bulk_create does not call save()
+            budget_items[-1].total = budget_items[-1].compute_total()
+        return budget_items
+
+    @classmethod
+    def bulk_create_items(cls, user: User, items: list, batch_size: int = 500):
+        """
+        Creates many Budget Items with one INSERT per batch.
+
+        ``bulk_create`` does not send ``post_save``, so ``budget_items_bulk_created``
+        is sent once for the whole list instead, inside the same transaction.
+
+        Args:
+            user (User): The owner of the budget items
+            items (list): Mappings with `name`, `amount`, `item_type`, `category` and, for expenses, `quantity`
+            batch_size (int, optional): The number of rows per INSERT. Defaults to 500.
+        """
+        logger.info(f"Bulk create {len(items)} budget items")
+        budget_items = cls.build_items(user, items)
+
+        with transaction.atomic():
+            budget_items = cls.objects.bulk_create(budget_items, batch_size=batch_size)
+            budget_items_bulk_created.send(sender=cls, user=user, items=budget_items)
+        for budget_item in budget_items:
+            budget_item._loaded_entry = budget_item.ledger_entry()
+        return budget_items
+
+    @classmethod
+    def upsert_items(cls, user: User, items: list, attempts: int = 3):
+        """
+        Creates or updates Budget Items by case-insensitive name with a single
+        ``INSERT ... ON CONFLICT (user_id, lower(name)) DO UPDATE``.
+
+        The rows being replaced are read and locked first, so that the totals
+        and rollups can be moved by the difference (``budget_items_bulk_upserted``).
+        Names must be unique within ``items``.
+
+        Args:
+            user (User): The owner of the budget items
+            items (list): Mappings with `name`, `amount`, `item_type`, `category` and, for expenses, `quantity`
+            attempts (int, optional): How often to retry when a name is inserted concurrently. Defaults to 3.
+
+        Returns:
+            tuple: The created and the updated Budget Items
+        """
+        logger.info(f"Upsert {len(items)} budget items")
+        for attempt in range(1, attempts + 1):
+            try:
+                with transaction.atomic():
+                    return cls._upsert_items(user, items)
+            except UpsertConflict:
+                if attempt == attempts:
+                    raise
+                logger.info(f"Upsert of budget items raced with an insert, retrying ({attempt}/{attempts})")
+
+    @classmethod
+    def _upsert_items(cls, user, items):
+        budget_items = cls.build_items(user, items)
+        existing = {
+            item.name.lower(): item
+            for item in cls.objects.select_for_update()
+            .annotate(name_lower=Lower("name"))
+            .filter(user=user, name_lower__in={item.name.lower() for item in budget_items})
+        }
+        previous = [item.ledger_entry() for item in existing.values()]
 
+        opts = cls._meta
+        quote_name = connection.ops.quote_name
+        fields = opts.concrete_fields
+        columns = ", ".join(quote_name(field.column) for field in fields)
+        row = "(" + ", ".join(["%s"] * len(fields)) + ")"
+        table = quote_name(opts.db_table)
+        version = quote_name(opts.get_field("version").column)
+        updates = ", ".join(
+            f"{quote_name(column)} = EXCLUDED.{quote_name(column)}"
+            for column in (opts.get_field(name).column for name in UPSERT_FIELDS)
+        ) + f", {version} = {table}.{version} + 1"
+        params = [
+            field.get_db_prep_save(field.pre_save(item, True), connection)
+            for item in budget_items for field in fields
+        ]
+        user_column, name_column = quote_name(opts.get_field("user").column), quote_name(opts.get_field("name").column)
+        sql = (
+            f"INSERT INTO {table} ({columns}) VALUES {', '.join([row] * len(budget_items))} "
+            f"ON CONFLICT ({user_column}, lower({name_column})) "
+            f"DO UPDATE SET {updates} "
+            f"RETURNING {quote_name(opts.pk.column)}, lower({name_column})"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            saved_ids = {name: opts.pk.to_python(pk) for pk, name in cursor.fetchall()}
 
-class Budget(models.Model):
+        created, updated = [], []
+        for item in budget_items:
+            name = item.name.lower()
+            if saved_ids[name] == item.pk:
+                created.append(item)
+            elif name in existing:
+                # The row keeps its id, creation date and budget links
+                current = existing[name]
+                for field_name in UPSERT_FIELDS:
+                    setattr(current, field_name, getattr(item, field_name))
+                current.version += 1
+                updated.append(current)
+            else:
+                raise UpsertConflict(name)
+
+        budget_items_bulk_upserted.send(sender=cls, user=user, items=created + updated, previous=previous)
+        for budget_item in created + updated:
+            budget_item._loaded_entry = budget_item.ledger_entry()
+        return created, updated
+
+
+class BudgetQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotates `income_total`, `expense_total` and `net` computed over the
+        budget items in the same query, and prefetches the items.
+        """
+        zero = Value(0, output_field=DecimalField(max_digits=14, decimal_places=2))
+        return self.annotate(
+            income_total=Coalesce(
+                Sum("budget_items__total", filter=Q(budget_items__item_type=ModelChoices.BUDGET_ITEM_TYPE_INCOME)), zero
+            ),
+            expense_total=Coalesce(
+                Sum("budget_items__total", filter=Q(budget_items__item_type=ModelChoices.BUDGET_ITEM_TYPE_EXPENSES)),
+                zero
+            ),
+        ).annotate(
+            net=F("income_total") - F("expense_total")
+        ).prefetch_related("budget_items")
+
+
+class Budget(Timestampable, Versionable):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -115,6 +347,7 @@ class Budget(models.Model):
         help_text=_("The category of the budget")
     )
 
+    # Unique per user, case-insensitively: BUDGET_NAME_INDEX
     name = models.CharField(
         max_length=75,
         help_text=_("The name of the budget. This is the friendly name of the budget.")
@@ -125,6 +358,73 @@ class Budget(models.Model):
         help_text=_("The items of the budget")
     )
 
+    objects = BudgetQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Backs keyset pagination of a user's budgets on (created_at, id)
+            models.Index(fields=["user", "-created_at", "-id"], name="budget_user_created_idx"),
+        ]
+
     def __str__(self) -> str:
         return self.name
 
+
+class BudgetRollup(models.Model):
+    """
+    Incrementally maintained sums of a user's budget items per week or month,
+    item type and category. See ``budget.rollups``.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        editable=False
+    )
+
+    period = models.CharField(
+        max_length=5,
+        choices=ModelChoices.ROLLUP_PERIOD,
+        help_text=_("The length of the period")
+    )
+
+    period_start = models.DateField(
+        help_text=_("The first day of the period, a Monday for weeks")
+    )
+
+    item_type = models.CharField(
+        max_length=7,
+        choices=ModelChoices.BUDGET_ITEM_TYPE,
+        help_text=_("The type of the budget items")
+    )
+
+    category = models.CharField(
+        max_length=14,
+        choices=ModelChoices.BUDGET_CATEGORY,
+        help_text=_("The category of the budget items")
+    )
+
+    total = models.DecimalField(
+        default=0,
+        decimal_places=2,
+        max_digits=14,
+        help_text=_("The sum of the totals of the budget items")
+    )
+
+    count = models.IntegerField(
+        default=0,
+        help_text=_("The number of budget items")
+    )
+
+    class Meta:
+        verbose_name = _("Budget Rollup")
+        verbose_name_plural = _("Budget Rollups")
+        ordering = ["period_start", "item_type", "category"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "period", "period_start", "item_type", "category"], name="unique_budget_rollup"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.period} {self.period_start}: {self.item_type} {self.category}"
@@ -0,0 +1,120 @@
+import logging
+
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from budget.models import Budget, BudgetItem
+from budget.rollups import apply_rollup_deltas, rollup_deltas
+from budget.signals import budget_items_bulk_created, budget_items_bulk_upserted
+from helpers.caching import invalidate_user_results
+from helpers.events import publish
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=BudgetItem)
+def update_rollups_on_save(sender, instance, created, *args, **kwargs):
+    # Runs before BudgetItem.save refreshes the snapshot, so this is the row as
+    # it was before the save.
+    previous = None if created else instance.previous_ledger_entry
+    apply_rollup_deltas(rollup_deltas(added=[instance.ledger_entry()], removed=[previous] if previous else ()))
+
+
+@receiver(pre_delete, sender=BudgetItem)
+def update_rollups_on_delete(sender, instance, *args, **kwargs):
+    apply_rollup_deltas(rollup_deltas(removed=[instance.previous_ledger_entry or instance.ledger_entry()]))
+
+
+@receiver(m2m_changed, sender=Budget.budget_items.through)
+def touch_budgets_on_items_change(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    """
+    Changing the items of a budget does not save it; bump its ``updated_at``
+    so that its ETag and ``Last-Modified`` follow (see helpers.conditional),
+    and its version so that concurrent edits of the budget conflict.
+    """
+    if action not in ("post_add", "post_remove", "pre_clear") or (action != "pre_clear" and not pk_set):
+        return
+    if not reverse:
+        budgets = Budget.objects.filter(pk=instance.pk)
+        # Keeps the instance at hand saveable
+        instance.version += 1
+    elif action == "pre_clear":
+        budgets = instance.budget_set.all()
+    else:
+        budgets = Budget.objects.filter(pk__in=pk_set)
+    budgets.update(updated_at=timezone.now(), version=F("version") + 1)
+
+
+@receiver(budget_items_bulk_created, sender=BudgetItem)
+def update_rollups_on_bulk_create(sender, items, *args, **kwargs):
+    logger.info(f"{__name__}: Updating rollups for {len(items)} budget items")
+    apply_rollup_deltas(rollup_deltas(added=[item.ledger_entry() for item in items]))
+
+
+@receiver(budget_items_bulk_upserted, sender=BudgetItem)
+def update_rollups_on_bulk_upsert(sender, items, previous, *args, **kwargs):
+    logger.info(f"{__name__}: Updating rollups for {len(items)} upserted budget items")
+    apply_rollup_deltas(rollup_deltas(added=[item.ledger_entry() for item in items], removed=previous))
+
+
+# Cached API results (helpers.caching) of a user are dropped whenever one of
+# their budget items or budgets changes. Budgets embed their items and totals,
+# so both invalidate the same per-user generation.
+
+@receiver(post_save, sender=BudgetItem)
+@receiver(pre_delete, sender=BudgetItem)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def invalidate_results_on_change(sender, instance, *args, **kwargs):
+    invalidate_user_results(instance.user_id)
+
+
+@receiver(budget_items_bulk_created, sender=BudgetItem)
+@receiver(budget_items_bulk_upserted, sender=BudgetItem)
+def invalidate_results_on_bulk_change(sender, user, *args, **kwargs):
+    invalidate_user_results(user.pk)
+
+
+@receiver(m2m_changed, sender=Budget.budget_items.through)
+def invalidate_results_on_budget_items_change(sender, instance, action, *args, **kwargs):
+    if action.startswith("post_"):
+        invalidate_user_results(instance.user_id)
+
+
+# Live connections (config.websocket) of the user are told about every change
+# of their budget items and budgets, once it commits.
+EVENT_NAMES = {BudgetItem: "budget_item", Budget: "budget"}
+
+
+@receiver(post_save, sender=BudgetItem)
+@receiver(post_save, sender=Budget)
+def publish_saved(sender, instance, created, *args, **kwargs):
+    publish(instance.user_id, f"{EVENT_NAMES[sender]}.{'created' if created else 'updated'}", id=instance.pk)
+
+
+@receiver(post_delete, sender=BudgetItem)
+@receiver(post_delete, sender=Budget)
+def publish_deleted(sender, instance, *args, **kwargs):
+    publish(instance.user_id, f"{EVENT_NAMES[sender]}.deleted", id=instance.pk)
+
+
+@receiver(budget_items_bulk_created, sender=BudgetItem)
+@receiver(budget_items_bulk_upserted, sender=BudgetItem)
+def publish_bulk_saved(sender, user, items, *args, **kwargs):
+    # One event for the batch, ids would not fit in a notification
+    publish(user.pk, "budget_items.saved", count=len(items))
+
+
+@receiver(m2m_changed, sender=Budget.budget_items.through)
+def publish_budget_items_change(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        publish(instance.user_id, "budget.updated", id=instance.pk)
+    elif pk_set:
+        for budget_id in pk_set:
+            publish(instance.user_id, "budget.updated", id=budget_id)
+    else:
+        publish(instance.user_id, "budgets.updated")
@@ -0,0 +1,137 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from budget.choices import ModelChoices
+from budget.models import BudgetItem, BudgetRollup
+from helpers.caching import invalidate_user_results
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+ROLLUP_PERIODS = (ModelChoices.ROLLUP_PERIOD_WEEK, ModelChoices.ROLLUP_PERIOD_MONTH)
+ROLLUP_KEY_FIELDS = ("user", "period", "period_start", "item_type", "category")
+# First key of the advisory locks on the rollups of a user, see lock_rollups
+ROLLUP_LOCK_KEY = 7001
+
+
+def period_start(period, moment):
+    """Returns the first day of the week (Monday) or month ``moment`` falls in, in local time."""
+    day = timezone.localtime(moment).date() if timezone.is_aware(moment) else moment.date()
+    if period == ModelChoices.ROLLUP_PERIOD_WEEK:
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def rollup_deltas(added=(), removed=()):
+    """
+    Sums ledger entries (see ``BudgetItem.ledger_entry``) into the changes to
+    apply to each rollup row, keyed by ``ROLLUP_KEY_FIELDS``. Removed entries
+    count negatively; rows whose change cancels out are left out.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for sign, entries in ((1, added), (-1, removed)):
+        for entry in entries:
+            for period in ROLLUP_PERIODS:
+                key = (entry.user_id, period, period_start(period, entry.created_at), entry.item_type, entry.category)
+                deltas[key][0] += sign * entry.total
+                deltas[key][1] += sign
+    return {key: (total, count) for key, (total, count) in deltas.items() if total or count}
+
+
+def lock_rollups(user_ids, shared=True):
+    """
+    Takes the advisory locks on the rollups of ``user_ids`` until the end of
+    the transaction, in order. Writers applying deltas share them,
+    ``rebuild_rollups`` holds them exclusively from reading the budget items
+    to replacing the rows, so no delta lands in between and gets lost.
+
+    The second key of a lock is 32 bits of the user id: users who share it
+    only wait for each other's rebuilds.
+    """
+    if not user_ids or connection.vendor != "postgresql":
+        return
+    keys = sorted({int.from_bytes(User._meta.pk.to_python(pk).bytes[:4], "big", signed=True) for pk in user_ids})
+    function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {function}(%s, key) FROM unnest(%s::integer[]) AS key", [ROLLUP_LOCK_KEY, keys])
+
+
+def apply_rollup_deltas(deltas):
+    """
+    Adds ``deltas`` to the rollup rows in a single statement, creating missing rows.
+
+    ``INSERT ... ON CONFLICT DO UPDATE`` makes the increment atomic on the row,
+    so concurrent writers never read-modify-write the same totals.
+    """
+    if not deltas:
+        return
+
+    opts = BudgetRollup._meta
+    quote_name = connection.ops.quote_name
+    table = quote_name(opts.db_table)
+    key_fields = [opts.get_field(name) for name in ROLLUP_KEY_FIELDS]
+    total_field, count_field = opts.get_field("total"), opts.get_field("count")
+    key_columns = ", ".join(quote_name(field.column) for field in key_fields)
+    total, count = quote_name(total_field.column), quote_name(count_field.column)
+
+    params = []
+    for key, (delta_total, delta_count) in deltas.items():
+        params.extend(field.get_db_prep_value(value, connection) for field, value in zip(key_fields, key))
+        params.append(total_field.get_db_prep_save(delta_total, connection))
+        params.append(delta_count)
+
+    placeholders = "(" + ", ".join(["%s"] * (len(key_fields) + 2)) + ")"
+    sql = (
+        f"INSERT INTO {table} ({key_columns}, {total}, {count}) "
+        f"VALUES {', '.join([placeholders] * len(deltas))} "
+        f"ON CONFLICT ({key_columns}) DO UPDATE SET "
+        f"{total} = {table}.{total} + EXCLUDED.{total}, "
+        f"{count} = {table}.{count} + EXCLUDED.{count}"
+    )
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        lock_rollups({key[0] for key in deltas})
+        cursor.execute(sql, params)
+    logger.info(f"{__name__}: Applied {len(deltas)} rollup deltas")
+
+
+def rebuild_rollups(user_ids):
+    """
+    Recomputes the rollups of ``user_ids`` from their budget items, replacing
+    the existing rows. Returns the number of rollup rows written.
+
+    The budget items are read and the rows replaced in one transaction under
+    ``lock_rollups``: concurrent writes of these users wait for it, and it
+    waits for those under way, whose items it then reads.
+    """
+    truncs = {
+        ModelChoices.ROLLUP_PERIOD_WEEK: TruncWeek("created_at", output_field=DateField()),
+        ModelChoices.ROLLUP_PERIOD_MONTH: TruncMonth("created_at", output_field=DateField()),
+    }
+    with transaction.atomic():
+        lock_rollups(user_ids, shared=False)
+        rollups = []
+        for period, trunc in truncs.items():
+            rows = (
+                BudgetItem.objects.filter(user_id__in=user_ids)
+                .annotate(period_start=trunc)
+                .values("user_id", "period_start", "item_type", "category")
+                .annotate(sum_total=Sum("total"), count=Count("id"))
+                .order_by()
+            )
+            rollups.extend(
+                BudgetRollup(period=period, total=row.pop("sum_total"), **row) for row in rows
+            )
+
+        BudgetRollup.objects.filter(user_id__in=user_ids).delete()
+        BudgetRollup.objects.bulk_create(rollups, batch_size=1000)
+        for user_id in user_ids:
+            invalidate_user_results(user_id)
+    return len(rollups)
@@ -3,4 +3,13 @@ from django.dispatch import Signal
 
 budget_item_created = Signal()
 
-budget_item_updated = Signal()
\ No newline at end of file
+budget_item_updated = Signal()
+
+# Sent by ``BudgetItem.bulk_create_items`` in place of ``post_save``, which
+# ``bulk_create`` does not send. Receivers get ``user`` and ``items``.
+budget_items_bulk_created = Signal()
+
+# Sent by ``BudgetItem.upsert_items``. Receivers get ``user``, ``items`` (the
+# created and updated budget items) and ``previous`` (the ledger entries of the
+# updated rows before the upsert).
+budget_items_bulk_upserted = Signal()
@@ -0,0 +1,227 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.functions import Lower
+
+from helpers.pagination import keyset_filter
+from helpers.search import autocomplete, fuzzy_search
+from helpers.testing import NOTIFY, ROLLUP_LOCK, QueryBudgetTestCase, QueryPlanTestCase
+
+from .models import Budget, BudgetItem
+
+User = get_user_model()
+
+
+def seed_items(user, size, prefix="Item"):
+    return BudgetItem.bulk_create_items(user=user, items=[
+        {"name": f"{prefix} {i}", "amount": Decimal("1000.00"), "item_type": "INCOME"} if i % 5 == 0
+        else {"name": f"{prefix} {i}", "amount": Decimal("2.50"), "quantity": i % 3 + 1, "category": "GROCERIES"}
+        for i in range(size)
+    ])
+
+
+class BudgetApiQueryBudgetTestCase(QueryBudgetTestCase):
+    query_budgets = {
+        "budget-items-list": 2,
+        "budget-items-filter": 2,
+        "budget-items-search": 2,
+        "budget-items-retrieve": 2,
+        "budget-items-fuzzy-search": 1,
+        "budget-items-autocomplete": 1,
+        "budget-items-create": 4 + NOTIFY + ROLLUP_LOCK,
+        "budget-items-bulk-create": 4 + NOTIFY + ROLLUP_LOCK,
+        # Updates read the validators of their ETag once written
+        "budget-items-update": 6 + NOTIFY + ROLLUP_LOCK,
+        "budget-items-partial-update": 6 + NOTIFY + ROLLUP_LOCK,
+        "budget-items-destroy": 6 + NOTIFY + ROLLUP_LOCK,
+        "budget-items-upsert": 5 + NOTIFY + ROLLUP_LOCK,
+        "budget-items-summary": 1,
+        "budget-items-export": 1,
+        "budget-items-import": 5 + NOTIFY + ROLLUP_LOCK,
+        "budgets-list": 3,
+        "budgets-retrieve": 3,
+        "budgets-fuzzy-search": 2,
+        "budgets-autocomplete": 1,
+        # The budget, its new item and the budget again once the item is added
+        "budgets-create": 10 + 3 * NOTIFY + ROLLUP_LOCK,
+        "budgets-partial-update": 7 + NOTIFY,
+        "budgets-destroy": 4 + NOTIFY,
+    }
+
+    def seed(self, size):
+        user = User.objects.create(username=f"budget_user_{size}", email=f"budget_user_{size}@domain.com")
+        items = seed_items(user, size)
+        budgets = []
+        for i in range(size):
+            budget = Budget.objects.create(user=user, name=f"Budget {i}")
+            budget.budget_items.set(items[:i + 1])
+            budgets.append(budget)
+        return SimpleNamespace(user=user, items=items, budgets=budgets)
+
+    def test_budget_items_list(self):
+        self.assertQueryBudget("budget-items-list", lambda client, data: client.get(
+            "/api/v1.0/budget-items/?page_size=100"
+        ))
+
+    def test_budget_items_filter(self):
+        self.assertQueryBudget("budget-items-filter", lambda client, data: client.get(
+            "/api/v1.0/budget-items/?item_type=EXPENSE&min_total=1&ordering=-total"
+        ))
+
+    def test_budget_items_search(self):
+        self.assertQueryBudget("budget-items-search", lambda client, data: client.get(
+            "/api/v1.0/budget-items/?search=item"
+        ))
+
+    def test_budget_items_fuzzy_search(self):
+        self.assertQueryBudget("budget-items-fuzzy-search", lambda client, data: client.get(
+            "/api/v1.0/budget-items/search/?q=itme&limit=50"
+        ))
+
+    def test_budget_items_autocomplete(self):
+        self.assertQueryBudget("budget-items-autocomplete", lambda client, data: client.get(
+            "/api/v1.0/budget-items/autocomplete/?q=it"
+        ))
+
+    def test_budget_items_retrieve(self):
+        self.assertQueryBudget("budget-items-retrieve", lambda client, data: client.get(
+            f"/api/v1.0/budget-items/{data.items[0].pk}/"
+        ))
+
+    def test_budget_items_create(self):
+        self.assertQueryBudget("budget-items-create", lambda client, data: client.post(
+            "/api/v1.0/budget-items/", {"name": "New item", "amount": "3.00", "quantity": 2}, format="json"
+        ))
+
+    def test_budget_items_bulk_create(self):
+        self.assertQueryBudget("budget-items-bulk-create", lambda client, data: client.post(
+            "/api/v1.0/budget-items/",
+            [{"name": f"New item {i}", "amount": "3.00", "quantity": 2} for i in range(data.size)],
+            format="json"
+        ))
+
+    def test_budget_items_update(self):
+        self.assertQueryBudget("budget-items-update", lambda client, data: client.put(
+            f"/api/v1.0/budget-items/{data.items[-1].pk}/",
+            {"name": "Renamed", "amount": "4.00", "quantity": 3, "item_type": "EXPENSE"},
+            format="json"
+        ))
+
+    def test_budget_items_partial_update(self):
+        self.assertQueryBudget("budget-items-partial-update", lambda client, data: client.patch(
+            f"/api/v1.0/budget-items/{data.items[-1].pk}/", {"amount": "4.00"}, format="json"
+        ))
+
+    def test_budget_items_destroy(self):
+        self.assertQueryBudget("budget-items-destroy", lambda client, data: client.delete(
+            f"/api/v1.0/budget-items/{data.items[-1].pk}/"
+        ))
+
+    def test_budget_items_upsert(self):
+        self.assertQueryBudget("budget-items-upsert", lambda client, data: client.put(
+            "/api/v1.0/budget-items/upsert/",
+            [{"name": f"item {i}", "amount": "5.00", "quantity": 1} for i in range(data.size + 2)],
+            format="json"
+        ))
+
+    def test_budget_items_summary(self):
+        self.assertQueryBudget("budget-items-summary", lambda client, data: client.get(
+            "/api/v1.0/budget-items/summary/?period=WEEK"
+        ))
+
+    def test_budget_items_export(self):
+        self.assertQueryBudget("budget-items-export", lambda client, data: client.get(
+            "/api/v1.0/budget-items/export/?export_format=csv"
+        ))
+
+    def test_budget_items_import(self):
+        def upload(client, data):
+            rows = "".join(f"Imported {i},-{i + 1}.00\n" for i in range(data.size))
+            statement = SimpleUploadedFile("statement.csv", f"name,amount\n{rows}".encode())
+            return client.post("/api/v1.0/budget-items/import/", {"file": statement}, format="multipart")
+
+        self.assertQueryBudget("budget-items-import", upload)
+
+    def test_budgets_list(self):
+        self.assertQueryBudget("budgets-list", lambda client, data: client.get(
+            "/api/v1.0/budgets/?page_size=100"
+        ))
+
+    def test_budgets_retrieve(self):
+        self.assertQueryBudget("budgets-retrieve", lambda client, data: client.get(
+            f"/api/v1.0/budgets/{data.budgets[-1].pk}/"
+        ))
+
+    def test_budgets_fuzzy_search(self):
+        self.assertQueryBudget("budgets-fuzzy-search", lambda client, data: client.get(
+            "/api/v1.0/budgets/search/?q=budget&limit=50"
+        ))
+
+    def test_budgets_autocomplete(self):
+        self.assertQueryBudget("budgets-autocomplete", lambda client, data: client.get(
+            "/api/v1.0/budgets/autocomplete/?q=bud"
+        ))
+
+    def test_budgets_create(self):
+        self.assertQueryBudget("budgets-create", lambda client, data: client.post(
+            "/api/v1.0/budgets/",
+            {"name": "New budget", "budget_items": [{"name": "New item", "amount": "3.00", "quantity": 2}]},
+            format="json"
+        ))
+
+    def test_budgets_partial_update(self):
+        self.assertQueryBudget("budgets-partial-update", lambda client, data: client.patch(
+            f"/api/v1.0/budgets/{data.budgets[-1].pk}/", {"name": "Renamed"}, format="json"
+        ))
+
+    def test_budgets_destroy(self):
+        self.assertQueryBudget("budgets-destroy", lambda client, data: client.delete(
+            f"/api/v1.0/budgets/{data.budgets[-1].pk}/"
+        ))
+
+
+class BudgetItemQueryPlanTestCase(QueryPlanTestCase):
+    users = 40
+    items_per_user = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(cls.users):
+            user = User.objects.create(username=f"plan_user_{i}", email=f"plan_user_{i}@domain.com")
+            seed_items(user, cls.items_per_user, prefix=f"User {i} item")
+        cls.user = user
+
+    def items(self):
+        return BudgetItem.objects.filter(user=self.user)
+
+    def test_list(self):
+        self.assertNoSequentialScan(self.items().order_by("-created_at", "-id")[:50])
+
+    def test_deep_page(self):
+        ordering = ("-created_at", "-id")
+        position = self.items().order_by(*ordering)[400]
+        page = self.items().filter(
+            keyset_filter(BudgetItem, ordering, [position.created_at, position.id])
+        ).order_by(*ordering)[:50]
+        self.assertNoSequentialScan(page)
+        # The cursor bounds the range scan, rather than the pages before it being read and filtered out
+        self.assertIndexCondition(page, "created_at", "id")
+
+    def test_filter_and_order_by_total(self):
+        self.assertNoSequentialScan(self.items().filter(total__gte=5).order_by("-total", "-id")[:50])
+
+    def test_name_lookup(self):
+        self.assertNoSequentialScan(
+            self.items().annotate(name_lower=Lower("name")).filter(name_lower__in=["user 39 item 7"])
+        )
+
+    def test_search(self):
+        self.assertNoSequentialScan(self.items().filter(name__icontains="item 7"))
+
+    def test_fuzzy_search(self):
+        self.assertNoSequentialScan(fuzzy_search(self.items(), "itme 7")[:10])
+
+    def test_autocomplete(self):
+        self.assertNoSequentialScan(autocomplete(self.items(), "user 39 item 4")[:10])
@@ -1,8 +1,27 @@
+import asyncio
+import io
+import json
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-from .models import BudgetItem
+from helpers.caching import result_cache_enabled, result_cache_stats
+from helpers.testing import NOTIFY, ROLLUP_LOCK, MigrationTestCase, QueryCounter
+
+from .common import VersionConflict
+from .exports import EXPORT_FORMAT_CSV, BudgetItemExport
+from .imports import BudgetItemImporter, statement_row
+from .models import Budget, BudgetItem, BudgetRollup
+from .rollups import rebuild_rollups
 
 User = get_user_model()
 
@@ -35,4 +54,752 @@ class BudgetItemTestCase(TestCase):
     
     def test_user_expense(self):
         user = User.objects.get(username="test_user")
-        self.assertEqual(str(user.expenses), "{:.2f}".format(117.25))
\ No newline at end of file
+        self.assertEqual(str(user.expenses), "{:.2f}".format(117.25))
+
+    def test_user_totals_follow_updates(self):
+        bread = BudgetItem.objects.get(name="Bread")
+        bread.quantity = 2
+        bread.save()
+        user = User.objects.get(username="test_user")
+        self.assertEqual(str(user.expenses), "46.90")
+
+        bread.item_type = "INCOME"
+        bread.save()
+        bread.delete()
+        user = User.objects.get(username="test_user")
+        self.assertEqual(str(user.income), "2500.17")
+        self.assertEqual(str(user.expenses), "0.00")
+
+
+class BudgetItemBulkCreateTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="bulk_user", email="bulk_user@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_updates_totals_once(self):
+        payload = [
+            {"name": "Milk", "amount": "2.50", "quantity": 4},
+            {"name": "Rent", "amount": "900.00", "quantity": 1},
+            {"name": "Wages", "amount": "3000.00", "item_type": "INCOME"},
+        ]
+        # INSERT + user row lock and totals UPDATE + rollups lock and upsert + the event, plus savepoints
+        with self.assertNumQueries(8 + NOTIFY + ROLLUP_LOCK):
+            response = self.client.post("/api/v1.0/budget-items/", payload, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        self.user.refresh_from_db()
+        self.assertEqual(str(self.user.income), "3000.00")
+        self.assertEqual(str(self.user.expenses), "910.00")
+
+    def test_bulk_create_rejects_duplicate_names(self):
+        BudgetItem.create(user=self.user, name="Milk", amount=Decimal("2.50"), quantity=1)
+        payload = [
+            {"name": "Bread", "amount": "1.00", "quantity": 1},
+            {"name": "milk", "amount": "2.50", "quantity": 1},
+            {"name": "BREAD", "amount": "1.00", "quantity": 1},
+        ]
+        response = self.client.post("/api/v1.0/budget-items/", payload, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("name", response.data[1])
+        self.assertIn("name", response.data[2])
+        self.assertEqual(BudgetItem.objects.filter(user=self.user).count(), 1)
+
+
+class BudgetItemNameUniquenessTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="unique_user", email="unique_user@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        BudgetItem.create(user=self.user, name="Milk", amount=Decimal("2.50"), quantity=2)
+
+    def test_duplicate_name_is_a_friendly_error(self):
+        response = self.client.post("/api/v1.0/budget-items/", {"name": "MILK", "amount": "1.00"}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"][0]["code"], "name_already_exist")
+        self.assertEqual(response.data["errors"][0]["field"], "name")
+
+    def test_names_are_unique_per_user(self):
+        other = User.objects.create(username="other_user", email="other_user@domain.com")
+        self.client.force_authenticate(other)
+        response = self.client.post("/api/v1.0/budget-items/", {"name": "Milk", "amount": "1.00"}, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_bulk_create_reports_names_taken_in_database(self):
+        payload = [{"name": "Bread", "amount": "1.00"}, {"name": "milk", "amount": "1.00"}]
+        response = self.client.post("/api/v1.0/budget-items/", payload, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("name", response.data[1])
+
+    def test_upsert_by_name(self):
+        payload = [
+            {"name": "milk", "amount": "3.00", "quantity": 2, "category": "GROCERIES"},
+            {"name": "Wages", "amount": "1000.00", "item_type": "INCOME"},
+        ]
+        response = self.client.put("/api/v1.0/budget-items/upsert/", payload, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["name"] for item in response.data["created"]], ["Wages"])
+        self.assertEqual([item["total"] for item in response.data["updated"]], [Decimal("6.00")])
+        milk = BudgetItem.objects.get(user=self.user, name__iexact="milk")
+        self.assertEqual((milk.name, milk.total, milk.category), ("milk", Decimal("6.00"), "GROCERIES"))
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.income, self.user.expenses), (Decimal("1000.00"), Decimal("6.00")))
+        self.assertEqual(
+            sorted(BudgetRollup.objects.filter(user=self.user, period="MONTH").values_list("category", "total")),
+            [("GENERAL", Decimal("0.00")), ("GENERAL", Decimal("1000.00")), ("GROCERIES", Decimal("6.00"))]
+        )
+
+    def test_duplicate_budget_name(self):
+        Budget.objects.create(user=self.user, name="Holidays")
+        response = self.client.post(
+            "/api/v1.0/budgets/", {"name": "holidays", "budget_items": []}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"][0]["field"], "name")
+
+
+class NameUniquenessMigrationTestCase(MigrationTestCase):
+    migrate_from = [("budget", "0010_budgetitem_total")]
+    migrate_to = [("budget", "0011_per_user_name_uniqueness")]
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model("users", "User")
+        BudgetItem, Budget = apps.get_model("budget", "BudgetItem"), apps.get_model("budget", "Budget")
+        user = User.objects.create(username="household", email="household@domain.com")
+        other = User.objects.create(username="neighbour", email="neighbour@domain.com")
+        for name in ("Bread", "bread", "Weekly grocery shops", "weekly grocery shops"):
+            BudgetItem.objects.create(user=user, name=name, amount=Decimal("1.00"), quantity=1)
+        BudgetItem.objects.create(user=other, name="BREAD", amount=Decimal("1.00"), quantity=1)
+        for name in ("January", "January", "january", "January (2)"):
+            Budget.objects.create(user=user, name=name)
+        Budget.objects.create(user=other, name="January")
+
+    def names(self, model_name, username):
+        model = self.apps.get_model("budget", model_name)
+        return list(model.objects.filter(user__username=username).order_by("created_at", "id").values_list(
+            "name", flat=True
+        ))
+
+    def test_duplicates_are_renamed(self):
+        self.assertEqual(self.names("BudgetItem", "household"), [
+            "Bread", "bread (2)", "Weekly grocery shops", "weekly grocery s (2)"
+        ])
+        self.assertEqual(self.names("Budget", "household"), ["January", "January (3)", "january (4)", "January (2)"])
+        self.assertEqual(self.names("BudgetItem", "neighbour"), ["BREAD"])
+        self.assertEqual(self.names("Budget", "neighbour"), ["January"])
+
+
+class BudgetItemKeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="paging_user", email="paging_user@domain.com")
+        BudgetItem.bulk_create_items(
+            user=self.user,
+            items=[{"name": f"Item {i}", "amount": Decimal("1.00"), "quantity": 1} for i in range(7)]
+        )
+        # Ties on created_at must be broken by id, not skipped or repeated
+        BudgetItem.objects.filter(user=self.user).update(created_at=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_walks_every_item_once(self):
+        seen, url = [], "/api/v1.0/budget-items/?page_size=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(set(seen), {str(pk) for pk in BudgetItem.objects.values_list("id", flat=True)})
+
+    def test_include_count(self):
+        response = self.client.get("/api/v1.0/budget-items/?page_size=3&include_count=true")
+        self.assertEqual(response.data["count"], 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/v1.0/budget-items/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+class BudgetItemTotalTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="total_user", email="total_user@domain.com")
+        BudgetItem.bulk_create_items(user=self.user, items=[
+            {"name": f"Item {i}", "amount": Decimal("2.50"), "quantity": i} for i in range(1, 6)
+        ] + [{"name": "Wages", "amount": Decimal("7.00"), "item_type": "INCOME"}])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_total_is_stored(self):
+        item = BudgetItem.objects.get(name="Item 3")
+        self.assertEqual(item.total, Decimal("7.50"))
+
+        item.quantity = 4
+        item.save(update_fields=["quantity"])
+        self.assertEqual(BudgetItem.objects.get(pk=item.pk).total, Decimal("10.00"))
+
+    def test_order_and_filter_by_total(self):
+        totals, url = [], "/api/v1.0/budget-items/?ordering=-total&min_total=5&max_total=12&page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            totals.extend(item["total"] for item in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(totals, [Decimal("10.00"), Decimal("7.50"), Decimal("7.00"), Decimal("5.00")])
+
+
+class BudgetRollupMigrationTestCase(MigrationTestCase):
+    migrate_from = [("budget", "0008_keyset_pagination_indexes")]
+    migrate_to = [("budget", "0009_budget_rollups")]
+
+    def setUpBeforeMigration(self, apps):
+        user = apps.get_model("users", "User").objects.create(username="migrated", email="migrated@domain.com")
+        BudgetItem = apps.get_model("budget", "BudgetItem")
+        BudgetItem.objects.create(user=user, name="Milk", amount=Decimal("2.50"), quantity=3)
+        BudgetItem.objects.create(user=user, name="Bread", amount=Decimal("1.00"), quantity=None)
+        BudgetItem.objects.create(user=user, name="Wages", amount=Decimal("7.00"), item_type="INCOME")
+
+    def test_existing_items_are_rolled_up(self):
+        rollups = self.apps.get_model("budget", "BudgetRollup").objects.filter(period="MONTH")
+        self.assertEqual(sorted(rollups.values_list("item_type", "category", "total", "count")), [
+            ("EXPENSE", "GENERAL", Decimal("7.50"), 2),
+            ("INCOME", "GENERAL", Decimal("7.00"), 1),
+        ])
+        self.assertEqual(self.apps.get_model("budget", "BudgetRollup").objects.filter(period="WEEK").count(), 2)
+
+
+class BudgetItemTotalMigrationTestCase(MigrationTestCase):
+    migrate_from = [("budget", "0009_budget_rollups")]
+    migrate_to = [("budget", "0010_budgetitem_total")]
+
+    def setUpBeforeMigration(self, apps):
+        user = apps.get_model("users", "User").objects.create(username="migrated", email="migrated@domain.com")
+        BudgetItem = apps.get_model("budget", "BudgetItem")
+        BudgetItem.objects.create(user=user, name="No quantity", amount=Decimal("4.00"), quantity=None)
+        BudgetItem.objects.create(user=user, name="Milk", amount=Decimal("2.50"), quantity=3)
+        BudgetItem.objects.create(user=user, name="Wages", amount=Decimal("7.00"), item_type="INCOME")
+
+    def test_totals_are_filled(self):
+        totals = dict(self.apps.get_model("budget", "BudgetItem").objects.values_list("name", "total"))
+        self.assertEqual(totals, {"No quantity": Decimal("0.00"), "Milk": Decimal("7.50"), "Wages": Decimal("7.00")})
+
+
+class BudgetItemExportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="export_user", email="export_user@domain.com")
+        BudgetItem.bulk_create_items(user=self.user, items=[
+            {"name": "Coffee", "amount": Decimal("3.20"), "quantity": 2},
+            {"name": "Wages", "amount": Decimal("3000.00"), "item_type": "INCOME"},
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_export_ndjson(self):
+        response = self.client.get("/api/v1.0/budget-items/export/")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual({row["name"] for row in rows}, {"Coffee", "Wages"})
+
+    def test_export_csv_honours_filters(self):
+        response = self.client.get("/api/v1.0/budget-items/export/?export_format=csv&item_type=EXPENSE")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["id", "item_type", "name"])
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Coffee", lines[1])
+
+
+class BudgetItemAsyncExportTestCase(TransactionTestCase):
+    def test_async_export_reads_in_chunks(self):
+        user = User.objects.create(username="async_export_user", email="async_export_user@domain.com")
+        BudgetItem.bulk_create_items(
+            user=user,
+            items=[{"name": f"Item {i}", "amount": Decimal("1.00"), "quantity": 1} for i in range(5)]
+        )
+        export = BudgetItemExport(BudgetItem.objects.filter(user=user), EXPORT_FORMAT_CSV, chunk_size=2)
+
+        async def collect():
+            return [chunk async for chunk in export]
+
+        chunks = asyncio.run(collect())
+        # header + 3 chunks of at most 2 rows
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual("".join(chunks), "".join(export))
+
+
+class BudgetItemImportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="import_user", email="import_user@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content):
+        return self.client.post(
+            "/api/v1.0/budget-items/import/",
+            {"file": SimpleUploadedFile(name, content.encode())},
+            format="multipart"
+        )
+
+    def test_import_csv_reports_row_errors(self):
+        response = self.upload("statement.csv", (
+            "name,amount,item_type,quantity\n"
+            "Salary,2500.00,INCOME,\n"
+            "Groceries,-45.10,,\n"
+            "X,10.00,EXPENSE,1\n"
+            "groceries,1.00,EXPENSE,1\n"
+            "Fuel,not-a-number,EXPENSE,1\n"
+        ))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [3, 4, 5])
+        self.user.refresh_from_db()
+        self.assertEqual(str(self.user.income), "2500.00")
+        self.assertEqual(str(self.user.expenses), "45.10")
+
+    def test_import_ofx(self):
+        response = self.upload("statement.ofx", (
+            "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+            "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20221001<TRNAMT>-12.50<NAME>Cinema tickets for the family</STMTTRN>\n"
+            "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20221002<TRNAMT>100.00<MEMO>Refund</STMTTRN>\n"
+            "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+        ))
+
+        self.assertEqual(response.data["created"], 2)
+        expense = BudgetItem.objects.get(user=self.user, item_type="EXPENSE")
+        self.assertEqual(expense.name, "Cinema tickets for t")
+        self.assertEqual(expense.total, Decimal("12.50"))
+
+    def test_values_out_of_range_are_row_errors(self):
+        rows = [
+            statement_row("Milk", "-2.50", quantity="40000"),
+            # Fits the item, not the 9 digits of the user's expenses
+            statement_row("Yacht", "-9999999.00", quantity="2"),
+            statement_row("Bread", "-1.00"),
+        ]
+        result = BudgetItemImporter(self.user, batch_size=1).run(rows)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([error["row"] for error in result.errors], [1, 2])
+        self.assertIn("quantity", result.errors[0]["errors"])
+        self.assertEqual(list(BudgetItem.objects.filter(user=self.user).values_list("name", flat=True)), ["Bread"])
+
+    def test_import_csv_cuts_long_names(self):
+        response = self.upload("statement.csv", (
+            "description,amount\n"
+            "CARD PAYMENT TO SUPERMARKET LTD ON 01/10,-20.00\n"
+        ))
+
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(BudgetItem.objects.get(user=self.user).name, "CARD PAYMENT TO SUPE")
+
+
+class BudgetRollupTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="rollup_user", email="rollup_user@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def rollups(self, period="MONTH"):
+        return sorted(
+            BudgetRollup.objects.filter(user=self.user, period=period)
+            .values_list("item_type", "category", "total", "count")
+        )
+
+    def test_rollups_follow_create_update_delete(self):
+        bread = BudgetItem.create(user=self.user, name="Bread", amount=2, quantity=3, category="GROCERIES")
+        BudgetItem.create(user=self.user, name="Wages", amount=1000, item_type="INCOME")
+        self.assertEqual(self.rollups(), [
+            ("EXPENSE", "GROCERIES", Decimal("6.00"), 1),
+            ("INCOME", "GENERAL", Decimal("1000.00"), 1),
+        ])
+
+        bread = BudgetItem.objects.get(pk=bread.pk)
+        bread.quantity = 5
+        bread.category = "FAMILY"
+        bread.save()
+        self.assertEqual(self.rollups("WEEK"), [
+            ("EXPENSE", "FAMILY", Decimal("10.00"), 1),
+            ("EXPENSE", "GROCERIES", Decimal("0.00"), 0),
+            ("INCOME", "GENERAL", Decimal("1000.00"), 1),
+        ])
+
+        bread.delete()
+        self.assertEqual(self.rollups()[:2], [
+            ("EXPENSE", "FAMILY", Decimal("0.00"), 0),
+            ("EXPENSE", "GROCERIES", Decimal("0.00"), 0),
+        ])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        BudgetItem.bulk_create_items(user=self.user, items=[
+            {"name": "Milk", "amount": Decimal("1.50"), "quantity": 4, "category": "GROCERIES"},
+            {"name": "Rent", "amount": Decimal("800.00"), "quantity": 1, "category": "RENT"},
+            {"name": "Wages", "amount": Decimal("3000.00"), "item_type": "INCOME"},
+        ])
+        BudgetItem.create(user=self.user, name="Eggs", amount=Decimal("0.25"), quantity=12, category="GROCERIES")
+        incremental = {period: self.rollups(period) for period in ("WEEK", "MONTH")}
+
+        BudgetRollup.objects.all().delete()
+        call_command("rebuild_rollups", workers=1, stdout=io.StringIO())
+
+        self.assertEqual({period: self.rollups(period) for period in ("WEEK", "MONTH")}, incremental)
+        self.assertIn(("EXPENSE", "GROCERIES", Decimal("9.00"), 2), incremental["MONTH"])
+
+    def test_summary_reads_rollups(self):
+        BudgetItem.create(user=self.user, name="Bread", amount=2, quantity=3)
+        start = timezone.localdate().replace(day=1)
+
+        # one SELECT of the rollups, reads run in autocommit
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/v1.0/budget-items/summary/?period=MONTH&start={start}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{
+            "period": "MONTH", "period_start": str(start), "item_type": "EXPENSE",
+            "category": "GENERAL", "total": "6.00", "count": 1,
+        }])
+        response = self.client.get("/api/v1.0/budget-items/summary/?period=YEAR")
+        self.assertEqual(response.status_code, 400)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Rollups are only locked on Postgres")
+class BudgetRollupRebuildTestCase(TransactionTestCase):
+    @staticmethod
+    def rebuild(user_ids):
+        try:
+            rebuild_rollups(user_ids)
+        finally:
+            connection.close()
+
+    def test_rebuild_waits_for_writes_under_way(self):
+        user = User.objects.create(username="rebuild_user", email="rebuild_user@domain.com")
+        BudgetItem.create(user=user, name="Milk", amount=Decimal("2.00"), quantity=1)
+        rebuild = threading.Thread(target=self.rebuild, args=([user.pk],))
+
+        with transaction.atomic():
+            BudgetItem.create(user=user, name="Bread", amount=Decimal("3.00"), quantity=1)
+            rebuild.start()
+            rebuild.join(0.5)
+            self.assertTrue(rebuild.is_alive())
+        rebuild.join()
+
+        rollups = BudgetRollup.objects.filter(user=user, period="MONTH").values_list("total", "count")
+        self.assertEqual(list(rollups), [(Decimal("5.00"), 2)])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Needs row level locking")
+class ConcurrentTotalsTestCase(TransactionTestCase):
+    writers = 4
+    items = 25
+
+    def write(self, user, writer, start):
+        try:
+            start.wait()
+            for i in range(self.items):
+                with transaction.atomic():
+                    BudgetItem.create(user=user, name=f"Item {writer}-{i}", amount=Decimal("2.00"), quantity=1)
+        finally:
+            connection.close()
+
+    def test_concurrent_writers_keep_the_totals(self):
+        user = User.objects.create(username="concurrent_user", email="concurrent_user@domain.com")
+        start = threading.Barrier(self.writers)
+        with ThreadPoolExecutor(max_workers=self.writers) as executor:
+            # Raises what a writer raised, deadlocks included
+            list(executor.map(lambda writer: self.write(user, writer, start), range(self.writers)))
+
+        user.fold_totals()
+        self.assertEqual(user.expenses, Decimal("2.00") * self.writers * self.items)
+
+
+class BudgetTotalsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="budget_user", email="budget_user@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_budget(self, name, items):
+        budget = Budget.objects.create(user=self.user, name=name)
+        budget.budget_items.set(BudgetItem.bulk_create_items(user=self.user, items=items))
+        return budget
+
+    def test_list_computes_totals_in_constant_queries(self):
+        for i in range(3):
+            self.create_budget(f"Budget {i}", [
+                {"name": f"Milk {i}", "amount": Decimal("2.50"), "quantity": 4},
+                {"name": f"Wages {i}", "amount": Decimal("100.00"), "item_type": "INCOME"},
+            ])
+        # ETag validators, page + prefetched items, reads run in autocommit
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/v1.0/budgets/")
+        self.create_budget("Budget 3", [{"name": "Rent", "amount": Decimal("900.00"), "quantity": 1}])
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/v1.0/budgets/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 4)
+        rent, milk = response.data["results"][:2]
+        self.assertEqual((rent["income_total"], rent["expense_total"], rent["net"]), ("0.00", "900.00", "-900.00"))
+        self.assertEqual((milk["income_total"], milk["expense_total"], milk["net"]), ("100.00", "10.00", "90.00"))
+        self.assertEqual(len(milk["budget_items"]), 2)
+
+    def test_create_budget_with_items(self):
+        response = self.client.post("/api/v1.0/budgets/", {
+            "name": "Holidays",
+            "budget_items": [
+                {"name": "Hotel", "amount": "80.00", "quantity": 3},
+                {"name": "Bonus", "amount": "500.00", "item_type": "INCOME"},
+            ],
+        }, format="json")
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["net"], "260.00")
+        self.assertEqual(Budget.objects.get().user, self.user)
+
+
+class NameSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="search_user", email="search_user@domain.com")
+        other = User.objects.create(username="other_user", email="other_user@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for user in (self.user, other):
+            BudgetItem.bulk_create_items(user=user, items=[
+                {"name": name, "amount": Decimal("1.00")} for name in ("Groceries", "Gas", "grocer tip", "Rent")
+            ])
+        Budget.objects.create(user=self.user, name="Groceries October")
+        Budget.objects.create(user=other, name="Groceries November")
+
+    def test_autocomplete(self):
+        response = self.client.get("/api/v1.0/budget-items/autocomplete/?q=GROC")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["name"] for item in response.data], ["grocer tip", "Groceries"])
+
+    def test_autocomplete_limit(self):
+        response = self.client.get("/api/v1.0/budget-items/autocomplete/?q=g&limit=1")
+
+        self.assertEqual([item["name"] for item in response.data], ["Gas"])
+
+    def test_search(self):
+        response = self.client.get("/api/v1.0/budget-items/search/?q=ocer")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["name"] for item in response.data], ["grocer tip", "Groceries"])
+        self.assertTrue(all(item["user"] == self.user.pk for item in response.data))
+
+    def test_budget_search_and_autocomplete(self):
+        response = self.client.get("/api/v1.0/budgets/search/?q=groceries")
+        self.assertEqual([budget["name"] for budget in response.data], ["Groceries October"])
+        self.assertIn("net", response.data[0])
+
+        response = self.client.get("/api/v1.0/budgets/autocomplete/?q=gro")
+        self.assertEqual([budget["name"] for budget in response.data], ["Groceries October"])
+
+    def test_query_is_required(self):
+        response = self.client.get("/api/v1.0/budget-items/autocomplete/")
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(API_CACHE_ENABLED=True)
+class ResultCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="cache_user", email="cache_user@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.item = BudgetItem.create(user=self.user, name="Milk", amount=Decimal("2.50"), quantity=2)
+        self.budget = Budget.objects.create(user=self.user, name="Groceries")
+
+    def get(self, url):
+        with QueryCounter(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_repeated_list_is_served_from_cache(self):
+        first, first_queries = self.get("/api/v1.0/budget-items/?item_type=EXPENSE&page_size=10")
+        second, second_queries = self.get("/api/v1.0/budget-items/?page_size=10&item_type=EXPENSE")
+
+        self.assertGreater(first_queries, 0)
+        # Only the ETag validators are read
+        self.assertEqual(second_queries, 1)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(result_cache_stats(), {"hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5})
+
+    def test_writes_invalidate_the_user_results(self):
+        self.get("/api/v1.0/budget-items/")
+        BudgetItem.create(user=self.user, name="Bread", amount=Decimal("1.00"), quantity=1)
+        response, queries = self.get("/api/v1.0/budget-items/")
+
+        self.assertGreater(queries, 0)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_budget_items_changes_invalidate_budgets(self):
+        response, queries = self.get(f"/api/v1.0/budgets/{self.budget.pk}/")
+        self.assertEqual(response.data["budget_items"], [])
+
+        self.budget.budget_items.add(self.item)
+        response, queries = self.get(f"/api/v1.0/budgets/{self.budget.pk}/")
+        self.assertEqual(len(response.data["budget_items"]), 1)
+        self.assertEqual(response.data["expense_total"], "5.00")
+
+    def test_results_are_per_user(self):
+        self.get("/api/v1.0/budgets/")
+        other = User.objects.create(username="other_cache_user", email="other_cache_user@domain.com")
+        self.client.force_authenticate(other)
+        response, queries = self.get("/api/v1.0/budgets/")
+
+        self.assertEqual(response.data["results"], [])
+
+    def test_evictions_are_counted(self):
+        self.get("/api/v1.0/budget-items/summary/")
+        # Local memory cache keys carry the ":<version>:" prefix
+        cache.delete_many([key.split(":", 2)[2] for key in cache._cache if "-summary:" in key])
+        self.get("/api/v1.0/budget-items/summary/")
+
+        self.assertEqual(result_cache_stats(reset=True)["evictions"], 1)
+        self.assertEqual(result_cache_stats()["misses"], 0)
+
+    @override_settings(API_CACHE_ENABLED=None)
+    def test_only_enabled_by_default_with_a_shared_cache(self):
+        self.get("/api/v1.0/budget-items/summary/")
+        self.assertEqual(result_cache_stats()["misses"], 0)
+
+        redis = {"default": {"BACKEND": "django_redis.cache.RedisCache", "LOCATION": "redis://localhost:6379/0"}}
+        with override_settings(CACHES=redis):
+            self.assertTrue(result_cache_enabled())
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="etag_user", email="etag_user@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.milk, self.bread = BudgetItem.bulk_create_items(user=self.user, items=[
+            {"name": "Milk", "amount": Decimal("2.50"), "quantity": 2},
+            {"name": "Bread", "amount": Decimal("1.00"), "quantity": 1},
+        ])
+        self.budget = Budget.objects.create(user=self.user, name="Groceries")
+        self.budget.budget_items.add(self.milk)
+
+    def assertNotModified(self, url, etag):
+        with QueryCounter(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        # The validators only, nothing is read or serialized
+        self.assertEqual(len(queries), 1)
+
+    def test_list_not_modified(self):
+        response = self.client.get("/api/v1.0/budget-items/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+        self.assertNotModified("/api/v1.0/budget-items/", response["ETag"])
+
+    def test_etag_follows_the_query(self):
+        etag = self.client.get("/api/v1.0/budget-items/?page_size=1")["ETag"]
+
+        self.assertNotEqual(self.client.get("/api/v1.0/budget-items/?page_size=2")["ETag"], etag)
+
+    def test_changes_and_deletes_change_the_etag(self):
+        etag = self.client.get("/api/v1.0/budget-items/")["ETag"]
+        self.bread.delete()
+        response = self.client.get("/api/v1.0/budget-items/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response["ETag"]
+        self.milk.quantity = 3
+        self.milk.save()
+        self.assertEqual(self.client.get("/api/v1.0/budget-items/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_not_modified(self):
+        url = f"/api/v1.0/budget-items/{self.milk.pk}/"
+        etag = self.client.get(url)["ETag"]
+
+        self.assertNotModified(url, etag)
+        self.bread.save()
+        self.assertNotModified(url, etag)
+
+    def test_budget_etag_follows_its_items(self):
+        url = f"/api/v1.0/budgets/{self.budget.pk}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertNotModified(url, etag)
+
+        # Same number of items, the bread is older than the milk
+        self.budget.budget_items.remove(self.milk)
+        self.budget.budget_items.add(self.bread)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class OptimisticConcurrencyTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="version_user", email="version_user@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.item = BudgetItem.create(user=self.user, name="Milk", amount=Decimal("2.50"), quantity=2)
+        self.url = f"/api/v1.0/budget-items/{self.item.pk}/"
+
+    def test_update_with_current_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.patch(self.url, {"quantity": 3}, format="json", HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["version"], 2)
+        self.assertTrue(response["ETag"].startswith('"2-'))
+        self.assertEqual(self.client.get(self.url)["ETag"], response["ETag"])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_stale_etag_is_rejected(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.client.patch(self.url, {"quantity": 3}, format="json", HTTP_IF_MATCH=etag)
+        response = self.client.patch(self.url, {"quantity": 5}, format="json", HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, 412)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.version), (3, 2))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.expenses, Decimal("7.50"))
+
+    def test_stale_instance_conflicts(self):
+        stale = BudgetItem.objects.get(pk=self.item.pk)
+        self.item.quantity = 3
+        self.item.save()
+        stale.quantity = 4
+
+        with self.assertRaises(VersionConflict):
+            stale.save()
+        self.assertEqual(stale.version, 1)
+
+    def test_update_is_a_single_statement(self):
+        with QueryCounter(connection) as queries:
+            self.item.save(update_fields=["name"])
+        self.assertEqual(len(queries), 1 + NOTIFY)
+        self.assertIn('"version" = 1', queries.statements[0])
+
+    def test_budget_version(self):
+        budget = Budget.objects.create(user=self.user, name="Groceries")
+        budget.budget_items.add(self.item)
+        url = f"/api/v1.0/budgets/{budget.pk}/"
+
+        response = self.client.patch(url, {"name": "Food"}, format="json", HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 412)
+        response = self.client.patch(url, {"name": "Food"}, format="json", HTTP_IF_MATCH='"2"')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["version"], 3)
+
+    @override_settings(API_REQUIRE_IF_MATCH=True)
+    def test_if_match_can_be_required(self):
+        response = self.client.patch(self.url, {"quantity": 3}, format="json")
+
+        self.assertEqual(response.status_code, 428)
@@ -11,7 +11,7 @@ import os
 import sys
 from pathlib import Path
 
-from django.core.asgi import get_asgi_application
+import django
 
 # This allows easy placement of apps within the interior
 # family_budget directory.
@@ -22,17 +22,26 @@ sys.path.append(str(ROOT_DIR / "family_budget"))
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
 
 # This application object is used by any ASGI server configured to use this file.
-django_application = get_asgi_application()
+# Same as get_asgi_application(), with a handler that streams
+# AsyncStreamingHttpResponse bodies (e.g. budget item exports) natively.
+django.setup(set_prefix=False)
+from helpers.streaming import StreamingASGIHandler  # noqa isort:skip
+
+django_application = StreamingASGIHandler()
 # Apply ASGI middleware here.
 # from helloworld.asgi import HelloWorldApplication
 # application = HelloWorldApplication(application)
 
 # Import websocket application here, so apps from django_application are loaded first
 from config.websocket import websocket_application  # noqa isort:skip
+from config.sse import SSE_PATH, sse_application  # noqa isort:skip
 
 
 async def application(scope, receive, send):
-    if scope["type"] == "http":
+    if scope["type"] == "http" and scope["path"] == SSE_PATH:
+        # Long-lived streams, served on the event loop rather than by a Django view
+        await sse_application(scope, receive, send)
+    elif scope["type"] == "http":
         await django_application(scope, receive, send)
     elif scope["type"] == "websocket":
         await websocket_application(scope, receive, send)
@@ -11,8 +11,8 @@ HTTP_USER_AGENT_HEADER = 'HTTP_USER_AGENT'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-        'rest_framework.authentication.BasicAuthentication',
+        "family_budget.users.authentication.ClaimsJWTAuthentication",
+        "family_budget.users.authentication.CachedBasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",
     ),
@@ -38,9 +38,9 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 2,
 
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.ScopedRateThrottle',
+        'helpers.throttling.AnonGCRAThrottle',
+        'helpers.throttling.UserGCRAThrottle',
+        'helpers.throttling.ScopedGCRAThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '1000/day',
@@ -128,9 +128,11 @@ SIMPLE_JWT = {
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'profile_id',
-    'USER_AUTHENTICATION_RULE': 'core.api.extensions.custom_user_authentication_rule',
+    'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'TOKEN_OBTAIN_SERIALIZER': 'family_budget.users.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'family_budget.users.authentication.ClaimsTokenRefreshSerializer',
     'TOKEN_TYPE_CLAIM': 'token_type',
 
     'JTI_CLAIM': 'jti',
@@ -5,6 +5,8 @@ Base settings to build other settings files upon.
 from pathlib import Path
 
 import environ
+from corsheaders.defaults import default_headers
+
 from .apps import *
 
 ROOT_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
@@ -48,7 +50,15 @@ DATABASES = {
         default="postgres:///family_budget",
     ),
 }
-DATABASES["default"]["ATOMIC_REQUESTS"] = True
+# Transactions are per action rather than per request, see helpers.transactions
+# Read replicas of the default database, see helpers.replicas
+DATABASE_REPLICAS = []
+for index, url in enumerate(env.list("DATABASE_REPLICA_URLS", default=[]), start=1):
+    DATABASES[f"replica{index}"] = {**env.db_url_config(url), "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(f"replica{index}")
+DATABASE_ROUTERS = ["helpers.replicas.ReplicaRouter"]
+# Seconds the requests of a user read from the primary after they wrote
+REPLICA_PIN_WINDOW = env.float("REPLICA_PIN_WINDOW", default=5.0)
 # https://docs.djangoproject.com/en/stable/ref/settings/#std:setting-DEFAULT_AUTO_FIELD
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -259,14 +269,81 @@ SOCIALACCOUNT_FORMS = {"signup": "family_budget.users.forms.UserSocialSignupForm
 # django-rest-framework - https://www.django-rest-framework.org/api-guide/settings/
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
+        "family_budget.users.authentication.ClaimsJWTAuthentication",
+        "family_budget.users.authentication.CachedBasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    # Limits shared by all the workers, see helpers.throttling
+    "DEFAULT_THROTTLE_CLASSES": (
+        "helpers.throttling.AnonGCRAThrottle",
+        "helpers.throttling.UserGCRAThrottle",
+        "helpers.throttling.ScopedGCRAThrottle",
+    ),
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": env("API_THROTTLE_ANON_RATE", default="1000/day"),
+        "user": env("API_THROTTLE_USER_RATE", default="1000/day"),
+    },
 }
 
+# Keyset pagination of the budget API, see helpers.pagination.KeysetPagination
+API_PAGE_SIZE = env.int("API_PAGE_SIZE", default=50)
+API_MAX_PAGE_SIZE = env.int("API_MAX_PAGE_SIZE", default=500)
+# Computing the total costs a COUNT(*) per page, clients opt in with ?include_count=true
+API_PAGINATION_INCLUDE_COUNT = env.bool("API_PAGINATION_INCLUDE_COUNT", default=False)
+# Rows read per round trip when streaming budget item exports
+EXPORT_CHUNK_SIZE = env.int("EXPORT_CHUNK_SIZE", default=2000)
+# Rows validated and inserted together when importing bank statements
+IMPORT_BATCH_SIZE = env.int("IMPORT_BATCH_SIZE", default=2000)
+IMPORT_MAX_REPORTED_ERRORS = env.int("IMPORT_MAX_REPORTED_ERRORS", default=1000)
+# Per-user cache of list, retrieve and summary responses, see helpers.caching;
+# on by default when API_CACHE_ALIAS is a cache shared by the workers
+API_CACHE_ENABLED = env.bool("API_CACHE_ENABLED", default=None)
+API_CACHE_ALIAS = env("API_CACHE_ALIAS", default="default")
+API_CACHE_TIMEOUT = env.int("API_CACHE_TIMEOUT", default=300)
+# Reject updates of budgets and budget items that do not send If-Match (428)
+API_REQUIRE_IF_MATCH = env.bool("API_REQUIRE_IF_MATCH", default=False)
+# Where `manage.py build_openapi_schema` writes the schema served by the documentation views
+OPENAPI_SCHEMA_ROOT = env("OPENAPI_SCHEMA_ROOT", default=str(ROOT_DIR / "openapi"))
+
+# djangorestframework-simplejwt - https://django-rest-framework-simplejwt.readthedocs.io/en/latest/settings.html
+# Tokens carry the columns authentication needs, see family_budget.users.authentication
+SIMPLE_JWT = {
+    "TOKEN_OBTAIN_SERIALIZER": "family_budget.users.authentication.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "family_budget.users.authentication.ClaimsTokenRefreshSerializer",
+}
+# Seconds the authentication columns of a user are cached for tokens that do not carry them
+AUTH_USER_CACHE_ALIAS = env("AUTH_USER_CACHE_ALIAS", default="default")
+AUTH_USER_CACHE_TIMEOUT = env.int("AUTH_USER_CACHE_TIMEOUT", default=60)
+# The same when AUTH_USER_CACHE_ALIAS is local to each worker, which only the saving one invalidates
+AUTH_USER_LOCAL_CACHE_TIMEOUT = env.int("AUTH_USER_LOCAL_CACHE_TIMEOUT", default=5)
+# Basic auth credentials verified less than this many seconds ago skip the password hasher
+AUTH_BASIC_CACHE_TIMEOUT = env.int("AUTH_BASIC_CACHE_TIMEOUT", default=300)
+AUTH_BASIC_CACHE_SIZE = env.int("AUTH_BASIC_CACHE_SIZE", default=1000)
+
+# Live updates over the websocket, see helpers.events
+LIVE_EVENTS_CHANNEL = env("LIVE_EVENTS_CHANNEL", default="budget_events")
+# Events queued per connection before a slow client is told to resync
+LIVE_SEND_QUEUE_SIZE = env.int("LIVE_SEND_QUEUE_SIZE", default=100)
+# Seconds changes are gathered before the totals are read and pushed
+LIVE_TOTALS_DELAY = env.float("LIVE_TOTALS_DELAY", default=0.25)
+# Websocket connections a worker accepts before refusing new ones
+LIVE_MAX_CONNECTIONS = env.int("LIVE_MAX_CONNECTIONS", default=10000)
+# Seconds between heartbeats, and of client silence before a connection is evicted
+LIVE_HEARTBEAT_INTERVAL = env.float("LIVE_HEARTBEAT_INTERVAL", default=30)
+LIVE_IDLE_TIMEOUT = env.float("LIVE_IDLE_TIMEOUT", default=75)
+# Seconds of changes gathered into one Server-Sent Event, see config.sse
+LIVE_SSE_INTERVAL = env.float("LIVE_SSE_INTERVAL", default=1.0)
+# Threads an ASGI worker runs the sync code of requests on, one per request
+# being served (each keeps a database connection), see helpers.streaming
+ASGI_THREADS = env.int("ASGI_THREADS", default=16)
+
 # django-cors-headers - https://github.com/adamchainz/django-cors-headers#setup
 CORS_URLS_REGEX = r"^/api/.*$"
+# Browser clients read the replica pin of writes and send it back, see helpers.replicas
+CORS_EXPOSE_HEADERS = ["X-Primary-Pin"]
+CORS_ALLOW_HEADERS = [*default_headers, "x-primary-pin"]
 
 
 COMPRESS_ENABLED = False
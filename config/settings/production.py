@@ -11,10 +11,52 @@ ALLOWED_HOSTS = env.list("DJANGO_ALLOWED_HOSTS", default=["family.com"])
 # DATABASES
 # ------------------------------------------------------------------------------
 DATABASES["default"] = env.db("DATABASE_URL")  # noqa F405
-DATABASES["default"]["ATOMIC_REQUESTS"] = True  # noqa F405
-DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=60)  # noqa F405
-
+# Connections (to the primary and each replica) are leased from a bounded pool
+# of each worker for the duration of a request, see helpers.db.pool; without
+# it each thread keeps its own
+if env.bool("DB_POOL_ENABLED", default=True):
+    for alias in ["default", *DATABASE_REPLICAS]:  # noqa F405
+        DATABASES[alias]["ENGINE"] = "helpers.db.postgresql"  # noqa F405
+        DATABASES[alias]["CONN_MAX_AGE"] = 0  # noqa F405
+        DATABASES[alias].setdefault("OPTIONS", {})["pool"] = {  # noqa F405
+            "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+            "min_size": env.int("DB_POOL_MIN_SIZE", default=4),
+            # Seconds a request waits for a connection before failing
+            "timeout": env.float("DB_POOL_TIMEOUT", default=5.0),
+            "max_idle": env.float("DB_POOL_MAX_IDLE", default=300),
+            "max_lifetime": env.float("DB_POOL_MAX_LIFETIME", default=3600),
+            "check_interval": env.float("DB_POOL_CHECK_INTERVAL", default=30),
+        }
+else:
+    for alias in ["default", *DATABASE_REPLICAS]:  # noqa F405
+        DATABASES[alias]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=60)  # noqa F405
 
+# CACHES
+# ------------------------------------------------------------------------------
+# Shared by the workers when REDIS_URL is set: the result cache invalidates the
+# results of all of them and its counters cover them all (see helpers.caching).
+# Without it each worker keeps its own, which turns the result cache off and
+# shortens the authentication cache (see family_budget.users.authentication).
+if env("REDIS_URL", default=None):
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": env("REDIS_URL"),
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                # Mimicking memcache behavior.
+                # https://github.com/jazzband/django-redis#memcached-exceptions-behavior
+                "IGNORE_EXCEPTIONS": True,
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "",
+        }
+    }
 
 # SECURITY
 # ------------------------------------------------------------------------------
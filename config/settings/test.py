@@ -25,6 +25,22 @@ PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 
+# DATABASES
+# ------------------------------------------------------------------------------
+# A stand-in replica, the test database itself: tests of helpers.replicas list
+# it in DATABASE_REPLICAS
+DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}  # noqa F405
+
+# CACHES
+# ------------------------------------------------------------------------------
+# Tests that exercise the API result cache enable it explicitly
+API_CACHE_ENABLED = False
+
+# THROTTLING
+# ------------------------------------------------------------------------------
+# Tests that exercise throttling enable it explicitly
+REST_FRAMEWORK = {**REST_FRAMEWORK, "DEFAULT_THROTTLE_CLASSES": ()}  # noqa F405
+
 # DEBUGING FOR TEMPLATES
 # ------------------------------------------------------------------------------
 TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore # noqa F405
@@ -0,0 +1,110 @@
+"""
+Live updates as Server-Sent Events, for clients that cannot keep a websocket
+open (proxies). Served by ``config.asgi.application`` without going through
+Django: a stream is two tasks on the event loop, no thread.
+
+``GET /api/v1.0/live/events/`` with a JWT access token (``Authorization:
+Bearer`` or ``?token=``, as ``EventSource`` cannot send headers) streams:
+
+- ``event: totals``, the user's ``income`` and ``expenses``, on connect and
+  after their budget items change;
+- ``event: changes``, the budget item and budget changes (as on the
+  websocket) of the last ``LIVE_SSE_INTERVAL`` seconds, a burst of edits
+  being sent as one event;
+- ``event: resync`` when events were dropped, the client should reload.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from config.websocket import authenticate, websocket_token
+from helpers.events import CLOSE, HEARTBEAT, RESYNC, Subscriber, hub, read_totals
+
+SSE_PATH = "/api/v1.0/live/events/"
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    # Keeps nginx from buffering the stream
+    (b"x-accel-buffering", b"no"),
+]
+
+
+def sse_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def coalesce(messages):
+    """
+    Turns the hub messages of an interval into at most one ``changes`` and
+    one ``totals`` event, or a single ``resync``.
+    """
+    if RESYNC in messages:
+        return sse_event("resync", {})
+    changes, totals = [], None
+    for message in messages:
+        if message is CLOSE or message == HEARTBEAT:
+            continue
+        event = json.loads(message)
+        if event["type"] == "totals":
+            totals = {name: value for name, value in event.items() if name != "type"}
+        elif event not in changes:
+            changes.append(event)
+    return (sse_event("changes", {"changes": changes}) if changes else b"") + (
+        sse_event("totals", totals) if totals is not None else b""
+    )
+
+
+async def send_response(send, status, body=b"", headers=SSE_HEADERS, more_body=False):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+async def watch_disconnect(receive, subscriber):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    subscriber.close()
+
+
+async def sse_application(scope, receive, send):
+    if scope["method"] != "GET":
+        return await send_response(send, 405, headers=[(b"allow", b"GET")])
+    token = websocket_token(scope)
+    user = await authenticate(token) if token else None
+    if user is None:
+        return await send_response(
+            send, 401, json.dumps({"detail": "Authentication credentials were not provided."}).encode(),
+            headers=[(b"content-type", b"application/json"), (b"www-authenticate", b'Bearer realm="api"')]
+        )
+
+    subscriber = Subscriber(user.pk)
+    if not await hub.subscribe(subscriber):
+        return await send_response(send, 503, headers=[(b"retry-after", b"30")])
+    watcher = asyncio.create_task(watch_disconnect(receive, subscriber))
+    try:
+        await send_response(send, 200, sse_event("totals", await sync_to_async(read_totals)(user.pk)), more_body=True)
+        while True:
+            message = await subscriber.get()
+            if message is CLOSE:
+                break
+            if message == HEARTBEAT:
+                body = b": heartbeat\n\n"
+            else:
+                # Whatever else arrives during the interval goes in the same events
+                await asyncio.sleep(getattr(settings, "LIVE_SSE_INTERVAL", 1.0))
+                messages = [message]
+                while not subscriber.queue.empty():
+                    messages.append(subscriber.queue.get_nowait())
+                body = coalesce(messages)
+                if CLOSE in messages:
+                    await send({"type": "http.response.body", "body": body, "more_body": False})
+                    return
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+            # Streams cannot answer heartbeats, writing counts as activity
+            # (a client that went away shows up as http.disconnect)
+            subscriber.seen()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        hub.unsubscribe(subscriber)
+        watcher.cancel()
@@ -15,28 +15,38 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Family budget API",
-      default_version='v1',
-      description="""
-      This is a Family budget app.
+from config.websocket import live_metrics
+from helpers.db.views import pool_metrics
+from helpers.schema import PrebuiltSchemaMixin
 
-      As a registered user, you are able to add a budget item which is either an `INCOME` or `EXPENSE`
-      Based on the budget items you are able to see how much you have spent or earned.
+api_info = openapi.Info(
+    title="Family budget API",
+    default_version='v1',
+    description="""
+    This is a Family budget app.
 
-      You can also create a Budget sheet.
+    As a registered user, you are able to add a budget item which is either an `INCOME` or `EXPENSE`
+    Based on the budget items you are able to see how much you have spent or earned.
 
-      A budget sheet can contain a list of Budget items which can either be `INCOME` or an `EXPENSE`
-      """,
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snippets.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=[permissions.AllowAny],
+    You can also create a Budget sheet.
+
+    A budget sheet can contain a list of Budget items which can either be `INCOME` or an `EXPENSE`
+    """,
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
 )
 
+
+class SchemaView(PrebuiltSchemaMixin, get_schema_view(
+    api_info,
+    public=True,
+    permission_classes=[permissions.AllowAny],
+)):
+    # Served from the files of `manage.py build_openapi_schema`, see helpers.schema
+    info = api_info
+
+
 urlpatterns = [
     path("", TemplateView.as_view(template_name="pages/home.html"), name="home"),
     path(
@@ -47,9 +57,10 @@ urlpatterns = [
     # User management
     path("users/", include("family_budget.users.urls", namespace="users")),
     path("accounts/", include("allauth.urls")),
-    re_path(r'^documentation(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    re_path(r'^documentation/$', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    re_path(r'^redoc/$', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    re_path(r'^documentation(?P<format>\.json|\.yaml)$', SchemaView.without_ui(), name='schema-json'),
+    re_path(r'^documentation/$', SchemaView.with_ui('swagger'), name='schema-swagger-ui'),
+    re_path(r'^redoc/$', SchemaView.with_ui('redoc'), name='schema-redoc'),
+    path("documentation/openapi.<str:digest>.<str:extension>", SchemaView.as_file_view(), name="schema-file"),
 
     path('api/v1.0/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/v1.0/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -66,6 +77,10 @@ urlpatterns += [
     path("api/v1.0/", include("config.api_router")),
     # DRF auth token
     path("api/v1.0/auth-token/", obtain_auth_token),
+    # Websocket connections of the answering worker, see config.websocket
+    path("api/v1.0/live/metrics/", live_metrics, name="live-metrics"),
+    # Database connection pools of the answering worker, see helpers.db.pool
+    path("api/v1.0/db/metrics/", pool_metrics, name="db-pool-metrics"),
 
 ]
 
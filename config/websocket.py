@@ -1,13 +1,104 @@
-async def websocket_application(scope, receive, send):
+"""
+Live updates of budget items, budgets and totals.
+
+Clients connect with a JWT access token, in an ``Authorization: Bearer``
+header or, for browsers, a ``?token=`` query parameter, and receive JSON
+events such as ``{"type": "budget_item.updated", "id": "..."}`` and
+``{"type": "totals", "income": "...", "expenses": "..."}``. A ``resync`` event
+means events were dropped, the client should reload through the REST API.
+The server sends a ``heartbeat`` every ``LIVE_HEARTBEAT_INTERVAL`` seconds,
+clients answer it with any message (``pong``) or are disconnected after
+``LIVE_IDLE_TIMEOUT`` seconds of silence. Sending ``ping`` still gets ``pong!``.
+"""
+import asyncio
+import os
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from family_budget.users.authentication import ClaimsJWTAuthentication
+from helpers.events import CLOSE, Subscriber, hub
+
+# Close code of the handshake when the token is missing or invalid
+UNAUTHORIZED = 4401
+# Close code of the handshake when the worker holds LIVE_MAX_CONNECTIONS already
+TRY_AGAIN_LATER = 1013
+# Close code of connections evicted for being idle
+GOING_AWAY = 1001
+
+
+def websocket_token(scope):
+    for name, value in scope.get("headers", ()):
+        if name.lower() == b"authorization":
+            scheme, _, token = value.decode("latin1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token.strip()
+    tokens = parse_qs(scope.get("query_string", b"").decode("latin1")).get("token")
+    return tokens[0] if tokens else None
+
+
+@sync_to_async
+def authenticate(token):
+    authentication = ClaimsJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def send_events(subscriber, send):
     while True:
-        event = await receive()
+        message = await subscriber.get()
+        if message is CLOSE:
+            await send({"type": "websocket.close", "code": GOING_AWAY})
+            return
+        await send({"type": "websocket.send", "text": message})
+
+
+async def websocket_application(scope, receive, send):
+    subscriber, sender = None, None
+    try:
+        while True:
+            event = await receive()
+
+            if event["type"] == "websocket.connect":
+                token = websocket_token(scope)
+                user = await authenticate(token) if token else None
+                if user is None:
+                    await send({"type": "websocket.close", "code": UNAUTHORIZED})
+                    break
+                subscriber = Subscriber(user.pk)
+                if not await hub.subscribe(subscriber):
+                    subscriber = None
+                    await send({"type": "websocket.close", "code": TRY_AGAIN_LATER})
+                    break
+                await send({"type": "websocket.accept"})
+                sender = asyncio.create_task(send_events(subscriber, send))
+
+            if event["type"] == "websocket.disconnect":
+                break
+
+            if event["type"] == "websocket.receive":
+                subscriber.seen()
+                if event.get("text") == "ping":
+                    await send({"type": "websocket.send", "text": "pong!"})
+    finally:
+        if subscriber is not None:
+            hub.unsubscribe(subscriber)
+            sender.cancel()
 
-        if event["type"] == "websocket.connect":
-            await send({"type": "websocket.accept"})
 
-        if event["type"] == "websocket.disconnect":
-            break
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def live_metrics(request):
+    """
+    Live Connection Metrics
 
-        if event["type"] == "websocket.receive":
-            if event["text"] == "ping":
-                await send({"type": "websocket.send", "text": "pong!"})
+    The websocket connections held by the worker that answers, and its
+    counters since it started.
+    """
+    return Response({"pid": os.getpid(), **hub.metrics()})
@@ -5,21 +5,30 @@ from rest_framework.mixins import ListModelMixin, RetrieveModelMixin, UpdateMode
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from family_budget.users.models import UserTotalsDelta
+from helpers.replicas import ReplicaReadsMixin
+from helpers.transactions import TransactionPolicyMixin
+
 from .serializers import UserSerializer
 
 User = get_user_model()
 
 
-class UserViewSet(RetrieveModelMixin, ListModelMixin, UpdateModelMixin, GenericViewSet):
+class UserViewSet(
+    TransactionPolicyMixin, ReplicaReadsMixin, RetrieveModelMixin, ListModelMixin, UpdateModelMixin, GenericViewSet
+):
     serializer_class = UserSerializer
     queryset = User.objects.all()
     lookup_field = "username"
 
     def get_queryset(self, *args, **kwargs):
-        assert isinstance(self.request.user.id, int)
         return self.queryset.filter(id=self.request.user.id)
 
     @action(detail=False)
     def me(self, request):
-        serializer = UserSerializer(request.user, context={"request": request})
+        # Token authenticated users only have their authentication columns
+        # loaded. The totals include the deltas not folded yet, see fold_user_totals.
+        user = UserTotalsDelta.with_pending_totals(self.get_queryset()).get()
+        user.income, user.expenses = user.current_income, user.current_expenses
+        serializer = UserSerializer(user, context={"request": request})
         return Response(status=status.HTTP_200_OK, data=serializer.data)
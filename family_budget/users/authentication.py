@@ -0,0 +1,237 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from helpers.caching import is_shared
+
+User = get_user_model()
+
+KEY_PREFIX = "auth-user"
+# The columns authentication needs, carried by the tokens and cached per user
+USER_CLAIM = "usr"
+USER_CLAIM_FIELDS = ("email", "username", "is_active", "is_staff", "is_superuser")
+
+
+def user_cache_alias():
+    return getattr(settings, "AUTH_USER_CACHE_ALIAS", "default")
+
+
+def user_cache():
+    return caches[user_cache_alias()]
+
+
+def user_cache_timeout():
+    """
+    ``AUTH_USER_CACHE_TIMEOUT``, capped at ``AUTH_USER_LOCAL_CACHE_TIMEOUT``
+    when the cache is local to each process: saving a user only drops the
+    columns cached by the worker that saved it, the others keep them until
+    they expire.
+    """
+    timeout = getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 60)
+    if not is_shared(user_cache_alias()):
+        timeout = min(timeout, getattr(settings, "AUTH_USER_LOCAL_CACHE_TIMEOUT", 5))
+    return timeout
+
+
+def user_key(user_id):
+    return f"{KEY_PREFIX}:{user_id}"
+
+
+def user_claims(user):
+    return {field: getattr(user, field) for field in USER_CLAIM_FIELDS}
+
+
+def cache_user(user):
+    """Stores the authentication columns of ``user`` for ``user_cache_timeout`` seconds."""
+    user_cache().set(user_key(user.pk), user_claims(user), user_cache_timeout())
+
+
+def cached_user_claims(user_id):
+    """
+    Returns the authentication columns of ``user_id``, from the cache or else
+    from a single narrow query, or None when there is no such user.
+    """
+    cache, key = user_cache(), user_key(user_id)
+    claims = cache.get(key)
+    if claims is None:
+        claims = User.objects.filter(pk=user_id).values(*USER_CLAIM_FIELDS).first()
+        if claims is None:
+            return None
+        cache.set(key, claims, user_cache_timeout())
+    return claims
+
+
+def invalidate_cached_user(user_id):
+    """
+    Drops the cached columns of ``user_id`` now and again on commit, so that a
+    concurrent request does not cache the row as it was before the commit.
+    """
+    user_cache().delete(user_key(user_id))
+    transaction.on_commit(lambda: user_cache().delete(user_key(user_id)))
+
+
+def hydrate_user(user_id, claims):
+    """
+    Builds a ``User`` from its id and authentication columns without a query.
+
+    The instance is what the ORM would return for ``.only(*claims)``: the
+    other columns are deferred and loaded on first access, and saving it only
+    writes the loaded ones.
+    """
+    values = {User._meta.pk.attname: user_id, **claims}
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), names, [values[name] for name in names])
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    A refresh token carrying the authentication columns of the user in the
+    ``usr`` claim, which its access tokens copy.
+
+    The access tokens are stamped again from ``cached_user_claims`` every time
+    they are refreshed, so a change to the user reaches the tokens within one
+    access token lifetime, and a deactivated user cannot refresh at all.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[USER_CLAIM] = user_claims(user)
+        # The first requests with the new tokens will not need the row either
+        cache_user(user)
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        claims = cached_user_claims(self[api_settings.USER_ID_CLAIM])
+        if claims is None or not claims["is_active"]:
+            raise TokenError(_("User not found or inactive"))
+        access[USER_CLAIM] = claims
+        return access
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Authenticates JSON web tokens without loading the user row.
+
+    The user is built from the ``usr`` claim of the token (see
+    ``ClaimsRefreshToken``) or, for tokens without it, from
+    ``cached_user_claims``. Either way it only has its authentication columns
+    loaded, the others (``income``, ``expenses``...) are read when accessed.
+
+    As with any self-contained token, a user deactivated after the token was
+    issued keeps access until it expires (``ACCESS_TOKEN_LIFETIME``).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, ValidationError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        claims = validated_token.get(USER_CLAIM)
+        if not isinstance(claims, dict) or set(claims) != set(USER_CLAIM_FIELDS):
+            claims = cached_user_claims(user_id)
+            if claims is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        user = hydrate_user(user_id, claims)
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+
+class VerifiedCredentials:
+    """
+    A bounded, process-local record of the Basic auth credentials that were
+    verified recently, least recently used first out.
+
+    Credentials are only kept as an HMAC (keyed by ``SECRET_KEY``) and each
+    entry remembers the password hash and ``last_password_change`` of the
+    user it was verified against, so a new password invalidates it.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(userid, password):
+        return salted_hmac(KEY_PREFIX, f"{userid}\0{password}", algorithm="sha256").hexdigest()
+
+    @staticmethod
+    def stamp(user):
+        return f"{user.pk}:{user.last_password_change}:{user.password}"
+
+    def get(self, key):
+        with self._lock:
+            stamp, expires = self._entries.get(key, (None, 0))
+            if expires <= time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return stamp
+
+    def add(self, key, stamp):
+        timeout = getattr(settings, "AUTH_BASIC_CACHE_TIMEOUT", 300)
+        with self._lock:
+            self._entries[key] = (stamp, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > getattr(settings, "AUTH_BASIC_CACHE_SIZE", 1000):
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+verified_credentials = VerifiedCredentials()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    HTTP Basic authentication that runs the password hasher (Argon2) once per
+    ``AUTH_BASIC_CACHE_TIMEOUT`` seconds for a given user and password, rather
+    than on every request: recently verified credentials only cost the query
+    of the user row.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = verified_credentials.key(userid, password)
+        stamp = verified_credentials.get(key)
+        if stamp is not None:
+            user = User._default_manager.filter(**{User.USERNAME_FIELD: userid}).first()
+            if user is not None and user.is_active and constant_time_compare(stamp, verified_credentials.stamp(user)):
+                return user, None
+            verified_credentials.discard(key)
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        verified_credentials.add(key, verified_credentials.stamp(user))
+        return user, auth
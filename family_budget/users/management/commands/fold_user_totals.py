@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from family_budget.users.models import UserTotalsDelta
+
+
+class Command(BaseCommand):
+    help = (
+        "Folds the pending totals deltas into the income and expenses of the "
+        "users. Meant to run on a schedule, e.g. every minute from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Number of deltas folded per transaction")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        folded = UserTotalsDelta.fold(batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Folded {folded} totals deltas in {elapsed:.2f}s"))
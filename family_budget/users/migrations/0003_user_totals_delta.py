@@ -0,0 +1,29 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20220904_1829'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTotalsDelta',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('income', models.DecimalField(decimal_places=2, default=0, help_text='The change of the income of the user', max_digits=12)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, help_text='The change of the expenses of the user', max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='totals_deltas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Totals Delta',
+                'verbose_name_plural': 'User Totals Deltas',
+            },
+        ),
+    ]
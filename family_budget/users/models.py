@@ -1,8 +1,13 @@
 import logging
 import uuid
+from collections import defaultdict
+from decimal import Decimal
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser, User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
@@ -209,6 +214,11 @@ class User(AbstractUser):
         self.updated_at = timezone.now()
         return super(User, self).save(*args, **kwargs)
 
+    def set_password(self, raw_password):
+        """Sets the password and records when, which drops its cached Basic auth verifications."""
+        super().set_password(raw_password)
+        self.last_password_change = timezone.now()
+
     @cached_property
     def initials(self):
         """Get the initials of a user"""
@@ -223,5 +233,130 @@ class User(AbstractUser):
             return f"{self.first_name} {self.last_name}"
         return "N/A"
 
+    def fold_totals(self):
+        """Applies the pending totals deltas of the user and reloads `income` and `expenses`."""
+        UserTotalsDelta.fold(user_ids=[self.pk])
+        self.refresh_from_db(fields=["income", "expenses"])
+
+
+class UserTotalsDelta(models.Model):
+    """
+    A change to `User.income` and `User.expenses` that is not applied yet.
+
+    Budget item writes never wait on the user row: a write that finds the row
+    locked by another transaction appends its change here instead, and
+    `fold` adds the pending changes to the user later on.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="totals_deltas",
+        editable=False
+    )
+
+    income = models.DecimalField(
+        default=0,
+        decimal_places=2,
+        max_digits=12,
+        help_text=_("The change of the income of the user")
+    )
+
+    expenses = models.DecimalField(
+        default=0,
+        decimal_places=2,
+        max_digits=12,
+        help_text=_("The change of the expenses of the user")
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("User Totals Delta")
+        verbose_name_plural = _("User Totals Deltas")
+
+    @classmethod
+    def record(cls, user_id, income=Decimal("0.00"), expenses=Decimal("0.00")):
+        """
+        Adds `income` and `expenses` to the totals of a user.
+
+        The user row is updated in place when it can be locked right away, with
+        a single UPDATE of the two columns. When another transaction holds it,
+        the change is appended as a delta rather than waiting for the lock.
+
+        The lock is FOR NO KEY UPDATE: the foreign key checks of concurrent
+        inserts of the user's budget items and rollups take FOR KEY SHARE on
+        the row, which FOR UPDATE would conflict with (and deadlock).
+        """
+        if not income and not expenses:
+            return
+        with transaction.atomic(savepoint=False):
+            users = User.objects.filter(pk=user_id)
+            if list(users.select_for_update(skip_locked=True, no_key=True).values_list("pk", flat=True)):
+                users.update(income=F("income") + income, expenses=F("expenses") + expenses)
+            else:
+                logger.info(f"{__name__}: User {user_id} is busy, recording a totals delta")
+                cls.objects.create(user_id=user_id, income=income, expenses=expenses)
+
+    @classmethod
+    def fold(cls, user_ids=None, batch_size=500) -> int:
+        """
+        Adds the pending deltas to the user totals and deletes them, at most
+        `batch_size` deltas per transaction. Users locked by a running write are
+        skipped and folded by a later call. Returns the number of deltas folded.
+        """
+        folded = 0
+        while True:
+            with transaction.atomic():
+                pending = cls.objects.all()
+                if user_ids is not None:
+                    pending = pending.filter(user_id__in=user_ids)
+                locked_users = list(
+                    User.objects.select_for_update(skip_locked=True, no_key=True)
+                    .filter(pk__in=pending.values("user_id"))
+                    .values_list("pk", flat=True)[:batch_size]
+                )
+                deltas = list(
+                    cls.objects.filter(user_id__in=locked_users)
+                    .order_by("id")
+                    .values_list("id", "user_id", "income", "expenses")[:batch_size]
+                )
+                if not deltas:
+                    return folded
+
+                totals = defaultdict(lambda: [Decimal("0.00"), Decimal("0.00")])
+                for delta_id, user_id, income, expenses in deltas:
+                    totals[user_id][0] += income
+                    totals[user_id][1] += expenses
+                # Deleted by id: deltas committed since the SELECT are left for the next batch.
+                cls.objects.filter(id__in=[delta[0] for delta in deltas]).delete()
+                for user_id, (income, expenses) in totals.items():
+                    User.objects.filter(pk=user_id).update(
+                        income=F("income") + income, expenses=F("expenses") + expenses
+                    )
+            folded += len(deltas)
+            logger.info(f"{__name__}: Folded {len(deltas)} totals deltas of {len(totals)} users")
+            if len(deltas) < batch_size:
+                return folded
+
+    @classmethod
+    def with_pending_totals(cls, users):
+        """
+        Annotates `users` with `current_income` and `current_expenses`, their
+        totals with the pending deltas added, as `fold` would leave them. They
+        are read in the same query, without a transaction or row lock.
+        """
+        annotations = {}
+        for name in ("income", "expenses"):
+            pending = cls.objects.filter(user=OuterRef("pk")).order_by().values("user").annotate(
+                sum=Sum(name)
+            ).values("sum")
+            annotations[f"current_{name}"] = ExpressionWrapper(
+                F(name) + Coalesce(Subquery(pending), Value(Decimal("0.00"))),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        return users.annotate(**annotations)
+
 
 
@@ -1,49 +1,66 @@
 import logging
+from collections import defaultdict
+from decimal import Decimal
 
-from django.contrib.auth import get_user_model
-from django.db import transaction as db_transaction
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
 from budget.choices import ModelChoices
 from budget.models import BudgetItem
+from budget.signals import budget_items_bulk_created, budget_items_bulk_upserted
+from family_budget.users.authentication import invalidate_cached_user
+from family_budget.users.models import User, UserTotalsDelta
 
-User = get_user_model()
 logger = logging.getLogger(__name__) 
 
 
+def totals_deltas(added=(), removed=()):
+    """Sums ledger entries (see ``BudgetItem.ledger_entry``) into income and expenses changes per user."""
+    deltas = defaultdict(lambda: {"income": Decimal("0.00"), "expenses": Decimal("0.00")})
+    for sign, entries in ((1, added), (-1, removed)):
+        for entry in entries:
+            key = "income" if entry.item_type == ModelChoices.BUDGET_ITEM_TYPE_INCOME else "expenses"
+            deltas[entry.user_id][key] += sign * entry.total
+    return deltas
+
+
+def record_totals_deltas(deltas):
+    for user_id, delta in deltas.items():
+        UserTotalsDelta.record(user_id, income=delta["income"], expenses=delta["expenses"])
+        logger.info(f"{__name__}: INCOME: {delta['income']:+}, EXPENSES: {delta['expenses']:+}")
+
+
 @receiver(post_save, sender=BudgetItem)
-def on_budget_item_created(sender, instance, created, *args, **kwargs):
+def on_budget_item_saved(sender, instance, created, *args, **kwargs):
     logger.info(f"{__name__}: Handling post_save signal...")
-    if created:
-        with db_transaction.atomic():
-            user = User.objects.select_for_update().get(id=instance.user.id)
-            if instance.item_type == ModelChoices.BUDGET_ITEM_TYPE_INCOME:
-                logger.info(f"{__name__}: Updating income.. <> {instance.total}")
-                user.income += instance.total
-            else:
-                logger.info(f"{__name__}: Updating expenses..  <> {instance.total}")
-                user.expenses += instance.total
-            user.save()
-            logger.info(f"{__name__}: User profile updated on post_save")
-            logger.info(f"{__name__}: INCOME: {user.income}, EXPENSES: {user.expenses}")
-    
+    # An update moves the totals by the difference with the row as it was loaded
+    previous = None if created else instance.previous_ledger_entry
+    record_totals_deltas(totals_deltas(added=[instance.ledger_entry()], removed=[previous] if previous else ()))
     logger.info(f"{__name__}: Successfully handled post_save signal")
 
 
-
 @receiver(pre_delete, sender=BudgetItem)
 def on_budget_item_deleted(sender, instance, *args, **kwargs):
     logger.info(f"{__name__}: Handling pre_delete signal...")
-    with db_transaction.atomic():
-        user = User.objects.select_for_update().get(id=instance.user.id)
-        if instance.item_type == ModelChoices.BUDGET_ITEM_TYPE_INCOME:
-            logger.info(f"{__name__}: Updating income...")
-            user.income -= instance.total
-        else:
-            logger.info(f"{__name__}: Updating expenses...")
-            user.expenses -= instance.total
-        user.save()
-        logger.info(f"{__name__}: User profile updated on post_save")
-    
+    record_totals_deltas(totals_deltas(removed=[instance.previous_ledger_entry or instance.ledger_entry()]))
     logger.info(f"{__name__}: Successfully handled pre_delete signal")
+
+
+@receiver(budget_items_bulk_created, sender=BudgetItem)
+def on_budget_items_bulk_created(sender, items, *args, **kwargs):
+    logger.info(f"{__name__}: Handling budget_items_bulk_created signal...")
+    record_totals_deltas(totals_deltas(added=[item.ledger_entry() for item in items]))
+    logger.info(f"{__name__}: Successfully handled budget_items_bulk_created signal")
+
+
+@receiver(budget_items_bulk_upserted, sender=BudgetItem)
+def on_budget_items_bulk_upserted(sender, items, previous, *args, **kwargs):
+    logger.info(f"{__name__}: Handling budget_items_bulk_upserted signal...")
+    record_totals_deltas(totals_deltas(added=[item.ledger_entry() for item in items], removed=previous))
+    logger.info(f"{__name__}: Successfully handled budget_items_bulk_upserted signal")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def on_user_changed(sender, instance, *args, **kwargs):
+    invalidate_cached_user(instance.pk)
@@ -0,0 +1,151 @@
+import base64
+from unittest import mock
+
+import pytest
+from django.contrib.auth.hashers import check_password
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from family_budget.users.authentication import (
+    ClaimsJWTAuthentication,
+    ClaimsRefreshToken,
+    VerifiedCredentials,
+    user_cache,
+    user_cache_timeout,
+    verified_credentials,
+)
+from family_budget.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    user_cache().clear()
+
+
+def authenticate(token):
+    request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+    return ClaimsJWTAuthentication().authenticate(request)[0]
+
+
+def test_token_claims_authenticate_without_queries(user: User, django_assert_num_queries):
+    token = ClaimsRefreshToken.for_user(user).access_token
+
+    with django_assert_num_queries(0):
+        authenticated = authenticate(token)
+        assert (authenticated.pk, authenticated.email, authenticated.is_active) == (user.pk, user.email, True)
+
+    # Columns that are not claims are loaded on access
+    with django_assert_num_queries(1):
+        assert authenticated.name == user.name
+
+
+def test_tokens_without_claims_use_the_cached_user(user: User, django_assert_num_queries):
+    token = AccessToken.for_user(user)
+
+    with django_assert_num_queries(1):
+        authenticate(token)
+    with django_assert_num_queries(0):
+        assert authenticate(token).email == user.email
+
+    user.email = "changed@domain.com"
+    user.save()
+    assert authenticate(token).email == "changed@domain.com"
+
+
+def test_local_user_cache_is_short_lived(settings):
+    settings.AUTH_USER_CACHE_TIMEOUT = 60
+    settings.AUTH_USER_LOCAL_CACHE_TIMEOUT = 5
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    assert user_cache_timeout() == 5
+
+    settings.CACHES = {"default": {"BACKEND": "django_redis.cache.RedisCache", "LOCATION": "redis://localhost:6379/0"}}
+    assert user_cache_timeout() == 60
+
+
+def test_inactive_users_are_rejected(user: User):
+    token = AccessToken.for_user(user)
+    user.is_active = False
+    user.save()
+
+    with pytest.raises(AuthenticationFailed):
+        authenticate(token)
+
+
+def test_refresh_stamps_current_claims(user: User):
+    user.set_password("secret-password")
+    user.save()
+    client = APIClient()
+    tokens = client.post("/api/v1.0/token/", {"email": user.email, "password": "secret-password"}).data
+
+    user.is_staff = True
+    user.save()
+    access = client.post("/api/v1.0/token/refresh/", {"refresh": tokens["refresh"]}).data["access"]
+    assert authenticate(access).is_staff
+
+    user.is_active = False
+    user.save()
+    response = client.post("/api/v1.0/token/refresh/", {"refresh": tokens["refresh"]})
+    assert response.status_code == 401
+
+
+def test_me_with_a_token(user: User):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {ClaimsRefreshToken.for_user(user).access_token}")
+
+    response = client.get("/api/v1.0/users/me/")
+
+    assert response.status_code == 200
+    assert (response.data["email"], response.data["name"]) == (user.email, user.name)
+
+
+@pytest.fixture
+def basic_user(user: User):
+    verified_credentials.clear()
+    user.set_password("secret-password")
+    user.save()
+    return user
+
+
+def basic_client(email, password):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Basic " + base64.b64encode(f"{email}:{password}".encode()).decode())
+    return client
+
+
+def test_basic_auth_verifies_the_password_once(basic_user: User):
+    client = basic_client(basic_user.email, "secret-password")
+
+    with mock.patch("django.contrib.auth.base_user.check_password", wraps=check_password) as checked:
+        assert client.get("/api/v1.0/users/me/").status_code == 200
+        assert client.get("/api/v1.0/users/me/").status_code == 200
+
+    assert checked.call_count == 1
+
+
+def test_basic_auth_failures_are_not_cached(basic_user: User):
+    assert basic_client(basic_user.email, "wrong-password").get("/api/v1.0/users/me/").status_code == 401
+    assert basic_client(basic_user.email, "wrong-password").get("/api/v1.0/users/me/").status_code == 401
+
+
+def test_password_change_invalidates_verified_credentials(basic_user: User):
+    client = basic_client(basic_user.email, "secret-password")
+    assert client.get("/api/v1.0/users/me/").status_code == 200
+
+    basic_user.set_password("new-password")
+    basic_user.save()
+
+    assert basic_user.last_password_change is not None
+    assert client.get("/api/v1.0/users/me/").status_code == 401
+    assert basic_client(basic_user.email, "new-password").get("/api/v1.0/users/me/").status_code == 200
+
+
+def test_verified_credentials_are_bounded(settings):
+    settings.AUTH_BASIC_CACHE_SIZE = 2
+    credentials = VerifiedCredentials()
+    for name in ("a", "b", "c"):
+        credentials.add(name, name)
+
+    assert [credentials.get(name) for name in ("a", "b", "c")] == [None, "b", "c"]
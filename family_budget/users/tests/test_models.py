@@ -1,5 +1,39 @@
-from family_budget.users.models import User
+from decimal import Decimal
+
+from family_budget.users.models import User, UserTotalsDelta
 
 
 def test_user_get_absolute_url(user: User):
     assert user.get_absolute_url() == f"/users/{user.username}/"
+
+
+def test_user_totals_deltas_are_folded(user: User):
+    UserTotalsDelta.objects.create(user=user, income=Decimal("100.00"))
+    UserTotalsDelta.objects.create(user=user, income=Decimal("-20.00"), expenses=Decimal("7.50"))
+
+    user.fold_totals()
+
+    assert (user.income, user.expenses) == (Decimal("80.00"), Decimal("7.50"))
+    assert not UserTotalsDelta.objects.filter(user=user).exists()
+    assert UserTotalsDelta.fold() == 0
+
+
+def test_pending_totals_are_read_without_folding(user: User):
+    User.objects.filter(pk=user.pk).update(income=Decimal("10.00"))
+    UserTotalsDelta.objects.create(user=user, income=Decimal("100.00"))
+    UserTotalsDelta.objects.create(user=user, income=Decimal("-20.00"), expenses=Decimal("7.50"))
+
+    current = UserTotalsDelta.with_pending_totals(User.objects.filter(pk=user.pk)).get()
+
+    assert (current.current_income, current.current_expenses) == (Decimal("90.00"), Decimal("7.50"))
+    assert UserTotalsDelta.objects.filter(user=user).count() == 2
+
+
+def test_user_totals_record_updates_only_totals(user: User):
+    updated_at = User.objects.get(pk=user.pk).updated_at
+
+    UserTotalsDelta.record(user.pk, income=Decimal("12.00"))
+
+    user.refresh_from_db()
+    assert user.income == Decimal("12.00")
+    assert user.updated_at == updated_at
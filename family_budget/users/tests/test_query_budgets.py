@@ -0,0 +1,36 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+from budget.models import BudgetItem
+from family_budget.users.models import User, UserTotalsDelta
+from helpers.testing import QueryBudgetTestCase
+
+
+class UserApiQueryBudgetTestCase(QueryBudgetTestCase):
+    query_budgets = {
+        # the user with the sums of its pending totals deltas + groups and permissions
+        "users-me": 3,
+        "users-list": 3,
+        "users-retrieve": 3,
+    }
+
+    def seed(self, size):
+        user = User.objects.create(username=f"query_user_{size}", email=f"query_user_{size}@domain.com")
+        BudgetItem.bulk_create_items(user=user, items=[
+            {"name": f"Item {i}", "amount": Decimal("2.50"), "quantity": 1} for i in range(size)
+        ])
+        UserTotalsDelta.objects.bulk_create(
+            [UserTotalsDelta(user=user, expenses=Decimal("1.00")) for i in range(size)]
+        )
+        return SimpleNamespace(user=user)
+
+    def test_users_me(self):
+        self.assertQueryBudget("users-me", lambda client, data: client.get("/api/v1.0/users/me/"))
+
+    def test_users_list(self):
+        self.assertQueryBudget("users-list", lambda client, data: client.get("/api/v1.0/users/"))
+
+    def test_users_retrieve(self):
+        self.assertQueryBudget("users-retrieve", lambda client, data: client.get(
+            f"/api/v1.0/users/{data.user.username}/"
+        ))
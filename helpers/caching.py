@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from helpers.replicas import current_replica, pin_window, replicas
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "api-result"
+# Backends whose entries live in the memory of each process
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+STATS = ("hits", "misses", "evictions")
+# Entry keys this process stored recently, to tell evictions from plain misses
+TRACKED_KEYS = getattr(settings, "API_CACHE_TRACKED_KEYS", 10000)
+
+_stored = OrderedDict()
+_stored_lock = threading.Lock()
+
+
+def is_shared(alias):
+    """Whether the entries of the ``alias`` cache are seen by every process, not just the one storing them."""
+    return settings.CACHES[alias]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+def result_cache():
+    return caches[getattr(settings, "API_CACHE_ALIAS", "default")]
+
+
+def result_cache_enabled():
+    """
+    ``API_CACHE_ENABLED``, by default only when ``API_CACHE_ALIAS`` is a shared
+    cache: a generation bumped in the memory of one worker leaves the results
+    cached by the others to be served until they expire.
+    """
+    enabled = getattr(settings, "API_CACHE_ENABLED", None)
+    if enabled is None:
+        return is_shared(getattr(settings, "API_CACHE_ALIAS", "default"))
+    return enabled
+
+
+def generation_key(user_id):
+    return f"{KEY_PREFIX}:generation:{user_id}"
+
+
+def written_key(user_id):
+    return f"{KEY_PREFIX}:written:{user_id}"
+
+
+def get_generation(user_id):
+    """
+    Returns the current generation of ``user_id``'s cached results.
+
+    A missing counter is seeded from the clock rather than from 1, so that a
+    counter the cache evicted never comes back at a value that older entries
+    were stored under.
+    """
+    cache, key = result_cache(), generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id):
+    """
+    Invalidates every cached result of ``user_id`` in O(1): entries are keyed
+    by generation, so the old ones are never read again and expire by themselves.
+    """
+    cache, key = result_cache(), generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Nothing cached under a generation that no longer exists, seeding is enough
+        cache.add(key, time.time_ns(), timeout=None)
+    if replicas():
+        # Replicas may not have the change yet, see cached_result; kept in the
+        # result cache, which is shared by the workers whenever it is enabled
+        cache.set(written_key(user_id), True, timeout=math.ceil(pin_window()))
+
+
+def invalidate_user_results(user_id):
+    """
+    Bumps the generation now, so the rest of the transaction does not read stale
+    results, and again on commit, dropping whatever a concurrent request cached
+    from the pre-commit data in between.
+    """
+    bump_generation(user_id)
+    transaction.on_commit(lambda: bump_generation(user_id))
+
+
+def query_digest(request, kwargs):
+    """
+    Digests the query parameters and URL kwargs of ``request``, regardless of
+    the order of the parameters and of their values.
+    """
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    params += sorted(kwargs.items())
+    # Paginated responses embed absolute links, the host is part of the result
+    return hashlib.md5(repr((request.get_host(), params)).encode()).hexdigest()
+
+
+def result_key(request, endpoint, generation, kwargs):
+    """Builds the cache key of a response from the user, its generation, the endpoint and the query."""
+    return f"{KEY_PREFIX}:{request.user.pk}:{generation}:{endpoint}:{query_digest(request, kwargs)}"
+
+
+def count(stat):
+    cache, key = result_cache(), f"{KEY_PREFIX}:stats:{stat}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def result_cache_stats(reset=False):
+    """Returns the hit, miss and eviction counters, shared by the processes using the cache."""
+    cache = result_cache()
+    keys = {f"{KEY_PREFIX}:stats:{stat}": stat for stat in STATS}
+    values = cache.get_many(keys)
+    if reset:
+        cache.delete_many(keys)
+    stats = {stat: values.get(key, 0) for key, stat in keys.items()}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+    return stats
+
+
+def track_stored(key, timeout):
+    with _stored_lock:
+        _stored[key] = time.monotonic() + timeout
+        _stored.move_to_end(key)
+        while len(_stored) > TRACKED_KEYS:
+            _stored.popitem(last=False)
+
+
+def was_evicted(key):
+    """Whether ``key`` was stored by this process and is gone before its timeout."""
+    with _stored_lock:
+        expires = _stored.pop(key, None)
+    return expires is not None and expires > time.monotonic()
+
+
+def cached_result(view_method):
+    """
+    Caches the successful responses of a read-only viewset action per user,
+    endpoint and query parameters, under the user's current generation (see
+    ``invalidate_user_results``).
+
+    Only the response data is cached; content negotiation and rendering still
+    happen on every request. Results read from a replica (see helpers.replicas)
+    less than ``REPLICA_PIN_WINDOW`` seconds after a write of the user are not.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not result_cache_enabled() or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+
+        cache = result_cache()
+        endpoint = f"{self.basename}-{self.action}"
+        key = result_key(request, endpoint, get_generation(request.user.pk), kwargs)
+        data = cache.get(key)
+        if data is not None:
+            count("hits")
+            return Response(data)
+
+        count("misses")
+        if was_evicted(key):
+            count("evictions")
+            logger.debug(f"{__name__}: Cached {endpoint} result was evicted")
+
+        response = view_method(self, request, *args, **kwargs)
+        # Such a result may predate the write, the generation it would be stored under does not
+        stale = current_replica.get() is not None and cache.get(written_key(request.user.pk)) is not None
+        if response.status_code == status.HTTP_200_OK and not response.exception and not stale:
+            timeout = getattr(settings, "API_CACHE_TIMEOUT", 300)
+            cache.set(key, response.data, timeout)
+            track_stored(key, timeout)
+        return response
+
+    return wrapper
@@ -0,0 +1,160 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.response import Response
+
+from budget.common import VersionConflict
+from helpers.caching import query_digest
+
+
+def response_etag(request, endpoint, validators, kwargs):
+    """
+    A strong ETag for the response of ``endpoint`` to ``request``: the
+    validators cover the rows, the user, query and negotiated media type
+    cover how they are paginated and rendered.
+
+    The ETag of a single record starts with its version, ``"<version>-..."``,
+    which is what ``If-Match`` is checked against (see ``conditional_update``).
+    """
+    representation = (
+        request.user.pk, endpoint, request.accepted_media_type, query_digest(request, kwargs),
+        sorted(validators.items())
+    )
+    digest = hashlib.md5(repr(representation).encode()).hexdigest()
+    version = validators.get("version")
+    return quote_etag(digest if version is None else f"{version}-{digest}")
+
+
+def etag_version(if_match):
+    """
+    Returns the version ``If-Match`` names, from one of our ETags or a bare
+    ``"<version>"``, or None when it names none.
+    """
+    for etag in parse_etags(if_match):
+        version = etag.strip('"').split("-", 1)[0]
+        if version.isdigit():
+            return int(version)
+    return None
+
+
+def etag_matches(etag, if_none_match):
+    return if_none_match.strip() == "*" or etag in parse_etags(if_none_match)
+
+
+def conditional_get(view_method):
+    """
+    Adds ``ETag`` and ``Last-Modified`` to the responses of a read-only viewset
+    action, from ``get_validators`` (one aggregate query), and answers a
+    matching ``If-None-Match`` with a 304 before the action reads or
+    serializes anything.
+
+    ``If-Modified-Since`` alone is not honoured: ``Last-Modified`` does not
+    change when a row is deleted, the row count in the ETag does.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        etag = response_etag(request, f"{self.basename}-{self.action}", validators, kwargs)
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match and etag_matches(etag, if_none_match):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = view_method(self, request, *args, **kwargs)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+            modified = [value for value in validators.values() if isinstance(value, datetime)]
+            if modified:
+                response["Last-Modified"] = http_date(max(modified).timestamp())
+        return response
+
+    return wrapper
+
+
+def conditional_update(view_method):
+    """
+    Makes an update viewset action conditional on ``If-Match``: the record is
+    only written if it is still at the version named there, else the response
+    is a 412. The version check is part of the ``UPDATE`` itself (see
+    ``Versionable``), so concurrent edits need no row lock.
+
+    Without ``If-Match`` the update is checked against the version read by the
+    request, unless ``API_REQUIRE_IF_MATCH`` is set, which makes it a 428.
+
+    A successful update answers with the ETag of the record as ``retrieve``
+    does, at the cost of reading its validators again.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if_match = request.META.get("HTTP_IF_MATCH")
+        self.expected_version = None
+        if if_match is None and getattr(settings, "API_REQUIRE_IF_MATCH", False):
+            return Response(
+                {"message": _("Updates require an If-Match header with the ETag of the record.")},
+                status=status.HTTP_428_PRECONDITION_REQUIRED
+            )
+        if if_match is not None and if_match.strip() != "*":
+            self.expected_version = etag_version(if_match)
+            if self.expected_version is None:
+                return Response(
+                    {"message": _("If-Match does not name a version of the record.")},
+                    status=status.HTTP_412_PRECONDITION_FAILED
+                )
+
+        try:
+            with transaction.atomic():
+                response = view_method(self, request, *args, **kwargs)
+        except VersionConflict:
+            return Response(
+                {"message": _("The record was changed since you read it, reload it and try again.")},
+                status=status.HTTP_412_PRECONDITION_FAILED
+            )
+        if response.status_code == status.HTTP_200_OK:
+            # The ETag a GET of the record now answers with, which the client
+            # can revalidate its copy with
+            response["ETag"] = response_etag(request, f"{self.basename}-retrieve", self.get_validators(), kwargs)
+        return response
+
+    return wrapper
+
+
+class ConditionalRequestMixin:
+    """
+    Computes the validators of ``conditional_get`` responses: the latest
+    ``updated_at`` and the number of the rows the response is made of (and
+    the version of a single record), read from the user's rows without
+    serializing them. Applies the version of ``conditional_update``.
+    """
+
+    validator_aggregates = {
+        "last_modified": Max("updated_at"),
+        "count": Count("pk"),
+    }
+
+    def get_validator_queryset(self):
+        # The rows of the user without the annotations of get_queryset, which
+        # would turn the aggregate into a subquery.
+        queryset = self.queryset.model.objects.filter(user=self.request.user)
+        if self.lookup_field in self.kwargs:
+            return queryset.filter(pk=self.kwargs[self.lookup_field])
+        return self.filter_queryset(queryset)
+
+    def get_validators(self):
+        aggregates = dict(self.validator_aggregates)
+        if self.lookup_field in self.kwargs:
+            aggregates["version"] = Max("version")
+        return self.get_validator_queryset().aggregate(**aggregates)
+
+    def perform_update(self, serializer):
+        if getattr(self, "expected_version", None) is not None:
+            serializer.instance.version = self.expected_version
+        super().perform_update(serializer)
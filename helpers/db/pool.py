@@ -0,0 +1,231 @@
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import Counter, deque
+
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Acquisitions whose wait is kept for the percentiles of ``metrics``
+WAIT_SAMPLES = 1000
+
+
+class PoolTimeout(OperationalError):
+    """No connection of the pool was returned within its ``timeout``."""
+
+
+class ConnectionPool:
+    """
+    At most ``max_size`` open database connections, shared by the threads of
+    a process: a thread holds one from ``acquire`` to ``release``, and threads
+    beyond that wait up to ``timeout`` seconds for one to be returned.
+
+    Connections are opened by ``maintain`` rather than by requests, as far as
+    it can: it keeps ``min_size`` of them open, pings those idle for
+    ``check_interval`` seconds, and closes those idle for ``max_idle``
+    seconds (above ``min_size``) or open for ``max_lifetime`` seconds. A
+    request only opens one itself when all the open ones are in use.
+
+    ``connect`` is given to ``acquire`` and ``maintain``; ``check`` and
+    ``reset`` are the database specific parts: whether an idle connection
+    still works, and whether a returned one can be used again (after
+    rolling back what it left open).
+    """
+
+    def __init__(
+        self, check, reset, max_size=10, min_size=2, timeout=5.0, max_idle=300.0, max_lifetime=3600.0,
+        check_interval=30.0, name="default",
+    ):
+        self.check, self.reset = check, reset
+        self.max_size, self.min_size = max_size, min(min_size, max_size)
+        self.timeout, self.max_idle, self.max_lifetime = timeout, max_idle, max_lifetime
+        self.check_interval = check_interval
+        self.name = name
+        # (connection, returned at), the most recently returned last
+        self.idle = deque()
+        self.expires_at = {}
+        self.size = 0
+        self.waiting = 0
+        self.stats = Counter()
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.condition = threading.Condition()
+        self.maintainer = None
+
+    def acquire(self, connect):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self.condition:
+            while not self.idle and self.size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    logger.warning(f"{__name__}: No connection of the {self.name} pool within {self.timeout}s")
+                    raise PoolTimeout(f"No connection of the {self.name} pool was free within {self.timeout}s")
+                self.waiting += 1
+                try:
+                    self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            if self.idle:
+                # The most recently used connection, the least likely to have gone stale
+                connection, _ = self.idle.pop()
+            else:
+                connection = None
+                self.size += 1
+            self.stats["acquired"] += 1
+            self.waits.append(time.monotonic() - started)
+        if connection is None:
+            connection = self.open(connect)
+        return connection
+
+    def open(self, connect):
+        """Opens a connection the pool already counts in its ``size``."""
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            # Spread by up to 10%, so that connections are not all replaced at once
+            self.expires_at[id(connection)] = time.monotonic() + self.max_lifetime * random.uniform(0.9, 1)
+            self.stats["opened"] += 1
+        return connection
+
+    def release(self, connection):
+        """Returns ``connection``, or closes it when it cannot be used again or is too old."""
+        reusable = self.reset(connection) and not self.expired(connection, time.monotonic())
+        with self.condition:
+            if reusable:
+                self.idle.append((connection, time.monotonic()))
+            else:
+                self.forget(connection)
+            self.condition.notify()
+        if not reusable:
+            self.close(connection)
+
+    def discard(self, connection):
+        """Closes ``connection``, e.g. one abandoned in the middle of a transaction."""
+        with self.condition:
+            self.forget(connection)
+            self.condition.notify()
+        self.close(connection)
+
+    def expired(self, connection, now):
+        return now >= self.expires_at.get(id(connection), 0)
+
+    def forget(self, connection):
+        self.expires_at.pop(id(connection), None)
+        self.size -= 1
+        self.stats["closed"] += 1
+
+    @staticmethod
+    def close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def maintain(self, connect):
+        """
+        Closes the idle connections that are stale, too old or failing their
+        check, then opens connections up to ``min_size``.
+        """
+        now = time.monotonic()
+        with self.condition:
+            # Only the connections looked at are taken out, the others stay available
+            due = [
+                entry for entry in self.idle
+                if now - entry[1] >= min(self.check_interval, self.max_idle) or self.expired(entry[0], now)
+            ]
+            for entry in due:
+                self.idle.remove(entry)
+            surplus = self.size - self.min_size
+        passed, failed = [], []
+        for entry in due:
+            connection, returned_at = entry
+            if self.expired(connection, now) or (now - returned_at >= self.max_idle and surplus > 0):
+                surplus -= 1
+                failed.append(connection)
+            elif not self.check(connection):
+                self.stats["failed_checks"] += 1
+                failed.append(connection)
+            else:
+                # Checked now, not again before check_interval
+                passed.append((connection, time.monotonic()))
+        with self.condition:
+            self.idle.extendleft(reversed(passed))
+            for connection in failed:
+                self.forget(connection)
+            missing = max(self.min_size - self.size, 0)
+            self.size += missing
+            self.condition.notify_all()
+        for connection in failed:
+            self.close(connection)
+        for opened in range(missing):
+            try:
+                connection = self.open(connect)
+            except Exception:
+                logger.exception(f"{__name__}: Could not open a connection of the {self.name} pool")
+                with self.condition:
+                    # The next maintenance tries again
+                    self.size -= missing - opened - 1
+                    self.condition.notify_all()
+                break
+            with self.condition:
+                self.idle.appendleft((connection, time.monotonic()))
+                self.condition.notify()
+
+    def start(self, connect):
+        """Fills the pool to ``min_size`` and maintains it every ``check_interval`` seconds, in a thread."""
+        def run():
+            while True:
+                try:
+                    self.maintain(connect)
+                except Exception:
+                    logger.exception(f"{__name__}: Maintenance of the {self.name} pool failed")
+                time.sleep(self.check_interval * random.uniform(0.9, 1.1))
+
+        with self.condition:
+            if self.maintainer is None:
+                self.maintainer = threading.Thread(target=run, name=f"db-pool-{self.name}", daemon=True)
+                self.maintainer.start()
+
+    def metrics(self):
+        """Sizes, counters since the pool started, and the waits of the last acquisitions in milliseconds."""
+        with self.condition:
+            waits = sorted(wait * 1000 for wait in self.waits)
+            in_use = self.size - len(self.idle)
+            metrics = {
+                "size": self.size,
+                "idle": len(self.idle),
+                "in_use": in_use,
+                "waiting": self.waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "utilisation": round(in_use / self.max_size, 3),
+                **{name: self.stats[name] for name in ("acquired", "timeouts", "opened", "closed", "failed_checks")},
+            }
+        metrics["wait_ms"] = {
+            "p50": round(statistics.median(waits), 3) if waits else 0,
+            "p99": round(waits[max(int(len(waits) * 0.99) - 1, 0)], 3) if waits else 0,
+            "max": round(waits[-1], 3) if waits else 0,
+        }
+        return metrics
+
+
+# The pool of each database alias of this process
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, **options):
+    """The pool of ``alias``, created from ``options`` the first time."""
+    with pools_lock:
+        if alias not in pools:
+            pools[alias] = ConnectionPool(name=alias, **options)
+        return pools[alias]
@@ -0,0 +1,71 @@
+"""
+PostgreSQL backend whose connections are leased from a pool of the process
+(``helpers.db.pool``) instead of being opened by each thread::
+
+    DATABASES["default"]["ENGINE"] = "helpers.db.postgresql"
+    DATABASES["default"]["OPTIONS"]["pool"] = {"max_size": 10, "min_size": 2, "timeout": 5}
+
+Closing a connection returns it to the pool, so ``CONN_MAX_AGE`` should be
+0: a request then holds a connection only while it is served.
+"""
+from functools import partial
+
+import psycopg2
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLDatabaseWrapper
+from django.utils.asyncio import async_unsafe
+from psycopg2 import extensions
+
+from helpers.db.pool import get_pool
+
+
+def check(connection):
+    """Whether an idle connection still answers."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def reset(connection):
+    """Rolls back what a returned connection left open, returns whether it can be used again."""
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+        try:
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+        status = connection.info.transaction_status
+    return status == extensions.TRANSACTION_STATUS_IDLE
+
+
+class DatabaseWrapper(PostgreSQLDatabaseWrapper):
+    @property
+    def pool(self):
+        return get_pool(self.alias, check=check, reset=reset, **self.settings_dict["OPTIONS"].get("pool", {}))
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connect = partial(super().get_new_connection, conn_params)
+        self.pool.start(connect)
+        connection = self.pool.acquire(connect)
+        # Set by the connect of whichever wrapper opened the connection
+        self.isolation_level = self.settings_dict["OPTIONS"].get("isolation_level", connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                if self.in_atomic_block:
+                    # Django keeps the connection until the block exits, it cannot be leased again
+                    self.pool.discard(self.connection)
+                else:
+                    self.pool.release(self.connection)
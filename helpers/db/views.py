@@ -0,0 +1,20 @@
+import os
+
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from helpers.db.pool import pools
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def pool_metrics(request):
+    """
+    Database Pool Metrics
+
+    The connection pools of the worker that answers: their sizes and
+    utilisation, counters since it started, and the time the last
+    requests waited for a connection.
+    """
+    return Response({"pid": os.getpid(), "pools": {alias: pool.metrics() for alias, pool in list(pools.items())}})
@@ -0,0 +1,361 @@
+import asyncio
+import contextvars
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Sent in place of the backlog of a connection that does not keep up
+RESYNC = json.dumps({"type": "resync"})
+# Sent every LIVE_HEARTBEAT_INTERVAL seconds, clients answer with any message
+HEARTBEAT = json.dumps({"type": "heartbeat"})
+# Queued to make the sender of a connection close it
+CLOSE = None
+# Delays before listening again to the events channel, doubling from the first to the last
+RECONNECT_INITIAL_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+
+def events_channel():
+    return getattr(settings, "LIVE_EVENTS_CHANNEL", "budget_events")
+
+
+def publish(user_id, event_type, **data):
+    """
+    Publishes a change to the data of ``user_id`` to its live connections in
+    every worker, once the current transaction commits.
+
+    On Postgres the event is a ``NOTIFY`` on ``LIVE_EVENTS_CHANNEL``, which the
+    database delivers on commit to the listener of each worker (this one
+    included). Elsewhere it only reaches the connections of this process.
+    """
+    event = {"user": str(user_id), "type": event_type, **data}
+    connection = connections["default"]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [events_channel(), json.dumps(event, cls=DjangoJSONEncoder)])
+    else:
+        event = json.loads(json.dumps(event, cls=DjangoJSONEncoder))
+        transaction.on_commit(lambda: hub.dispatch_threadsafe(event))
+
+
+def read_totals(user_id):
+    """The ``income`` and ``expenses`` of ``user_id``, pending deltas included, as strings."""
+    from family_budget.users.models import User, UserTotalsDelta
+
+    try:
+        totals = UserTotalsDelta.with_pending_totals(User.objects.filter(pk=user_id)).values(
+            "current_income", "current_expenses"
+        ).first()
+    finally:
+        # Read outside of a request, nothing else gives the connection back (to the pool)
+        close_old_connections()
+    return {name: str(totals[f"current_{name}"]) for name in ("income", "expenses")} if totals else {}
+
+
+class Subscriber:
+    """
+    The outgoing events of one live connection, in a queue of at most
+    ``LIVE_SEND_QUEUE_SIZE`` messages.
+
+    Events are queued without waiting, so a client that reads slowly never
+    holds up the others: when its queue is full the backlog is dropped and
+    replaced by a single ``resync`` event, after which the client reloads what
+    it shows through the REST API.
+
+    ``last_seen`` is when the client was last heard from, see
+    ``EventHub.heartbeat``.
+    """
+
+    def __init__(self, user_id, maxsize=None):
+        self.user_id = str(user_id)
+        self.queue = asyncio.Queue(maxsize or getattr(settings, "LIVE_SEND_QUEUE_SIZE", 100))
+        self.dropped = 0
+        self.last_seen = time.monotonic()
+
+    def seen(self):
+        self.last_seen = time.monotonic()
+
+    def close(self):
+        """Drops whatever is queued and makes the sender close the connection."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(CLOSE)
+
+    def put(self, message):
+        """Queues ``message``, returns False when the backlog had to be dropped instead."""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            logger.info(f"{__name__}: Dropped the backlog of a slow connection of user {self.user_id}")
+            return False
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class PostgresListener:
+    """
+    ``LISTEN``s on the events channel on a connection of its own, which the
+    event loop reads whenever notifications arrive: no thread is involved.
+
+    When the connection is lost (a restart or failover of Postgres, an idle
+    timeout), it is opened again with a growing delay, and ``on_reconnect``
+    is called once it is back: whatever was published in between was missed.
+    """
+
+    def __init__(self, callback, on_reconnect):
+        self.callback = callback
+        self.on_reconnect = on_reconnect
+        self.connection = None
+        self.fileno = None
+        self.loop = None
+        self.reconnecting = None
+
+    @staticmethod
+    def connect():
+        import psycopg2
+
+        params = connections["default"].get_connection_params()
+        # So that a peer gone silently (e.g. after a failover) fails the connection rather than leaving it hanging
+        params = {"keepalives": 1, "keepalives_idle": 30, "keepalives_interval": 10, "keepalives_count": 3, **params}
+        connection = psycopg2.connect(**params)
+        connection.set_session(autocommit=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {connections['default'].ops.quote_name(events_channel())}")
+        return connection
+
+    async def start(self, loop):
+        import psycopg2
+
+        self.loop = loop
+        try:
+            await self.listen()
+        except psycopg2.Error:
+            logger.exception(f"{__name__}: Could not listen to {events_channel()}")
+            self.reconnecting = loop.create_task(self.reconnect())
+
+    async def listen(self):
+        self.connection = await self.loop.run_in_executor(None, self.connect)
+        self.fileno = self.connection.fileno()
+        self.loop.add_reader(self.fileno, self.read)
+        logger.info(f"{__name__}: Listening to {events_channel()}")
+
+    async def reconnect(self):
+        import psycopg2
+
+        delay = RECONNECT_INITIAL_DELAY
+        while True:
+            # Spread, so that the workers do not all reconnect at once
+            await asyncio.sleep(delay * random.uniform(0.5, 1))
+            try:
+                await self.listen()
+            except psycopg2.Error as error:
+                logger.warning(f"{__name__}: Could not listen to {events_channel()} again: {error}")
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+            self.reconnecting = None
+            self.on_reconnect()
+            return
+
+    def read(self):
+        import psycopg2
+
+        try:
+            self.connection.poll()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as error:
+            logger.warning(f"{__name__}: Lost the connection listening to {events_channel()}: {error}")
+            self.disconnect()
+            self.reconnecting = self.loop.create_task(self.reconnect())
+            return
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            try:
+                event = json.loads(notify.payload)
+            except ValueError:
+                logger.warning(f"{__name__}: Ignored a malformed event on {notify.channel}")
+                continue
+            self.callback(event)
+
+    def disconnect(self):
+        if self.connection is not None:
+            if not self.loop.is_closed():
+                self.loop.remove_reader(self.fileno)
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def stop(self):
+        if self.reconnecting is not None and not self.reconnecting.get_loop().is_closed():
+            self.reconnecting.cancel()
+        self.reconnecting = None
+        self.disconnect()
+
+
+class EventHub:
+    """
+    The registry of the live connections of this worker, per user, which the
+    published events are fanned out to. Events of users without a connection
+    here are dropped on arrival.
+
+    When a budget item of a user changes, the totals of the user are read
+    once per worker, ``LIVE_TOTALS_DELAY`` seconds later, and pushed to all
+    of its connections; the changes of a burst share one read.
+
+    A worker holds at most ``LIVE_MAX_CONNECTIONS`` connections. A single
+    task sends them heartbeats and evicts those idle for too long (see
+    ``heartbeat``); ``metrics`` reports on them. Connections are told to
+    ``resync`` when the listener had to reconnect.
+    """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.connections = 0
+        self.stats = Counter()
+        self.loop = None
+        self.listener = None
+        self.listening = None
+        self.sweeper = None
+        self.pending_totals = set()
+
+    async def subscribe(self, subscriber):
+        """Registers ``subscriber``, unless the worker is full. Returns whether it was."""
+        await self.start()
+        if self.connections >= getattr(settings, "LIVE_MAX_CONNECTIONS", 10000):
+            self.stats["rejected"] += 1
+            logger.warning(f"{__name__}: Refused a connection, {self.connections} are open")
+            return False
+        self.subscribers[subscriber.user_id].add(subscriber)
+        self.connections += 1
+        self.stats["opened"] += 1
+        return True
+
+    def unsubscribe(self, subscriber):
+        subscribers = self.subscribers.get(subscriber.user_id)
+        if subscribers is not None and subscriber in subscribers:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.user_id]
+            self.connections -= 1
+            self.stats["closed"] += 1
+
+    def deliver(self, subscriber, message):
+        if not subscriber.put(message):
+            self.stats["resyncs"] += 1
+
+    def heartbeat(self):
+        """
+        Evicts the connections whose client was not heard from for
+        ``LIVE_IDLE_TIMEOUT`` seconds and queues a heartbeat to the others,
+        which live clients answer.
+        """
+        deadline = time.monotonic() - getattr(settings, "LIVE_IDLE_TIMEOUT", 75)
+        for subscribers in list(self.subscribers.values()):
+            for subscriber in list(subscribers):
+                if subscriber.last_seen < deadline:
+                    subscriber.close()
+                    self.unsubscribe(subscriber)
+                    self.stats["evicted"] += 1
+                else:
+                    self.deliver(subscriber, HEARTBEAT)
+
+    def resync(self):
+        """Tells every connection to reload what it shows, e.g. after events may have been missed."""
+        self.stats["reconnects"] += 1
+        for subscribers in list(self.subscribers.values()):
+            for subscriber in list(subscribers):
+                self.deliver(subscriber, RESYNC)
+
+    async def sweep(self):
+        while True:
+            await asyncio.sleep(getattr(settings, "LIVE_HEARTBEAT_INTERVAL", 30))
+            self.heartbeat()
+
+    def metrics(self):
+        """Connection counts and counters of this worker since it started."""
+        # Copied first, views read them from a thread while the event loop changes them
+        subscribers = [subscriber for group in list(self.subscribers.values()) for subscriber in list(group)]
+        return {
+            "connections": self.connections,
+            "users": len(self.subscribers),
+            "max_connections": getattr(settings, "LIVE_MAX_CONNECTIONS", 10000),
+            "queued_events": sum(subscriber.queue.qsize() for subscriber in subscribers),
+            **{name: self.stats[name] for name in ("opened", "closed", "rejected", "evicted", "resyncs", "reconnects")},
+        }
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # A new event loop (a restarted server, another test) starts afresh
+            self.stop()
+            self.loop = loop
+            self.sweeper = loop.create_task(self.sweep())
+            if connections["default"].vendor == "postgresql":
+                self.listener = PostgresListener(self.dispatch, self.resync)
+                self.listening = loop.create_task(self.listener.start(loop))
+        if self.listening is not None:
+            # Connections that arrive while the listener starts wait for it too,
+            # rather than being registered before it can deliver their events
+            await asyncio.shield(self.listening)
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        if self.listening is not None and not self.listening.get_loop().is_closed():
+            self.listening.cancel()
+        self.listening = None
+        if self.sweeper is not None and not self.sweeper.get_loop().is_closed():
+            self.sweeper.cancel()
+        self.sweeper = None
+        self.subscribers.clear()
+        self.connections = 0
+        self.stats.clear()
+        self.pending_totals.clear()
+        self.loop = None
+
+    def dispatch_threadsafe(self, event):
+        if self.loop is not None and not self.loop.is_closed():
+            # Not in the context of the publishing thread: its sync_to_async
+            # state would make the totals read look like a deadlock
+            self.loop.call_soon_threadsafe(self.dispatch, event, context=contextvars.Context())
+
+    def dispatch(self, event):
+        user_id = event.pop("user", None)
+        subscribers = self.subscribers.get(user_id)
+        if not subscribers:
+            return
+        message = json.dumps(event)
+        for subscriber in list(subscribers):
+            self.deliver(subscriber, message)
+        if event["type"].startswith("budget_item") and user_id not in self.pending_totals:
+            self.pending_totals.add(user_id)
+            self.loop.create_task(self.push_totals(user_id))
+
+    async def push_totals(self, user_id):
+        await asyncio.sleep(getattr(settings, "LIVE_TOTALS_DELAY", 0.25))
+        # Changes from now on need a read of their own
+        self.pending_totals.discard(user_id)
+        if not self.subscribers.get(user_id):
+            return
+        message = json.dumps({"type": "totals", **await sync_to_async(read_totals)(user_id)})
+        for subscriber in list(self.subscribers.get(user_id, ())):
+            self.deliver(subscriber, message)
+
+
+hub = EventHub()
@@ -18,7 +18,9 @@ class BudgetItemFilter(filters.FilterSet):
 
     min_amount = filters.NumberFilter(field_name="amount", lookup_expr='gte')
     max_amount = filters.NumberFilter(field_name="amount", lookup_expr='lte')
+    min_total = filters.NumberFilter(field_name="total", lookup_expr='gte')
+    max_total = filters.NumberFilter(field_name="total", lookup_expr='lte')
 
     class Meta:
         model = BudgetItem
-        fields = ['item_type', 'min_amount', 'max_amount']
+        fields = ['item_type', 'min_amount', 'max_amount', 'min_total', 'max_total']
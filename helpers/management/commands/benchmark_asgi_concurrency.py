@@ -0,0 +1,116 @@
+import asyncio
+import statistics
+import time
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.db.backends.utils import CursorWrapper
+from django.test.utils import override_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from budget.models import Budget, BudgetItem
+from family_budget.users.authentication import ClaimsRefreshToken
+from helpers.streaming import StreamingASGIHandler
+
+User = get_user_model()
+
+
+async def get(handler, path, token):
+    """Sends a GET to ``handler`` in-process and returns the response status."""
+    inbox, status = asyncio.Queue(), []
+    await inbox.put({"type": "http.request", "body": b""})
+    scope = {
+        "type": "http", "method": "GET", "path": path, "query_string": b"",
+        "headers": [(b"authorization", f"Bearer {token}".encode()), (b"host", b"localhost")],
+    }
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await handler(scope, inbox.get, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends concurrent reads of the budget API (lists, retrieves, the summary "
+        "and users/me) to one ASGI worker in-process, with Django's stock handler "
+        "and with config.asgi's, and reports throughput and latencies. A delay is "
+        "added to each query for the database round trip. The user and data it "
+        "reads are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=600, help="Requests sent to each handler")
+        parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight at a time")
+        parser.add_argument("--threads", type=int, default=16, help="ASGI_THREADS of the worker")
+        parser.add_argument("--latency", type=float, default=2.0, help="Milliseconds added to each query")
+
+    def handle(self, *args, **options):
+        user = User.objects.create(username=f"bench-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex}@bench.local")
+        try:
+            item = None
+            for i in range(50):
+                item = BudgetItem.create(user=user, name=f"Item {i}", amount=Decimal("12.50"), quantity=2)
+            budget = Budget.objects.create(user=user, name="Bench")
+            budget.budget_items.add(item)
+            token = str(ClaimsRefreshToken.for_user(user).access_token)
+            paths = [
+                "/api/v1.0/budget-items/",
+                f"/api/v1.0/budget-items/{item.pk}/",
+                "/api/v1.0/budget-items/summary/",
+                "/api/v1.0/budgets/",
+                f"/api/v1.0/budgets/{budget.pk}/",
+                "/api/v1.0/users/me/",
+            ]
+            latency = options["latency"] / 1000
+            execute = CursorWrapper._execute
+
+            def delayed_execute(cursor, *args):
+                # Stands for the network round trip: the thread waits, without the GIL
+                time.sleep(latency)
+                return execute(cursor, *args)
+
+            with (
+                mock.patch.object(CursorWrapper, "_execute", delayed_execute),
+                # Throttling stays in the path, without a limit the benchmark would reach
+                mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {"user": "1000000/second"}),
+                override_settings(ASGI_THREADS=options["threads"], API_CACHE_ENABLED=False, ALLOWED_HOSTS=["*"]),
+            ):
+                for name, handler in (
+                    ("Django's ASGIHandler", ASGIHandler()),
+                    (f"StreamingASGIHandler, {options['threads']} threads", StreamingASGIHandler()),
+                ):
+                    self.report(name, asyncio.run(self.run(handler, paths, token, options)), options)
+        finally:
+            user.delete()
+
+    async def run(self, handler, paths, token, options):
+        semaphore, latencies, statuses = asyncio.Semaphore(options["concurrency"]), [], []
+
+        async def timed(path):
+            async with semaphore:
+                started = time.perf_counter()
+                statuses.append(await get(handler, path, token))
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(timed(paths[i % len(paths)]) for i in range(options["requests"])))
+        return time.perf_counter() - started, sorted(latencies), statuses
+
+    def report(self, name, result, options):
+        elapsed, latencies, statuses = result
+        failed = sum(status != 200 for status in statuses)
+        self.stdout.write(
+            f"{name}: {len(latencies) / elapsed:.0f} requests/s, "
+            f"p50 {statistics.median(latencies):.1f}ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f}ms "
+            f"({options['requests']} requests, {options['concurrency']} concurrent)"
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} responses were not 200: {sorted(set(statuses))}"))
@@ -0,0 +1,115 @@
+import statistics
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+
+from budget.models import Budget, BudgetItem
+from family_budget.users.authentication import ClaimsRefreshToken
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the read endpoints of the API (lists, retrieves, the summary, "
+        "users/me and the home page) with a transaction around every request "
+        "(ATOMIC_REQUESTS, before) and with the per action policy of "
+        "helpers.transactions (after). A delay is added to every database round "
+        "trip: each query, BEGIN and COMMIT. The user and data it reads are "
+        "deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and mode")
+        parser.add_argument("--latency", type=float, default=1.0, help="Milliseconds added to each round trip")
+
+    def handle(self, *args, **options):
+        user = User.objects.create(username=f"bench-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex}@bench.local")
+        try:
+            item = None
+            for i in range(50):
+                item = BudgetItem.create(user=user, name=f"Item {i}", amount=Decimal("12.50"), quantity=2)
+            budget = Budget.objects.create(user=user, name="Bench")
+            budget.budget_items.add(item)
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {ClaimsRefreshToken.for_user(user).access_token}")
+            paths = [
+                "/api/v1.0/budget-items/",
+                "/api/v1.0/budget-items/{item}/",
+                "/api/v1.0/budget-items/summary/",
+                "/api/v1.0/budgets/",
+                "/api/v1.0/budgets/{budget}/",
+                "/api/v1.0/users/me/",
+                "/",
+            ]
+            with self.round_trips(options["latency"] / 1000) as round_trips, \
+                    mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {"user": "1000000/second"}), \
+                    override_settings(API_CACHE_ENABLED=False, ALLOWED_HOSTS=["*"]):
+                results = {}
+                for path in paths:
+                    url = path.format(item=item.pk, budget=budget.pk)
+                    results[path] = [
+                        self.time(client, url, round_trips, options["requests"], atomic) for atomic in (True, False)
+                    ]
+        finally:
+            connections["default"].settings_dict["ATOMIC_REQUESTS"] = False
+            user.delete()
+
+        self.stdout.write(f"{'Endpoint':<36} {'ATOMIC_REQUESTS':>26} {'Per action':>26}")
+        for path, timings in results.items():
+            self.stdout.write(f"{path:<36} " + " ".join(
+                f"{f'p50 {p50:.2f}ms p99 {p99:.2f}ms, {trips:.0f} rt':>26}" for p50, p99, trips in timings
+            ))
+
+    @staticmethod
+    def time(client, path, round_trips, requests, atomic):
+        connections["default"].settings_dict["ATOMIC_REQUESTS"] = atomic
+        latencies, counts = [], []
+        for _ in range(requests):
+            round_trips.clear()
+            started = time.perf_counter()
+            response = client.get(path)
+            latencies.append((time.perf_counter() - started) * 1000)
+            counts.append(len(round_trips))
+            assert response.status_code == 200, (path, response.status_code)
+        latencies.sort()
+        return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1], statistics.mean(counts)
+
+    @staticmethod
+    @contextmanager
+    def round_trips(latency):
+        """Adds ``latency`` to every query, BEGIN and COMMIT, and lists them."""
+        trips = []
+        backend = type(connections["default"])
+        execute, set_autocommit = CursorWrapper._execute, backend.set_autocommit
+        commit, rollback = backend._commit, backend._rollback
+
+        def delayed(function, name):
+            def wrapper(*args, **kwargs):
+                trips.append(name)
+                time.sleep(latency)
+                return function(*args, **kwargs)
+            return wrapper
+
+        def begin(wrapper, autocommit, *args, **kwargs):
+            # Leaving autocommit is a BEGIN, that psycopg2 sends before the next
+            # query (the sqlite backend runs it as a query, already counted)
+            if not autocommit and wrapper.get_autocommit() and wrapper.vendor != "sqlite":
+                trips.append("BEGIN")
+                time.sleep(latency)
+            return set_autocommit(wrapper, autocommit, *args, **kwargs)
+
+        with mock.patch.multiple(
+            backend, set_autocommit=begin, _commit=delayed(commit, "COMMIT"), _rollback=delayed(rollback, "ROLLBACK")
+        ), mock.patch.object(CursorWrapper, "_execute", delayed(execute, "query")):
+            yield trips
@@ -0,0 +1,111 @@
+import asyncio
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from config.websocket import websocket_application
+from family_budget.users.authentication import ClaimsRefreshToken
+from helpers.events import hub
+
+User = get_user_model()
+
+
+class Connection:
+    """A websocket client talking to the application in-process, through queues."""
+
+    def __init__(self, token):
+        self.inbox, self.outbox = asyncio.Queue(), asyncio.Queue()
+        scope = {"type": "websocket", "query_string": f"token={token}".encode(), "headers": []}
+        self.application = asyncio.create_task(websocket_application(scope, self.inbox.get, self.outbox.put))
+
+    async def open(self):
+        await self.inbox.put({"type": "websocket.connect"})
+        message = await self.outbox.get()
+        assert message["type"] == "websocket.accept", message
+
+    async def ping(self):
+        await self.inbox.put({"type": "websocket.receive", "text": "ping"})
+        return await self.outbox.get()
+
+    async def close(self):
+        await self.inbox.put({"type": "websocket.disconnect"})
+        await self.application
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens websocket connections to the live updates application in-process "
+        "and reports the memory each one takes, the ping round trip, and the cost "
+        "of a fan-out and of a heartbeat sweep. Nothing is written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=10000, help="Number of concurrent connections")
+        parser.add_argument("--pings", type=int, default=1000, help="Number of ping round trips to time")
+        parser.add_argument("--batch-size", type=int, default=500, help="Connections opened concurrently")
+
+    def handle(self, *args, **options):
+        # Authenticated from the token claims, the user row is never read
+        user = User(id=uuid.uuid4(), username=f"bench-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex}@bench.local")
+        token = str(ClaimsRefreshToken.for_user(user).access_token)
+        with override_settings(LIVE_MAX_CONNECTIONS=options["connections"], LIVE_HEARTBEAT_INTERVAL=3600):
+            asyncio.run(self.run(token, user, options))
+
+    async def run(self, token, user, options):
+        count, batch_size = options["connections"], options["batch_size"]
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+        started = time.perf_counter()
+        connections = []
+        for i in range(0, count, batch_size):
+            batch = [Connection(token) for _ in range(min(batch_size, count - i))]
+            await asyncio.gather(*(connection.open() for connection in batch))
+            connections.extend(batch)
+        opened = time.perf_counter() - started
+
+        gc.collect()
+        per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / count
+        tracemalloc.stop()
+        self.stdout.write(
+            f"Opened {count} connections in {opened:.2f}s, {per_connection / 1024:.1f} KiB per connection "
+            f"(including the in-process transport queues)"
+        )
+
+        round_trips = []
+        for i in range(options["pings"]):
+            started = time.perf_counter()
+            await connections[i % count].ping()
+            round_trips.append((time.perf_counter() - started) * 1000)
+        round_trips.sort()
+        self.stdout.write(
+            f"Ping round trip over {len(round_trips)} pings: "
+            f"p50 {statistics.median(round_trips):.3f}ms, "
+            f"p99 {round_trips[int(len(round_trips) * 0.99) - 1]:.3f}ms, max {round_trips[-1]:.3f}ms"
+        )
+
+        started = time.perf_counter()
+        hub.dispatch({"user": str(user.pk), "type": "budget.updated", "id": None})
+        for connection in connections:
+            json.loads((await connection.outbox.get())["text"])
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"Fan-out of one event to {count} connections: {elapsed:.1f}ms")
+
+        started = time.perf_counter()
+        hub.heartbeat()
+        swept = time.perf_counter() - started
+        for connection in connections:
+            await connection.outbox.get()
+        self.stdout.write(f"Heartbeat sweep of {count} connections: {swept * 1000:.1f}ms")
+
+        self.stdout.write(f"Metrics: {hub.metrics()}")
+        await asyncio.gather(*(connection.close() for connection in connections))
+        self.stdout.write(self.style.SUCCESS(f"Closed {count} connections, {hub.metrics()['connections']} left"))
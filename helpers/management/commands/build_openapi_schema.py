@@ -0,0 +1,24 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from config.urls import SchemaView
+from helpers.schema import render_schema, schema_root, write_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the OpenAPI schema to hashed JSON and YAML files, served by the "
+        "documentation views instead of generating the schema on each request. "
+        "Run it at build time, after every change to the API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", type=Path, help="Directory to write to, defaults to OPENAPI_SCHEMA_ROOT")
+
+    def handle(self, *args, **options):
+        root = options["output"] or schema_root()
+        schema = render_schema(SchemaView)
+        for path in write_schema(schema, root):
+            self.stdout.write(f"Wrote {path}")
+        self.stdout.write(self.style.SUCCESS(f"Built OpenAPI schema {schema.digest}"))
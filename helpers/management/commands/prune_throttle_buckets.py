@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from helpers.throttling import prune_buckets
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the rate limit buckets of clients that are no longer throttled. "
+        "Run it periodically, the table otherwise keeps a row per user and address ever seen."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Pruned {prune_buckets()} throttle buckets"))
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('key', models.CharField(help_text='The throttle scope and the user or client address', max_length=255, primary_key=True, serialize=False)),
+                ('tat', models.FloatField(help_text='Theoretical arrival time: when the next request would be on schedule, in epoch seconds')),
+                ('allowed', models.BooleanField(default=True, help_text='Whether the last request was allowed')),
+            ],
+            options={
+                'verbose_name': 'Throttle Bucket',
+                'verbose_name_plural': 'Throttle Buckets',
+            },
+        ),
+    ]
@@ -1,3 +1,27 @@
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class ThrottleBucket(models.Model):
+    """
+    The state of a GCRA rate limit, shared by every worker through the
+    database. See ``helpers.throttling``.
+    """
+    key = models.CharField(
+        primary_key=True,
+        max_length=255,
+        help_text=_("The throttle scope and the user or client address")
+    )
+
+    tat = models.FloatField(
+        help_text=_("Theoretical arrival time: when the next request would be on schedule, in epoch seconds")
+    )
+
+    allowed = models.BooleanField(
+        default=True,
+        help_text=_("Whether the last request was allowed")
+    )
+
+    class Meta:
+        verbose_name = _("Throttle Bucket")
+        verbose_name_plural = _("Throttle Buckets")
@@ -0,0 +1,192 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import BooleanField, F, Func, Q, Value
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_filter(model, ordering, position):
+    """
+    Filters on the rows after ``position`` in ``ordering``.
+
+    When every field is ordered the same way, this is the row comparison
+    ``(a, b, c) < (x, y, z)``, which Postgres uses as the bound of a range scan
+    on a matching composite index. Mixed directions have no row comparison and
+    are expanded into ``a < x OR (a = x AND b > y) OR ...``, which an index can
+    only filter on.
+    """
+    names = [field_name.lstrip("-") for field_name in ordering]
+    directions = {field_name.startswith("-") for field_name in ordering}
+    if len(directions) == 1:
+        values = [Value(value, output_field=model._meta.get_field(name)) for name, value in zip(names, position)]
+        return Func(
+            Func(*map(F, names), template="(%(expressions)s)"),
+            Func(*values, template="(%(expressions)s)"),
+            template="%(expressions)s",
+            arg_joiner=" < " if directions.pop() else " > ",
+            output_field=BooleanField(),
+        )
+
+    condition, equal = Q(), {}
+    for field_name, name, value in zip(ordering, names, position):
+        lookup = "lt" if field_name.startswith("-") else "gt"
+        condition |= Q(**equal, **{f"{name}__{lookup}": value})
+        equal[name] = value
+    return condition
+
+
+def keyset_position(obj, ordering):
+    """Returns the cursor position of ``obj`` as JSON friendly strings."""
+    return [
+        obj._meta.get_field(field_name.lstrip("-")).value_to_string(obj) for field_name in ordering
+    ]
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination over a composite, unique ordering.
+
+    Unlike ``CursorPagination``, which positions on the first ordering field and
+    falls back to an OFFSET for ties, the cursor here carries the value of every
+    ordering field, so each page is a plain range scan on a matching composite
+    index:
+
+        WHERE (created_at, id) < (:created_at, :id) ORDER BY created_at DESC, id DESC
+
+    The total count is only computed when asked for with ``?include_count=true``
+    (or ``API_PAGINATION_INCLUDE_COUNT``), so page latency does not depend on how
+    deep the client is or on the size of the table.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = getattr(settings, "API_PAGE_SIZE", 50)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 500)
+    include_count_query_param = "include_count"
+    ordering_query_param = "ordering"
+    include_count = getattr(settings, "API_PAGINATION_INCLUDE_COUNT", False)
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.page_model = queryset.model
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.count = queryset.count() if self.get_include_count(request) else None
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(self.page_model, self.ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        self.has_next = len(results) > self.page_size
+        return self.page
+
+    def get_include_count(self, request):
+        value = request.query_params.get(self.include_count_query_param)
+        if value is None:
+            return self.include_count
+        return value.lower() in ("1", "true", "yes")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(keyset_position(self.page[-1], self.ordering))
+
+    def get_previous_link(self):
+        return None
+
+    def encode_cursor(self, position):
+        encoded = b64encode(json.dumps(position).encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            position = json.loads(b64decode(encoded.encode("ascii")).decode("ascii"))
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return [
+                self.page_model._meta.get_field(name.lstrip("-")).to_python(value)
+                for name, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_ordering(self, request, queryset, view):
+        # ``view.keyset_orderings`` maps the accepted ``?ordering=`` values to
+        # unique orderings; anything else falls back to the default ordering.
+        orderings = getattr(view, "keyset_orderings", {})
+        requested = request.query_params.get(self.ordering_query_param)
+        if requested in orderings:
+            return orderings[requested]
+        return getattr(view, "keyset_ordering", None) or self.ordering
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict([("next", self.get_next_link())])
+        if self.count is not None:
+            payload["count"] = self.count
+        payload["results"] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "count": {"type": "integer", "example": 123},
+                "results": schema,
+            },
+        }
+
+    def get_html_context(self):
+        return {
+            "previous_url": None,
+            "next_url": self.get_next_link(),
+        }
+
+    def get_schema_fields(self, view):
+        fields = super().get_schema_fields(view)
+        try:
+            import coreapi
+            import coreschema
+        except ImportError:
+            return fields
+        if orderings := getattr(view, "keyset_orderings", None):
+            fields.append(coreapi.Field(
+                name=self.ordering_query_param,
+                required=False,
+                location="query",
+                schema=coreschema.Enum(
+                    list(orderings),
+                    title="Ordering",
+                    description="Which field to order the results by, prefix with `-` for descending."
+                )
+            ))
+        return fields + [
+            coreapi.Field(
+                name=self.include_count_query_param,
+                required=False,
+                location="query",
+                schema=coreschema.Boolean(
+                    title="Include count",
+                    description="Include the total number of results. Costs an extra COUNT query."
+                )
+            )
+        ]
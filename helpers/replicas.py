@@ -0,0 +1,128 @@
+"""
+Reads of the API from read replicas, without losing sight of one's own writes.
+
+``DATABASE_REPLICAS`` names the database aliases of the replicas. The safe
+actions of the viewsets with ``ReplicaReadsMixin`` read from one of them,
+picked per request, and everything else from the primary (``default``):
+writes, reads within a transaction, and the requests of a user who wrote in
+the last ``REPLICA_PIN_WINDOW`` seconds. Responses to writes carry a signed
+pin, as a cookie and in the ``X-Primary-Pin`` header, that keeps the user on
+the primary until then, so the totals they see right after adding an item
+include it whatever the replication lag. Clients that do not keep cookies
+(bearer token ones) send the header back with their next requests.
+"""
+import math
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signing import BadSignature, TimestampSigner
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = "primary_pin"
+PIN_HEADER = "X-Primary-Pin"
+PIN_SALT = "helpers.replicas"
+
+# The replica the current request reads from, if any
+current_replica = ContextVar("current_replica", default=None)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def pin_window():
+    return getattr(settings, "REPLICA_PIN_WINDOW", 5.0)
+
+
+@contextmanager
+def reading_from(alias):
+    token = current_replica.set(alias)
+    try:
+        yield
+    finally:
+        current_replica.reset(token)
+
+
+def is_pinned(request):
+    """
+    Whether ``request`` comes from a user who wrote within ``REPLICA_PIN_WINDOW``
+    seconds, from the pin in its cookie or ``X-Primary-Pin`` header.
+    """
+    signer = TimestampSigner(salt=PIN_SALT)
+    for pin in (request.COOKIES.get(PIN_COOKIE), request.headers.get(PIN_HEADER)):
+        try:
+            if pin and signer.unsign(pin, max_age=pin_window()) == str(request.user.pk):
+                return True
+        except BadSignature:
+            pass
+    return False
+
+
+def pin(response, user):
+    """Makes the next requests of ``user`` read from the primary for ``REPLICA_PIN_WINDOW`` seconds."""
+    value = TimestampSigner(salt=PIN_SALT).sign(str(user.pk))
+    response.set_cookie(
+        PIN_COOKIE, value, max_age=math.ceil(pin_window()),
+        secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite="Lax",
+    )
+    response[PIN_HEADER] = value
+
+
+class ReplicaRouter:
+    """
+    Sends the reads made ``reading_from`` a replica to it, unless they are
+    part of a transaction, and every other query to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = current_replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Not None, which would send the reads of objects loaded from a replica back to it
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in replicas() else None
+
+
+class ReplicaReadsMixin:
+    """
+    Runs the actions of safe methods on a replica, except ``primary_actions``
+    and the requests of pinned users, and pins the users whose requests to
+    unsafe methods succeed (see the module).
+    """
+
+    primary_actions = ()
+
+    def reads_from_replica(self, request):
+        return (
+            bool(replicas())
+            and request.method in SAFE_METHODS
+            and getattr(self, "action", None) not in self.primary_actions
+            and not is_pinned(request)
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # dispatch looks the handler up after initial, the wrapped one is called
+        method = request.method.lower()
+        handler = getattr(self, method, None)
+        if handler is not None and self.reads_from_replica(request):
+            setattr(self, method, reading_from(random.choice(replicas()))(handler))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if replicas() and request.method not in SAFE_METHODS and request.user.is_authenticated \
+                and response.status_code < 400:
+            pin(response, request.user)
+        return response
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.http import quote_etag
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.renderers import OpenAPIRenderer, SwaggerJSONRenderer, SwaggerYAMLRenderer
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CODECS = {"json": OpenAPICodecJson, "yaml": OpenAPICodecYaml}
+SCHEMA_CONTENT_TYPES = {"json": "application/json; charset=utf-8", "yaml": "application/yaml; charset=utf-8"}
+SCHEMA_MANIFEST = "openapi.manifest.json"
+# Hashed schema files never change, clients may keep them for a year
+SCHEMA_FILE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def schema_root():
+    return Path(getattr(settings, "OPENAPI_SCHEMA_ROOT", settings.ROOT_DIR / "openapi"))
+
+
+@dataclass(frozen=True)
+class SchemaDocuments:
+    digest: str
+    documents: dict
+
+    def filename(self, extension):
+        return f"openapi.{self.digest}.{extension}"
+
+
+def render_schema(view_class):
+    """
+    Generates the public schema of ``view_class`` (a drf_yasg schema view) as
+    JSON and YAML. The digest is taken from the JSON document.
+    """
+    generator = view_class.generator_class(view_class.info, "", None, None, None)
+    schema = generator.get_schema(request=None, public=True)
+    documents = {extension: codec(validators=[]).encode(schema) for extension, codec in SCHEMA_CODECS.items()}
+    return SchemaDocuments(hashlib.sha256(documents["json"]).hexdigest()[:16], documents)
+
+
+def write_schema(schema, root):
+    """
+    Writes the hashed schema files and then the manifest naming them, each
+    through a rename so that readers never see a partial file. Files of
+    previous builds are kept for clients still holding their URLs.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    files = {extension: schema.filename(extension) for extension in schema.documents}
+    manifest = json.dumps({"digest": schema.digest, "files": files}, indent=2).encode()
+    for name, content in [*((files[ext], doc) for ext, doc in schema.documents.items()), (SCHEMA_MANIFEST, manifest)]:
+        path = root / name
+        temporary = path.with_suffix(path.suffix + ".tmp")
+        temporary.write_bytes(content)
+        os.replace(temporary, path)
+    return [root / name for name in (*files.values(), SCHEMA_MANIFEST)]
+
+
+def read_schema(root):
+    manifest = json.loads((root / SCHEMA_MANIFEST).read_bytes())
+    return SchemaDocuments(
+        manifest["digest"],
+        {extension: (root / name).read_bytes() for extension, name in manifest["files"].items()}
+    )
+
+
+@lru_cache(maxsize=None)
+def schema_documents(view_class):
+    """
+    The schema built by ``build_openapi_schema``, or else, when it has not
+    been built, the schema generated once per process.
+    """
+    try:
+        return read_schema(schema_root())
+    except FileNotFoundError:
+        logger.info(f"{__name__}: No pre-built schema in {schema_root()}, generating it")
+        return render_schema(view_class)
+
+
+class PrebuiltSchemaMixin:
+    """
+    Serves the schema of a drf_yasg schema view from ``schema_documents``
+    instead of introspecting the API on every request.
+
+    Schema requests are redirected to ``openapi.<digest>.<json|yaml>``
+    (``as_file_view``), which is cached by clients for good: a new schema
+    gets a new digest. The Swagger UI and ReDoc pages load the schema through
+    the same redirect.
+    """
+
+    info = None
+    file_url_name = "schema-file"
+
+    def get(self, request, version="", format=None):
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, (OpenAPIRenderer, SwaggerJSONRenderer, SwaggerYAMLRenderer)):
+            return super().get(request, version, format)
+
+        extension = "yaml" if isinstance(renderer, SwaggerYAMLRenderer) else "json"
+        schema = schema_documents(type(self))
+        response = HttpResponseRedirect(
+            reverse(self.file_url_name, kwargs={"digest": schema.digest, "extension": extension})
+        )
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    @classmethod
+    def as_file_view(cls):
+        def schema_file(request, digest, extension):
+            schema = schema_documents(cls)
+            if digest != schema.digest or extension not in schema.documents:
+                raise Http404
+            response = HttpResponse(schema.documents[extension], content_type=SCHEMA_CONTENT_TYPES[extension])
+            response["Cache-Control"] = SCHEMA_FILE_CACHE_CONTROL
+            response["ETag"] = quote_etag(schema.digest)
+            return response
+
+        return schema_file
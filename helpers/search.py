@@ -0,0 +1,100 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Collate, Lower, Upper
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+NAME_SEARCH_MAX_LIMIT = 50
+
+
+class NameSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=75, trim_whitespace=True, help_text=_("The text to look for"))
+    limit = serializers.IntegerField(
+        min_value=1, max_value=NAME_SEARCH_MAX_LIMIT, default=10, help_text=_("Maximum number of results")
+    )
+
+
+def fuzzy_search(queryset, query):
+    """
+    Filters ``queryset`` on names that contain ``query`` or look like it, best
+    matches first.
+
+    On Postgres, names are compared by trigram similarity (``%``), which
+    tolerates typos, and ranked by it. Both the similarity and the substring
+    match are computed on ``upper(name)`` so that a single ``gin_trgm_ops``
+    index on ``(user_id, upper(name))`` serves them, and ``SearchFilter``'s
+    ``icontains`` too. Elsewhere this is a plain substring match.
+    """
+    if connection.vendor != "postgresql":
+        return queryset.filter(name__icontains=query).order_by(Lower("name"), "pk")
+
+    query = query.upper()
+    name = Upper("name")
+    return queryset.annotate(
+        name_upper=name, similarity=TrigramSimilarity(name, query)
+    ).filter(
+        Q(name_upper__trigram_similar=query) | Q(name_upper__contains=query)
+    ).order_by("-similarity", "name_upper", "pk")
+
+
+def autocomplete(queryset, prefix):
+    """
+    Filters ``queryset`` on names starting with ``prefix``, case-insensitively,
+    in alphabetical order.
+
+    On Postgres, the prefix becomes a range on ``lower(name) COLLATE "C"``:
+    in byte order every name starting with ``abc`` sorts in ``['abc', 'abd')``,
+    so the ``(user_id, lower(name) COLLATE "C")`` index returns the first
+    matches in order without reading the others, however many the user has.
+    """
+    prefix = prefix.lower()
+    if connection.vendor != "postgresql":
+        return queryset.filter(name__istartswith=prefix).order_by(Lower("name"), "pk")
+
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return queryset.annotate(
+        name_key=Collate(Lower("name"), "C")
+    ).filter(name_key__gte=prefix, name_key__lt=upper_bound).order_by("name_key")
+
+
+class NameSearchMixin:
+    """
+    Adds ``search/`` (fuzzy, ranked) and ``autocomplete/`` (prefix) actions on
+    the ``name`` of the viewset's model, scoped to the requesting user.
+    """
+
+    def get_name_queryset(self):
+        """The rows of the user, without the annotations of ``get_queryset``."""
+        return self.queryset.model.objects.filter(user=self.request.user)
+
+    def get_name_search_query(self, request):
+        query = NameSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return query.validated_data["q"], query.validated_data["limit"]
+
+    @action(detail=False, methods=["get"], url_path="search")
+    def fuzzy_search(self, request, *args, **kwargs):
+        """
+        Search by Name
+
+        Returns up to `limit` (10 by default) records whose name contains `q` or
+        is close to it (typos included), best matches first.
+        """
+        query, limit = self.get_name_search_query(request)
+        results = fuzzy_search(self.get_queryset(), query)[:limit]
+        return Response(self.get_serializer(results, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request, *args, **kwargs):
+        """
+        Autocomplete a Name
+
+        Returns the id and name of up to `limit` (10 by default) records whose
+        name starts with `q`, case-insensitively, in alphabetical order.
+        """
+        query, limit = self.get_name_search_query(request)
+        results = autocomplete(self.get_name_queryset(), query)[:limit]
+        return Response(list(results.values("id", "name")))
@@ -0,0 +1,151 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.http import StreamingHttpResponse
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """
+    A streaming response that carries an async iterator next to the sync one.
+
+    Under WSGI the sync ``streaming_content`` is used as usual. Django 3.2's
+    ``ASGIHandler`` would iterate that same sync iterator on the event loop,
+    where ORM calls are not allowed, so ``StreamingASGIHandler`` consumes
+    ``async_streaming_content`` instead. The async iterator only borrows a
+    thread for each chunk it reads, so a slow download does not hold a worker
+    thread for its whole duration.
+    """
+
+    def __init__(self, streaming_content=(), async_streaming_content=None, *args, **kwargs):
+        super().__init__(streaming_content, *args, **kwargs)
+        self.async_streaming_content = async_streaming_content
+
+
+class RequestThreads:
+    """
+    The threads that run the sync code of requests (middleware, views,
+    rendering), at most ``ASGI_THREADS`` of them, each leased to one request
+    at a time. Requests beyond that wait on the event loop for a thread to be
+    returned, without holding one.
+
+    The threads are kept for the life of the worker, and with them their
+    database connections (``CONN_MAX_AGE`` applies as under WSGI).
+    """
+
+    def __init__(self):
+        self.idle = []
+        self.started = 0
+        self.waiting = deque()
+
+    async def lease(self):
+        if self.idle:
+            return self.idle.pop()
+        if self.started < getattr(settings, "ASGI_THREADS", 16):
+            self.started += 1
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix="asgi-request")
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiting.append(waiter)
+        return await waiter
+
+    def release(self, executor):
+        while self.waiting:
+            waiter = self.waiting.popleft()
+            # Skips the requests that went away while waiting
+            if not waiter.done():
+                waiter.set_result(executor)
+                return
+        self.idle.append(executor)
+
+
+request_threads = RequestThreads()
+
+
+class RequestThreadContext:
+    """
+    Like asgiref's ``ThreadSensitiveContext``: thread sensitive
+    ``sync_to_async`` calls made within it run on a thread of their own, here
+    one leased from ``request_threads`` rather than a new one.
+
+    Re-entrant, only the outermost context leases a thread. ``release`` gives
+    it back early, later thread sensitive calls then run on asgiref's thread.
+    """
+
+    def __init__(self, threads=request_threads):
+        self.threads = threads
+        self.token = None
+
+    async def __aenter__(self):
+        if SyncToAsync.thread_sensitive_context.get(None) is None:
+            SyncToAsync.context_to_thread_executor[self] = await self.threads.lease()
+            self.token = SyncToAsync.thread_sensitive_context.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def release(self):
+        if self.token is None:
+            return
+        SyncToAsync.thread_sensitive_context.reset(self.token)
+        self.token = None
+        self.threads.release(SyncToAsync.context_to_thread_executor.pop(self))
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGIHandler that streams ``AsyncStreamingHttpResponse`` bodies natively,
+    and serves requests concurrently.
+
+    Django 3.2's ``ASGIHandler`` runs the sync code of every request on the
+    one thread asgiref keeps for thread sensitive calls, so a worker serves
+    one request at a time whatever its thread pool. Here each request leases
+    a thread of its own from ``threads`` until its response is sent, as
+    Django 4.0 does with a new thread per request. The body of an
+    ``AsyncStreamingHttpResponse`` is sent after the thread is returned.
+    """
+
+    threads = request_threads
+
+    async def __call__(self, scope, receive, send):
+        async with RequestThreadContext(self.threads):
+            await super().__call__(scope, receive, send)
+
+    async def send_response(self, response, send):
+        async_streaming_content = getattr(response, "async_streaming_content", None)
+        if async_streaming_content is None:
+            return await super().send_response(response, send)
+
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": self.response_headers(response),
+        })
+        # The rest of the body is read on pool threads, chunk by chunk: finish
+        # the request, which gives its database connections back, and return
+        # its thread for the duration of the download.
+        await sync_to_async(response.close, thread_sensitive=True)()
+        context = SyncToAsync.thread_sensitive_context.get(None)
+        if isinstance(context, RequestThreadContext):
+            context.release()
+        async for part in async_streaming_content:
+            for chunk, _ in self.chunk_bytes(response.make_bytes(part)):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body"})
+
+    @staticmethod
+    def response_headers(response):
+        # Same header encoding as ASGIHandler.send_response
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b"Set-Cookie", cookie.output(header="").encode("ascii").strip()))
+        return headers
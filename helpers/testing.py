@@ -0,0 +1,187 @@
+import json
+import os
+import re
+import unittest
+from types import SimpleNamespace
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+# Statements that only delimit transactions; they are not what a query budget is about
+TRANSACTION_CONTROL = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT", "BEGIN", "COMMIT", "ROLLBACK")
+# Tables with at least this many rows must not be read with a sequential scan
+LARGE_TABLE_ROWS = int(os.environ.get("QUERY_PLAN_LARGE_TABLE_ROWS", 10000))
+# When set, the query counts of every action are written to this JSON file
+QUERY_BUDGET_REPORT = os.environ.get("QUERY_BUDGET_REPORT")
+# The queries each event published by a write adds: the NOTIFY of helpers.events on Postgres
+NOTIFY = 1 if connection.vendor == "postgresql" else 0
+# The query each write of budget items adds: the advisory lock of budget.rollups on Postgres
+ROLLUP_LOCK = 1 if connection.vendor == "postgresql" else 0
+
+_report = {}
+
+
+class QueryCounter(CaptureQueriesContext):
+    """Captures the queries of a block, leaving out transaction control statements."""
+
+    @property
+    def statements(self):
+        return [query["sql"] for query in self.captured_queries if not query["sql"].startswith(TRANSACTION_CONTROL)]
+
+    def __len__(self):
+        return len(self.statements)
+
+
+def record_query_counts(action, counts):
+    _report[action] = counts
+    if QUERY_BUDGET_REPORT:
+        with open(QUERY_BUDGET_REPORT, "w") as report:
+            json.dump(_report, report, indent=2, sort_keys=True)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Runs API actions against seeded datasets of several sizes and fails when
+    an action needs more queries than its budget, or when its query count
+    grows with the size of the dataset (an N+1).
+
+    Subclasses fill ``query_budgets`` (action name to maximum number of
+    queries) and set ``seed``, a method that creates a user and ``size`` rows
+    of data and returns them as a namespace.
+    """
+
+    query_budgets = {}
+    dataset_sizes = (1, 10, 50)
+    seed = None
+
+    @classmethod
+    def setUpClass(cls):
+        if not callable(cls.seed):
+            raise ImproperlyConfigured(f"{cls.__name__} needs a seed(size) method")
+        super().setUpClass()
+
+    def assertQueryBudget(self, action, request):
+        """
+        ``request(client, dataset)`` performs the action and returns the response;
+        it is called once per dataset size, on a fresh dataset.
+        """
+        budget = self.query_budgets[action]
+        counts = {}
+        for size in self.dataset_sizes:
+            with self.subTest(action=action, size=size):
+                dataset = SimpleNamespace(size=size, **vars(self.seed(size)))
+                client = APIClient()
+                client.force_authenticate(dataset.user)
+                with QueryCounter(connection) as queries:
+                    response = request(client, dataset)
+                    if getattr(response, "streaming", False):
+                        b"".join(response.streaming_content)
+
+                self.assertLess(response.status_code, 400, getattr(response, "data", None))
+                counts[size] = len(queries)
+                self.assertLessEqual(
+                    len(queries), budget,
+                    f"{action} ran {len(queries)} queries on {size} rows, budget is {budget}:\n"
+                    + "\n".join(queries.statements)
+                )
+
+        record_query_counts(action, counts)
+        self.assertEqual(len(set(counts.values())), 1, f"{action}: query count grows with the dataset {counts}")
+
+
+class MigrationTestCase(TransactionTestCase):
+    """
+    Runs migrations against data written before them: the database is
+    migrated back to ``migrate_from``, ``setUpBeforeMigration(apps)`` creates
+    rows with the models of that state, then the database is migrated to
+    ``migrate_to``, whose models are ``self.apps``.
+
+    Both are lists of ``(app_label, migration_name)``. The database is
+    migrated forward again after each test.
+    """
+
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        super().setUp()
+        self.setUpBeforeMigration(self.migrate(self.migrate_from))
+        self.apps = self.migrate(self.migrate_to)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def setUpBeforeMigration(self, apps):
+        pass
+
+    @staticmethod
+    def migrate(targets):
+        """Migrates to ``targets``, returns the models of the database then (of every app)."""
+        MigrationExecutor(connection).migrate(targets)
+        loader = MigrationLoader(connection)
+        return loader.project_state(tuple(loader.applied_migrations)).apps
+
+
+def query_plan(queryset):
+    """Returns the EXPLAIN plan of ``queryset`` as Postgres' JSON plan tree."""
+    # Not QuerySet.explain, which renders the decoded JSON with str()
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        return cursor.fetchone()[0][0]["Plan"]
+
+
+def plan_nodes(plan):
+    """Yields ``plan`` and every node below it."""
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+def sequential_scans(plan):
+    """Returns the relations read with a sequential scan anywhere in ``plan``."""
+    return [node["Relation Name"] for node in plan_nodes(plan) if node["Node Type"] == "Seq Scan"]
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Query plans are checked against Postgres only")
+class QueryPlanTestCase(TestCase):
+    """
+    Checks the EXPLAIN plans of key queries against a large seeded dataset.
+
+    Subclasses seed the data in ``setUpTestData``; the tables are analyzed
+    afterwards so that the planner sees their real size.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+            cls.large_tables = {name for name, rows in cursor.fetchall() if rows >= LARGE_TABLE_ROWS}
+
+    def assertNoSequentialScan(self, queryset):
+        plan = query_plan(queryset)
+        scanned = [table for table in sequential_scans(plan) if table in self.large_tables]
+        self.assertFalse(
+            scanned, f"Sequential scan on {', '.join(scanned)}:\n{queryset.explain()}\n{queryset.query}"
+        )
+
+    def assertIndexCondition(self, queryset, *columns):
+        """
+        Fails unless an index scan of ``queryset`` has all of ``columns`` in its
+        index condition, i.e. bounds its range on them rather than filtering the
+        rows it reads.
+        """
+        conditions = [node.get("Index Cond", "") for node in plan_nodes(query_plan(queryset))]
+        self.assertTrue(
+            any(all(re.search(rf"\b{column}\b", condition) for column in columns) for condition in conditions),
+            f"No index condition on {', '.join(columns)}:\n{queryset.explain()}\n{queryset.query}"
+        )
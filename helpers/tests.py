@@ -1,3 +1,603 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import socket
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import psycopg2
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from asgiref.sync import sync_to_async
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from budget.api.views import BudgetItemViewSet
+from budget.models import BudgetItem
+from config.sse import SSE_PATH, sse_application
+from config.urls import SchemaView
+from config.websocket import GOING_AWAY, TRY_AGAIN_LATER, UNAUTHORIZED, websocket_application
+from family_budget.users.authentication import ClaimsRefreshToken
+from helpers.db.pool import ConnectionPool, PoolTimeout, pools
+from helpers.events import HEARTBEAT, RESYNC, PostgresListener, Subscriber, hub
+from helpers.models import ThrottleBucket
+from helpers.replicas import PIN_COOKIE, PIN_HEADER, ReplicaRouter, reading_from
+from helpers.schema import SCHEMA_FILE_CACHE_CONTROL, schema_documents
+from helpers.streaming import RequestThreadContext, RequestThreads, StreamingASGIHandler
+from helpers.throttling import ScopedGCRAThrottle, UserGCRAThrottle, acquire, prune_buckets
+
+
+class PrebuiltSchemaTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        settings = override_settings(OPENAPI_SCHEMA_ROOT=str(self.root))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        schema_documents.cache_clear()
+        self.addCleanup(schema_documents.cache_clear)
+
+    def test_schema_is_served_from_the_built_files(self):
+        call_command("build_openapi_schema", stdout=io.StringIO())
+        built = {path.name for path in self.root.iterdir()}
+
+        response = self.client.get("/documentation.json")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertIn(response.url.rsplit("/", 1)[-1], built)
+
+        response = self.client.get(response.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], SCHEMA_FILE_CACHE_CONTROL)
+        self.assertEqual(response.content, (self.root / response.wsgi_request.path.rsplit("/", 1)[-1]).read_bytes())
+        self.assertIn("/budget-items/", response.json()["paths"])
+
+    def test_yaml_and_ui_schema(self):
+        response = self.client.get("/documentation.yaml")
+        self.assertTrue(response.url.endswith(".yaml"))
+        self.assertTrue(self.client.get(response.url)["Content-Type"].startswith("application/yaml"))
+
+        response = self.client.get("/documentation/?format=openapi")
+        self.assertTrue(response.url.endswith(".json"))
+
+    def test_schema_is_generated_once_without_files(self):
+        first = self.client.get("/documentation.json").url
+        self.assertEqual(self.client.get("/documentation.json").url, first)
+        self.assertEqual(schema_documents.cache_info().misses, 1)
+        self.assertEqual(schema_documents(SchemaView).digest, first.rsplit(".", 2)[-2])
+
+    def test_unknown_digest(self):
+        self.assertEqual(self.client.get("/documentation/openapi.0123456789abcdef.json").status_code, 404)
+
+
+class GCRAThrottleTestCase(TestCase):
+    rates = {"user": "3/min", "imports": "1/min"}
+
+    def test_bucket_allows_a_burst_then_one_request_per_interval(self):
+        # 3/min: bursts of 3, then one every 20 seconds
+        decisions = [acquire("bucket", now, 20, 60)[0] for now in (1000, 1000, 1000, 1000, 1019, 1020, 1021)]
+        self.assertEqual(decisions, [True, True, True, False, False, True, False])
+        self.assertEqual(ThrottleBucket.objects.get(key="bucket").tat, 1080)
+
+        self.assertEqual(prune_buckets(now=1079), 0)
+        self.assertEqual(prune_buckets(now=1080), 1)
+
+    def test_api_requests_are_throttled_per_user(self):
+        user = get_user_model().objects.create(username="throttled", email="throttled@domain.com")
+        other = get_user_model().objects.create(username="other", email="other@domain.com")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with mock.patch.object(BudgetItemViewSet, "throttle_classes", [UserGCRAThrottle]), \
+                mock.patch.object(UserGCRAThrottle, "THROTTLE_RATES", self.rates):
+            statuses = [client.get("/api/v1.0/budget-items/").status_code for i in range(4)]
+            self.assertEqual(statuses, [200, 200, 200, 429])
+            self.assertEqual(client.get("/api/v1.0/budget-items/")["Retry-After"], "20")
+
+            client.force_authenticate(other)
+            self.assertEqual(client.get("/api/v1.0/budget-items/").status_code, 200)
+
+    def test_scoped_rates(self):
+        user = get_user_model().objects.create(username="scoped", email="scoped@domain.com")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with mock.patch.object(BudgetItemViewSet, "throttle_classes", [ScopedGCRAThrottle]), \
+                mock.patch.object(BudgetItemViewSet, "throttle_scope", "imports", create=True), \
+                mock.patch.object(ScopedGCRAThrottle, "THROTTLE_RATES", self.rates):
+            statuses = [client.get("/api/v1.0/budget-items/").status_code for i in range(2)]
+        self.assertEqual(statuses, [200, 429])
+        self.assertTrue(ThrottleBucket.objects.filter(key__startswith="throttle_imports_").exists())
+
+
+@override_settings(LIVE_TOTALS_DELAY=0)
+class LiveEventsTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="live", email="live@domain.com")
+        self.token = str(ClaimsRefreshToken.for_user(self.user).access_token)
+
+    @staticmethod
+    async def connect(query_string=b"", headers=()):
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        scope = {"type": "websocket", "query_string": query_string, "headers": list(headers)}
+        application = asyncio.create_task(websocket_application(scope, inbox.get, outbox.put))
+        await inbox.put({"type": "websocket.connect"})
+        return application, inbox, outbox
+
+    @staticmethod
+    async def next_message(outbox):
+        return await asyncio.wait_for(outbox.get(), timeout=5)
+
+    def test_changes_and_totals_are_pushed(self):
+        async def scenario():
+            application, inbox, outbox = await self.connect(
+                headers=[(b"authorization", f"Bearer {self.token}".encode())]
+            )
+            self.assertEqual(await self.next_message(outbox), {"type": "websocket.accept"})
+
+            item = await sync_to_async(BudgetItem.create)(
+                user=self.user, name="Rent", amount=Decimal("800.00"), quantity=1
+            )
+            created = json.loads((await self.next_message(outbox))["text"])
+            totals = json.loads((await self.next_message(outbox))["text"])
+
+            await inbox.put({"type": "websocket.receive", "text": "ping"})
+            pong = await self.next_message(outbox)
+            await inbox.put({"type": "websocket.disconnect"})
+            await application
+            return item, created, totals, pong
+
+        item, created, totals, pong = asyncio.run(scenario())
+        self.assertEqual(created, {"type": "budget_item.created", "id": str(item.pk)})
+        self.assertEqual(totals, {"type": "totals", "income": "0.00", "expenses": "800.00"})
+        self.assertEqual(pong["text"], "pong!")
+
+    def test_connections_without_a_valid_token_are_refused(self):
+        async def scenario(query_string):
+            application, inbox, outbox = await self.connect(query_string)
+            message = await self.next_message(outbox)
+            await inbox.put({"type": "websocket.disconnect"})
+            await application
+            return message
+
+        for query_string in (b"", b"token=invalid"):
+            self.assertEqual(asyncio.run(scenario(query_string)), {"type": "websocket.close", "code": UNAUTHORIZED})
+        self.assertEqual(asyncio.run(scenario(f"token={self.token}".encode()))["type"], "websocket.accept")
+
+    @override_settings(LIVE_MAX_CONNECTIONS=1)
+    def test_connections_per_worker_are_limited(self):
+        async def scenario():
+            first = await self.connect(f"token={self.token}".encode())
+            second = await self.connect(f"token={self.token}".encode())
+            messages = [await self.next_message(first[2]), await self.next_message(second[2])]
+            await second[0]
+            metrics = hub.metrics()
+            await first[1].put({"type": "websocket.disconnect"})
+            await first[0]
+            return messages, metrics, hub.metrics()
+
+        messages, metrics, closed_metrics = asyncio.run(scenario())
+        self.assertEqual(messages, [{"type": "websocket.accept"}, {"type": "websocket.close", "code": TRY_AGAIN_LATER}])
+        self.assertEqual((metrics["connections"], metrics["rejected"]), (1, 1))
+        self.assertEqual((closed_metrics["connections"], closed_metrics["closed"]), (0, 1))
+
+    def test_heartbeats_and_idle_eviction(self):
+        async def scenario():
+            application, inbox, outbox = await self.connect(f"token={self.token}".encode())
+            await self.next_message(outbox)
+            hub.heartbeat()
+            heartbeat = await self.next_message(outbox)
+            await inbox.put({"type": "websocket.receive", "text": "pong"})
+            await asyncio.sleep(0)
+            with override_settings(LIVE_IDLE_TIMEOUT=-1):
+                hub.heartbeat()
+            closed = await self.next_message(outbox)
+            metrics = hub.metrics()
+            await inbox.put({"type": "websocket.disconnect"})
+            await application
+            return heartbeat, closed, metrics
+
+        heartbeat, closed, metrics = asyncio.run(scenario())
+        self.assertEqual(heartbeat["text"], HEARTBEAT)
+        self.assertEqual(closed, {"type": "websocket.close", "code": GOING_AWAY})
+        self.assertEqual((metrics["connections"], metrics["evicted"]), (0, 1))
+
+    def test_metrics_are_for_admins(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get("/api/v1.0/live/metrics/").status_code, 403)
+
+        client.force_authenticate(
+            get_user_model().objects.create(username="admin", email="admin@domain.com", is_staff=True)
+        )
+        response = client.get("/api/v1.0/live/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("connections", response.data)
+
+    def test_lost_listener_reconnects_and_connections_resync(self):
+        # Stand-ins for the sockets of the connections, the second half of a pair makes the first readable
+        sockets = [socket.socketpair() for i in range(2)]
+        for pair in sockets:
+            self.addCleanup(pair[0].close)
+            self.addCleanup(pair[1].close)
+        lost = mock.Mock(notifies=[], **{
+            "fileno.return_value": sockets[0][0].fileno(),
+            "poll.side_effect": psycopg2.OperationalError("server closed the connection unexpectedly"),
+        })
+        back = mock.Mock(notifies=[], **{"fileno.return_value": sockets[1][0].fileno()})
+
+        async def scenario():
+            subscriber = Subscriber(self.user.pk)
+            await hub.subscribe(subscriber)
+            listener = PostgresListener(hub.dispatch, hub.resync)
+            listener.connect = mock.Mock(side_effect=[lost, back])
+            await listener.start(asyncio.get_running_loop())
+            sockets[0][1].send(b"\0")
+            message = await asyncio.wait_for(subscriber.get(), timeout=5)
+            connection = listener.connection
+            listener.stop()
+            return message, connection
+
+        with mock.patch("helpers.events.RECONNECT_INITIAL_DELAY", 0):
+            message, connection = asyncio.run(scenario())
+        self.assertEqual(message, RESYNC)
+        self.assertIs(connection, back)
+        lost.close.assert_called_once()
+        self.assertEqual(hub.metrics()["reconnects"], 1)
+
+    def test_slow_connections_are_told_to_resync(self):
+        subscriber = Subscriber(self.user.pk, maxsize=2)
+        for i in range(3):
+            subscriber.put(str(i))
+
+        self.assertEqual(subscriber.queue.qsize(), 1)
+        self.assertEqual(subscriber.queue.get_nowait(), RESYNC)
+        self.assertEqual(subscriber.dropped, 2)
+
+
+@override_settings(LIVE_TOTALS_DELAY=0, LIVE_SSE_INTERVAL=0.5)
+class ServerSentEventsTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="sse", email="sse@domain.com")
+        self.token = str(ClaimsRefreshToken.for_user(self.user).access_token)
+
+    @staticmethod
+    async def stream(query_string):
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        scope = {"type": "http", "method": "GET", "path": SSE_PATH, "query_string": query_string, "headers": []}
+        application = asyncio.create_task(sse_application(scope, inbox.get, outbox.put))
+        return application, inbox, outbox
+
+    @staticmethod
+    def events(body):
+        return [
+            (lines[0].split(": ", 1)[1], json.loads(lines[1].split(": ", 1)[1]))
+            for lines in (chunk.split("\n") for chunk in body.decode().split("\n\n") if chunk)
+        ]
+
+    def test_bursts_of_changes_are_coalesced(self):
+        async def scenario():
+            application, inbox, outbox = await self.stream(f"token={self.token}".encode())
+            start = await asyncio.wait_for(outbox.get(), timeout=5)
+            bodies = [(await asyncio.wait_for(outbox.get(), timeout=5))["body"]]
+
+            for name in ("Rent", "Power", "Water"):
+                await sync_to_async(BudgetItem.create)(user=self.user, name=name, amount=Decimal("10.00"), quantity=1)
+            while b"30.00" not in bodies[-1]:
+                bodies.append((await asyncio.wait_for(outbox.get(), timeout=5))["body"])
+
+            await inbox.put({"type": "http.disconnect"})
+            await application
+            return start, bodies
+
+        start, bodies = asyncio.run(scenario())
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), start["headers"])
+        events = [event for body in bodies for event in self.events(body)]
+        self.assertEqual(events[0], ("totals", {"income": "0.00", "expenses": "0.00"}))
+        changes = [data["changes"] for name, data in events if name == "changes"]
+        self.assertEqual(len(changes), 1)
+        self.assertEqual([change["type"] for change in changes[0]], ["budget_item.created"] * 3)
+        self.assertEqual(events[-1], ("totals", {"income": "0.00", "expenses": "30.00"}))
+
+    def test_streams_require_a_token(self):
+        async def scenario():
+            application, inbox, outbox = await self.stream(b"")
+            await application
+            return await outbox.get()
+
+        self.assertEqual(asyncio.run(scenario())["status"], 401)
+
+
+class RequestThreadsTestCase(TransactionTestCase):
+    @override_settings(ASGI_THREADS=2)
+    def test_requests_lease_threads_of_their_own(self):
+        threads, running, peak = RequestThreads(), [0], [0]
+
+        def work():
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            running[0] -= 1
+            return threading.current_thread()
+
+        async def request():
+            async with RequestThreadContext(threads):
+                # Nested contexts keep the thread of the outermost one
+                async with RequestThreadContext(threads):
+                    first = await sync_to_async(work)()
+                return first, await sync_to_async(work)()
+
+        async def scenario():
+            return await asyncio.gather(*(request() for _ in range(5)))
+
+        results = asyncio.run(scenario())
+        self.assertTrue(all(first is second for first, second in results))
+        self.assertEqual(len({first for first, _ in results}), 2)
+        self.assertEqual(peak[0], 2)
+        self.assertEqual((threads.started, len(threads.idle), len(threads.waiting)), (2, 2, 0))
+
+    def test_api_requests_run_on_leased_threads(self):
+        user = get_user_model().objects.create(username="asgi", email="asgi@domain.com")
+        BudgetItem.create(user=user, name="Rent", amount=Decimal("10.00"), quantity=1)
+        token = str(ClaimsRefreshToken.for_user(user).access_token)
+        handler, names = StreamingASGIHandler(), []
+        list_view = BudgetItemViewSet.list
+
+        def list_items(view, request, *args, **kwargs):
+            names.append(threading.current_thread().name)
+            return list_view(view, request, *args, **kwargs)
+
+        async def scenario():
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            await self.serve(handler, "/api/v1.0/budget-items/", token, send)
+            return sent
+
+        with mock.patch.object(BudgetItemViewSet, "list", list_items):
+            sent = asyncio.run(scenario())
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn(b"Rent", b"".join(message.get("body", b"") for message in sent[1:]))
+        self.assertTrue(names[0].startswith("asgi-request"))
+
+    @override_settings(ASGI_THREADS=1)
+    def test_downloads_do_not_hold_a_thread(self):
+        user = get_user_model().objects.create(username="asgi", email="asgi@domain.com")
+        BudgetItem.create(user=user, name="Rent", amount=Decimal("10.00"), quantity=1)
+        token = str(ClaimsRefreshToken.for_user(user).access_token)
+        handler = StreamingASGIHandler()
+        handler.threads = RequestThreads()
+
+        async def scenario():
+            stalled, resume, sent = asyncio.Event(), asyncio.Event(), []
+
+            async def stall(message):
+                # A client that stops reading the export
+                if message["type"] == "http.response.body":
+                    stalled.set()
+                    await resume.wait()
+
+            async def send(message):
+                sent.append(message)
+
+            export = asyncio.create_task(self.serve(handler, "/api/v1.0/budget-items/export/", token, stall))
+            await stalled.wait()
+            await asyncio.wait_for(self.serve(handler, "/api/v1.0/budget-items/", token, send), 10)
+            resume.set()
+            await export
+            return sent
+
+        self.assertEqual(asyncio.run(scenario())[0]["status"], 200)
+
+    @staticmethod
+    async def serve(handler, path, token, send):
+        messages = asyncio.Queue()
+        scope = {
+            "type": "http", "method": "GET", "path": path, "query_string": b"",
+            "headers": [(b"authorization", f"Bearer {token}".encode()), (b"host", b"testserver")],
+        }
+        await messages.put({"type": "http.request", "body": b""})
+        await handler(scope, messages.get, send)
+
+
+class ConnectionPoolTestCase(TestCase):
+    def setUp(self):
+        self.connect = mock.Mock(side_effect=lambda: mock.Mock(name="connection"))
+        self.healthy = mock.Mock(return_value=True)
+
+    def pool(self, **options):
+        return ConnectionPool(check=self.healthy, reset=lambda connection: True, **options)
+
+    def test_size_is_bounded(self):
+        pool = self.pool(max_size=2, min_size=0, timeout=0.05)
+        first, second = pool.acquire(self.connect), pool.acquire(self.connect)
+        self.assertIsNot(first, second)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+
+        pool.release(first)
+        self.assertIs(pool.acquire(self.connect), first)
+        self.assertEqual(self.connect.call_count, 2)
+        metrics = pool.metrics()
+        self.assertEqual((metrics["size"], metrics["in_use"], metrics["utilisation"]), (2, 2, 1.0))
+        self.assertEqual((metrics["acquired"], metrics["timeouts"]), (3, 1))
+
+    def test_waiting_threads_get_returned_connections(self):
+        pool = self.pool(max_size=1, min_size=0, timeout=5)
+        connection = pool.acquire(self.connect)
+        leased = []
+        waiter = threading.Thread(target=lambda: leased.append(pool.acquire(self.connect)))
+        waiter.start()
+        while not pool.waiting:
+            time.sleep(0.001)
+        time.sleep(0.02)
+        pool.release(connection)
+        waiter.join()
+        self.assertEqual(leased, [connection])
+        self.assertGreaterEqual(pool.metrics()["wait_ms"]["max"], 20)
+
+    def test_connections_are_opened_ahead_of_requests(self):
+        pool = self.pool(max_size=4, min_size=2)
+        pool.maintain(self.connect)
+        self.assertEqual(self.connect.call_count, 2)
+        pool.acquire(self.connect), pool.acquire(self.connect)
+        self.assertEqual(self.connect.call_count, 2)
+        self.assertEqual(pool.metrics()["opened"], 2)
+
+    def test_idle_connections_are_checked_and_replaced(self):
+        pool = self.pool(max_size=4, min_size=1, check_interval=0)
+        pool.maintain(self.connect)
+        stale = pool.idle[0][0]
+        self.healthy.return_value = False
+        pool.maintain(self.connect)
+
+        stale.close.assert_called_once_with()
+        self.assertIsNot(pool.idle[0][0], stale)
+        metrics = pool.metrics()
+        self.assertEqual((metrics["size"], metrics["failed_checks"], metrics["closed"]), (1, 1, 1))
+
+    def test_unusable_and_old_connections_are_closed_on_release(self):
+        pool = ConnectionPool(check=self.healthy, reset=lambda connection: False, min_size=0)
+        connection = pool.acquire(self.connect)
+        pool.release(connection)
+        connection.close.assert_called_once_with()
+
+        pool = self.pool(min_size=0, max_lifetime=0)
+        connection = pool.acquire(self.connect)
+        pool.release(connection)
+        connection.close.assert_called_once_with()
+        self.assertEqual((pool.size, len(pool.idle)), (0, 0))
+
+    def test_metrics_are_for_admins(self):
+        admin = get_user_model().objects.create(username="pool", email="pool@domain.com", is_staff=True)
+        client = APIClient()
+        self.assertEqual(client.get("/api/v1.0/db/metrics/").status_code, 401)
+        client.force_authenticate(admin)
+        with mock.patch.dict(pools, {"default": self.pool()}, clear=True):
+            response = client.get("/api/v1.0/db/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["pools"]["default"]["max_size"], 10)
+
+
+class TransactionPolicyTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="policy", email="policy@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reads_run_in_autocommit_and_writes_in_a_transaction(self):
+        in_atomic_block = {}
+        list_view, perform_create = BudgetItemViewSet.list, BudgetItemViewSet.perform_create
+
+        def list_items(view, request, *args, **kwargs):
+            in_atomic_block["list"] = transaction.get_connection().in_atomic_block
+            return list_view(view, request, *args, **kwargs)
+
+        def create_item(view, serializer):
+            in_atomic_block["create"] = transaction.get_connection().in_atomic_block
+            return perform_create(view, serializer)
+
+        with mock.patch.object(BudgetItemViewSet, "list", list_items), \
+                mock.patch.object(BudgetItemViewSet, "perform_create", create_item):
+            self.client.get("/api/v1.0/budget-items/")
+            self.client.post("/api/v1.0/budget-items/", {"name": "Rent", "amount": "10.00", "quantity": 1})
+        self.assertEqual(in_atomic_block, {"list": False, "create": True})
+
+    def test_failed_writes_are_rolled_back(self):
+        perform_create = BudgetItemViewSet.perform_create
+
+        def create_then_fail(view, serializer):
+            perform_create(view, serializer)
+            raise ValidationError("Rejected after the insert")
+
+        with mock.patch.object(BudgetItemViewSet, "perform_create", create_then_fail):
+            response = self.client.post("/api/v1.0/budget-items/", {"name": "Rent", "amount": "10.00", "quantity": 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BudgetItem.objects.exists())
+        self.user.refresh_from_db()
+        self.assertEqual(str(self.user.expenses), "0.00")
+
+    def test_saves_commit_with_their_receivers(self):
+        with mock.patch("family_budget.users.receivers.record_totals_deltas", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                BudgetItem.create(user=self.user, name="Rent", amount=Decimal("10.00"), quantity=1)
+        self.assertFalse(BudgetItem.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaReadsTestCase(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="replica", email="replica@domain.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, path):
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response, len(replica_queries)
+
+    def test_users_read_their_writes_from_the_primary(self):
+        self.assertGreater(self.get("/api/v1.0/budget-items/")[1], 0)
+
+        response = self.client.post("/api/v1.0/budget-items/", {"name": "Rent", "amount": "10.00", "quantity": 1})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response, replica_queries = self.get("/api/v1.0/budget-items/")
+        self.assertEqual(replica_queries, 0)
+        self.assertEqual(len(response.data["results"]), 1)
+        response, replica_queries = self.get("/api/v1.0/users/me/")
+        self.assertEqual((replica_queries, response.data["expenses"]), (0, "10.00"))
+
+        with override_settings(REPLICA_PIN_WINDOW=0):
+            response, replica_queries = self.get("/api/v1.0/budget-items/")
+        self.assertGreater(replica_queries, 0)
+        self.assertEqual(len(response.data["results"]), 1)
+        # Other users are not pinned by the cookie
+        self.client.force_authenticate(get_user_model().objects.create(username="other", email="other@domain.com"))
+        self.assertGreater(self.get("/api/v1.0/budget-items/")[1], 0)
+
+    def test_clients_without_cookies_send_the_pin_header_back(self):
+        response = self.client.post("/api/v1.0/budget-items/", {"name": "Rent", "amount": "10.00", "quantity": 1})
+        pin = response[PIN_HEADER]
+        self.client.cookies.clear()
+
+        self.assertGreater(self.get("/api/v1.0/budget-items/")[1], 0)
+        self.client.credentials(HTTP_X_PRIMARY_PIN=pin[:-1])
+        self.assertGreater(self.get("/api/v1.0/budget-items/")[1], 0)
+        self.client.credentials(HTTP_X_PRIMARY_PIN=pin)
+        self.assertEqual(self.get("/api/v1.0/budget-items/")[1], 0)
+
+    def test_writes_and_transactions_use_the_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(BudgetItem), "default")
+        with reading_from("replica"):
+            self.assertEqual(router.db_for_read(BudgetItem), "replica")
+            self.assertEqual(router.db_for_write(BudgetItem), "default")
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(BudgetItem), "default")
+        self.assertFalse(router.allow_migrate("replica", "budget"))
+
+    @override_settings(API_CACHE_ENABLED=True)
+    def test_results_read_from_a_replica_after_a_write_are_not_cached(self):
+        BudgetItem.create(user=self.user, name="Rent", amount=Decimal("10.00"), quantity=1)
+        self.get("/api/v1.0/budget-items/summary/")
+        self.assertGreater(self.get("/api/v1.0/budget-items/summary/")[1], 0)
+
+        with override_settings(REPLICA_PIN_WINDOW=0):
+            BudgetItem.create(user=self.user, name="Power", amount=Decimal("10.00"), quantity=1)
+        self.get("/api/v1.0/budget-items/summary/")
+        self.assertEqual(self.get("/api/v1.0/budget-items/summary/")[1], 0)
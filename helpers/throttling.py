@@ -0,0 +1,90 @@
+import logging
+import time
+
+from django.db import connection
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+from helpers.models import ThrottleBucket
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(key, now, interval, period):
+    """
+    Spends one request of the GCRA bucket ``key`` in a single
+    ``INSERT ... ON CONFLICT DO UPDATE``, so that concurrent workers never
+    read-modify-write the same row.
+
+    A request is allowed when the bucket's theoretical arrival time is at most
+    ``period - interval`` ahead of ``now``; it then moves ``interval`` further.
+    Returns whether the request is allowed and the arrival time after it.
+    """
+    opts = ThrottleBucket._meta
+    quote_name = connection.ops.quote_name
+    table = quote_name(opts.db_table)
+    key_column, tat, allowed = (quote_name(opts.get_field(name).column) for name in ("key", "tat", "allowed"))
+    greatest = "GREATEST" if connection.vendor == "postgresql" else "MAX"
+    scheduled = f"{greatest}({table}.{tat}, %s)"
+    conforms = f"{scheduled} - %s <= %s"
+    sql = (
+        f"INSERT INTO {table} ({key_column}, {tat}, {allowed}) VALUES (%s, %s, TRUE) "
+        f"ON CONFLICT ({key_column}) DO UPDATE SET "
+        f"{tat} = CASE WHEN {conforms} THEN {scheduled} + %s ELSE {table}.{tat} END, "
+        f"{allowed} = {conforms} "
+        f"RETURNING {tat}, {allowed}"
+    )
+    tolerance = period - interval
+    params = [key, now + interval, now, now, tolerance, now, interval, now, now, tolerance]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        tat, allowed = cursor.fetchone()
+    return bool(allowed), tat
+
+
+def prune_buckets(now=None):
+    """Deletes the buckets that are back to full, which are the same as no bucket. Returns how many."""
+    deleted, _ = ThrottleBucket.objects.filter(tat__lte=now or time.time()).delete()
+    return deleted
+
+
+class GCRAThrottle(SimpleRateThrottle):
+    """
+    A ``SimpleRateThrottle`` that keeps a GCRA (token bucket) state per key in
+    the database rather than a request history in the local cache: limits
+    hold across all the workers, and each request costs one upsert of a single
+    row whatever the rate.
+
+    ``"100/hour"`` lets through a burst of 100 requests, then one every 36
+    seconds.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        self.interval = self.duration / self.num_requests
+        allowed, self.tat = acquire(self.key, self.now, self.interval, self.duration)
+        if not allowed:
+            logger.info(f"{__name__}: Throttled {self.key}")
+        return allowed
+
+    def wait(self):
+        """Seconds until the bucket has room for one more request."""
+        return max(self.tat - (self.duration - self.interval) - self.now, 0)
+
+
+class AnonGCRAThrottle(AnonRateThrottle, GCRAThrottle):
+    """``AnonRateThrottle`` (rate ``anon``) on a shared GCRA bucket per client address."""
+
+
+class UserGCRAThrottle(UserRateThrottle, GCRAThrottle):
+    """``UserRateThrottle`` (rate ``user``) on a shared GCRA bucket per user."""
+
+
+class ScopedGCRAThrottle(ScopedRateThrottle, GCRAThrottle):
+    """``ScopedRateThrottle`` (the view's ``throttle_scope`` rate) on a shared GCRA bucket per user and scope."""
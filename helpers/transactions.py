@@ -0,0 +1,30 @@
+from django.db import transaction
+from rest_framework.permissions import SAFE_METHODS
+
+
+class TransactionPolicyMixin:
+    """
+    Runs the actions of a view that write in a transaction, and the others in
+    autocommit, rather than every request in one (``ATOMIC_REQUESTS``): reads
+    pay for no ``BEGIN``/``COMMIT`` and hold no snapshot.
+
+    ``atomic_actions`` names the actions run in ``transaction.atomic``, by
+    default those of the unsafe methods. Only the action is: authentication,
+    permissions and throttles run before it in autocommit, so that the
+    throttle bucket of a user is not locked while a write is under way.
+    """
+
+    atomic_actions = None
+
+    def is_atomic(self, request):
+        if self.atomic_actions is not None:
+            return getattr(self, "action", None) in self.atomic_actions
+        return request.method not in SAFE_METHODS
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # dispatch looks the handler up after initial, the wrapped one is called
+        method = request.method.lower()
+        handler = getattr(self, method, None)
+        if handler is not None and self.is_atomic(request):
+            setattr(self, method, transaction.atomic(handler))